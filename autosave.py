@@ -0,0 +1,164 @@
+"""Save the game in progress to a small binary snapshot and resume it at startup.
+
+Snapshot layout (little-endian):
+
+* header: magic ``PSDS``, version, box rows, box cols, state flags,
+  wheel difficulty, elapsed ms, focused cell, puzzle seed, puzzle
+  difficulty and rating (NaN when unrated)
+* the puzzle's givens and solution, one byte per cell
+* the board as written by ``BoardState.to_bytes``
+* CRC-32 of everything before it
+
+Snapshots are written to a temporary file that then replaces the old
+one, so a crash mid-write leaves the previous snapshot intact. Writes
+happen on a background thread; the game only packs a few hundred bytes.
+"""
+import math
+import os
+import struct
+import sys
+import threading
+import zlib
+from typing import NamedTuple, Optional
+
+from puzzle_generator import Puzzle
+
+MAGIC = b'PSDS'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBBHIhqdd')
+CHECKSUM = struct.Struct('<I')
+
+# State flags
+FLAG_COMPLETE = 1
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.pyg_sudoku', 'autosave.bin')
+
+
+class SnapshotError(ValueError):
+    """Raised for malformed or corrupted snapshots."""
+
+
+class Snapshot(NamedTuple):
+    """Everything needed to put a game back where it was."""
+    puzzle: Puzzle
+    board: bytes            # BoardState.to_bytes()
+    time_elapsed: int       # milliseconds on the game timer
+    difficulty: float       # the difficulty box, not the puzzle's
+    is_complete: bool
+    focused_cell: int
+
+
+def pack_snapshot(snapshot: Snapshot) -> bytes:
+    """Serialize a snapshot, checksum included."""
+    puzzle = snapshot.puzzle
+    header = HEADER.pack(MAGIC, VERSION, puzzle.box_rows, puzzle.box_cols,
+                         FLAG_COMPLETE if snapshot.is_complete else 0,
+                         round(snapshot.difficulty * 100), snapshot.time_elapsed,
+                         snapshot.focused_cell, -1 if puzzle.seed is None else puzzle.seed,
+                         puzzle.difficulty, math.nan if puzzle.rating is None else puzzle.rating)
+    data = header + bytes(puzzle.givens) + bytes(puzzle.solution) + snapshot.board
+    return data + CHECKSUM.pack(zlib.crc32(data))
+
+
+def unpack_snapshot(data: bytes) -> Snapshot:
+    """Inverse of ``pack_snapshot``; raises SnapshotError unless the data checks out."""
+    if len(data) < HEADER.size + CHECKSUM.size or not data.startswith(MAGIC):
+        raise SnapshotError('not a game snapshot')
+    body, (checksum,) = data[:-CHECKSUM.size], CHECKSUM.unpack_from(data, len(data) - CHECKSUM.size)
+    if zlib.crc32(body) != checksum:
+        raise SnapshotError('snapshot checksum mismatch')
+
+    (_, version, box_rows, box_cols, flags, hundredths, time_elapsed, focused_cell,
+     seed, difficulty, rating) = HEADER.unpack_from(body, 0)
+    if version != VERSION:
+        raise SnapshotError(f'unsupported snapshot version {version}')
+    size = box_rows * box_cols
+    cell_count = size * size
+    offset = HEADER.size
+    givens = tuple(body[offset:offset + cell_count])
+    solution = tuple(body[offset + cell_count:offset + 2 * cell_count])
+    board = body[offset + 2 * cell_count:]
+    # Same length check BoardState.load_bytes does, before anything is touched
+    mask_size = 2 if size <= 16 else 4
+    if len(board) != cell_count * (2 + mask_size) or max(givens + solution, default=0) > size:
+        raise SnapshotError('snapshot does not match its board size')
+
+    puzzle = Puzzle(givens, solution, None if seed < 0 else seed, difficulty, box_rows, box_cols,
+                    None if math.isnan(rating) else rating)
+    return Snapshot(puzzle, board, time_elapsed, hundredths / 100, bool(flags & FLAG_COMPLETE),
+                    focused_cell)
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """Write ``data`` to a temporary file next to ``path`` and rename it into place."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as output:
+        output.write(data)
+        output.flush()
+        os.fsync(output.fileno())
+    os.replace(temp_path, path)
+
+
+class Autosaver:
+    """Write snapshots on a background thread, keeping only the newest pending one.
+
+    ``save`` never blocks on disk; if the writer is still busy, a newer
+    snapshot replaces the one waiting. ``close`` writes whatever is
+    pending and stops the thread.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, interval_ms: int = 10_000) -> None:
+        """Create the saver; the writer thread starts with the first ``save``."""
+        self.path = path
+        self.interval_ms = interval_ms
+        self.saved = 0
+        self._pending: Optional[bytes] = None
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='autosave', daemon=True)
+
+    def load(self) -> Optional[Snapshot]:
+        """Read the last snapshot; None if there is none or it is unusable."""
+        try:
+            with open(self.path, 'rb') as snapshot_file:
+                return unpack_snapshot(snapshot_file.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, SnapshotError) as error:
+            print(f'autosave: ignoring {self.path}: {error}', file=sys.stderr)
+            return None
+
+    def save(self, snapshot: Snapshot) -> None:
+        """Queue a snapshot for writing."""
+        data = pack_snapshot(snapshot)
+        with self._condition:
+            if not self._thread.is_alive() and not self._stopped:
+                self._thread.start()
+            self._pending = data
+            self._condition.notify_all()
+
+    def close(self) -> None:
+        """Write the pending snapshot, if any, and stop the writer."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self) -> None:
+        """Writer loop: write the newest pending snapshot until stopped."""
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopped:
+                    self._condition.wait()
+                data, self._pending = self._pending, None
+            if data is None:
+                return
+            try:
+                write_atomic(self.path, data)
+                self.saved += 1
+            except OSError as error:
+                print(f'autosave: cannot write {self.path}: {error}', file=sys.stderr)
@@ -0,0 +1,139 @@
+"""Headless batch puzzle generation.
+
+Writes one puzzle per line as ``<puzzle> <solution> <seed> <difficulty>``,
+where puzzle and solution use the 81-char format with '.' for blanks.
+Every puzzle is reproducible from its seed with ``generate_puzzle``.
+With ``--rating`` the difficulty column is the clue fraction the rating
+band search settled on.
+
+Usage: python pyg_sudoku.py generate --count 1000 --difficulty 0.6 --workers 4
+       python pyg_sudoku.py generate --count 100 --rating 2.5:4
+"""
+import argparse
+import hashlib
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from board_topology import BOX_SHAPES, box_shape
+from puzzle_generator import BACKENDS, Puzzle, format_grid, generate_puzzle, generate_rated_puzzle
+
+
+def derive_seed(base_seed: int, index: int) -> int:
+    """Return the seed of puzzle ``index`` in a batch started from ``base_seed``."""
+    digest = hashlib.blake2b(f'{base_seed}:{index}'.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % sys.maxsize
+
+
+def format_puzzle_line(puzzle: Puzzle) -> str:
+    """Format a puzzle as one output line."""
+    return (f'{format_grid(puzzle.givens)} {format_grid(puzzle.solution)} '
+            f'{puzzle.seed} {puzzle.difficulty:.2f}')
+
+
+def _generate_chunk(difficulty: float, seeds: Sequence[int], backend: str,
+                    rating: Optional[Tuple[float, float]] = None, size: int = 9) -> List[str]:
+    """Generate and format a chunk of puzzles (runs in a worker process).
+
+    With a ``rating`` band, seeds whose search misses the band are skipped.
+    """
+    box_rows, box_cols = box_shape(size)
+    if rating is None:
+        return [format_puzzle_line(generate_puzzle(difficulty, seed, box_rows, box_cols, backend))
+                for seed in seeds]
+    puzzles = (generate_rated_puzzle(rating[0], rating[1], seed, box_rows, box_cols, backend)
+               for seed in seeds)
+    return [format_puzzle_line(puzzle) for puzzle in puzzles if puzzle is not None]
+
+
+def generate_lines(count: int, difficulty: float, base_seed: int, workers: int = 1,
+                   chunk_size: int = 8, backend: str = 'native',
+                   rating: Optional[Tuple[float, float]] = None, size: int = 9) -> Iterator[str]:
+    """Yield formatted puzzles as workers finish them.
+
+    At most ``2 * workers`` chunks are in flight, so memory stays bounded
+    no matter how large ``count`` is.
+    """
+    chunks = ([derive_seed(base_seed, index) for index in range(start, min(start + chunk_size, count))]
+              for start in range(0, count, chunk_size))
+
+    if workers <= 1:
+        for seeds in chunks:
+            yield from _generate_chunk(difficulty, seeds, backend, rating, size)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for seeds in chunks:
+            pending.add(executor.submit(_generate_chunk, difficulty, seeds, backend, rating, size))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+
+def _difficulty(value: str) -> float:
+    """Parse a difficulty in the same range as the difficulty box."""
+    difficulty = float(value)
+    if not 0 < difficulty < 1:
+        raise argparse.ArgumentTypeError('difficulty must be between 0 and 1')
+    return difficulty
+
+
+def _rating_band(value: str) -> Tuple[float, float]:
+    """Parse a ``MIN:MAX`` technique rating band."""
+    try:
+        low, high = (float(part) for part in value.split(':'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('rating band must look like 2.5:4') from None
+    if low > high:
+        raise argparse.ArgumentTypeError('rating band minimum exceeds its maximum')
+    return low, high
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Entry point for the ``generate`` command."""
+    parser = argparse.ArgumentParser(prog='generate', description='Generate Sudoku puzzles without a window.')
+    parser.add_argument('--count', type=int, default=100, help='number of puzzles to generate')
+    parser.add_argument('--difficulty', type=_difficulty, default=0.5, help='fraction of cells to remove')
+    parser.add_argument('--rating', type=_rating_band,
+                        help='target a technique rating band MIN:MAX instead of a clue fraction')
+    parser.add_argument('--size', type=int, choices=sorted(BOX_SHAPES), default=9,
+                        help='board size, e.g. 4, 9, 16 or 25')
+    parser.add_argument('--seed', type=int, help='base seed; random if omitted')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--chunk-size', type=int, default=8, help='puzzles per worker task')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='native')
+    parser.add_argument('--output', default='-', help="output file, '-' for stdout")
+    args = parser.parse_args(argv)
+
+    base_seed = args.seed if args.seed is not None else random.randrange(sys.maxsize)
+    print(f'base seed {base_seed}', file=sys.stderr)
+
+    output: TextIO = sys.stdout if args.output == '-' else open(args.output, 'w')
+    start = time.perf_counter()
+    produced = 0
+    try:
+        for line in generate_lines(args.count, args.difficulty, base_seed,
+                                   args.workers, args.chunk_size, args.backend, args.rating,
+                                   args.size):
+            output.write(line + '\n')
+            produced += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    rate = produced / elapsed if elapsed else 0.0
+    print(f'generated {produced} puzzles in {elapsed:.2f}s ({rate:.1f} puzzles/sec)', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""Vectorized validation, candidates and singles solving for many boards at once.
+
+Boards are an (N, cell_count) uint8 array with 0 for empty cells. Every
+cell becomes a bitmask where bit ``d - 1`` stands for digit ``d``, as in
+the solver. Each unit's present and duplicate masks are reduced across
+its cells with whole-column bit operations, so the work per board is a
+handful of array passes and memory stays at a few bytes per cell.
+
+Unit definitions come from ``board_topology``, the same tables the game
+validates with. Requires numpy (``pip install numpy``).
+"""
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from board_topology import BoardTopology
+from solver import solve, topology_for
+
+
+class BatchReport(NamedTuple):
+    """Per-board results of ``validate_boards``."""
+    valid: np.ndarray      # (N,) bool: no digit repeats in any unit
+    conflicts: np.ndarray  # (N, cells) bool: cell shares its digit with a peer
+    filled: np.ndarray     # (N,) bool: no empty cells
+    solved: np.ndarray     # (N,) bool: filled and valid
+
+
+def _tables(topology: BoardTopology) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Unit cell indices (units, size), cell unit indices (cells, 3) and the digit -> bit table."""
+    dtype = np.uint16 if topology.size <= 16 else np.uint32
+    digit_bits = np.array([0] + [1 << bit for bit in range(topology.size)], dtype=dtype)
+    return (np.array(topology.units, dtype=np.intp), np.array(topology.cell_units, dtype=np.intp),
+            digit_bits)
+
+
+def _as_boards(boards, topology: Optional[BoardTopology]) -> Tuple[np.ndarray, BoardTopology]:
+    """Check the board array's shape and resolve its topology."""
+    boards = np.asarray(boards, dtype=np.uint8)
+    if boards.ndim != 2:
+        raise ValueError(f'expected an (N, cells) array, got shape {boards.shape}')
+    topology = topology_for(range(boards.shape[1]), topology)
+    if boards.shape[1] != topology.cell_count:
+        raise ValueError(f'expected {topology.cell_count} cells per board, got {boards.shape[1]}')
+    if boards.size and boards.max() > topology.size:
+        raise ValueError(f'digits must be 0..{topology.size}')
+    return boards, topology
+
+
+def _unit_masks(bits: np.ndarray, units: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(present, duplicate) digit masks of every unit, each (N, units)."""
+    present = np.zeros((bits.shape[0], units.shape[0]), dtype=bits.dtype)
+    duplicate = np.zeros_like(present)
+    for position in range(units.shape[1]):
+        column = bits[:, units[:, position]]
+        duplicate |= present & column
+        present |= column
+    return present, duplicate
+
+
+def _peer_union(unit_masks: np.ndarray, cell_units: np.ndarray) -> np.ndarray:
+    """OR of the masks of each cell's row, column and box, (N, cells)."""
+    return (unit_masks[:, cell_units[:, 0]] | unit_masks[:, cell_units[:, 1]]
+            | unit_masks[:, cell_units[:, 2]])
+
+
+def validate_boards(boards, topology: Optional[BoardTopology] = None) -> BatchReport:
+    """Check every board for repeated digits and completeness."""
+    boards, topology = _as_boards(boards, topology)
+    units, cell_units, digit_bits = _tables(topology)
+    bits = digit_bits[boards]
+    _, duplicate = _unit_masks(bits, units)
+
+    valid = ~duplicate.any(axis=1)
+    conflicts = (bits & _peer_union(duplicate, cell_units)) != 0
+    filled = (boards != 0).all(axis=1)
+    return BatchReport(valid, conflicts, filled, filled & valid)
+
+
+def candidate_masks(boards, topology: Optional[BoardTopology] = None) -> np.ndarray:
+    """Candidate bitmask of every empty cell, 0 for filled cells, (N, cells)."""
+    boards, topology = _as_boards(boards, topology)
+    units, cell_units, digit_bits = _tables(topology)
+    present, _ = _unit_masks(digit_bits[boards], units)
+    full = digit_bits.dtype.type((1 << topology.size) - 1)
+    candidates = ~_peer_union(present, cell_units) & full
+    candidates[boards != 0] = 0
+    return candidates
+
+
+def _lowest_digit(masks: np.ndarray) -> np.ndarray:
+    """Digit of the lowest set bit of each mask (0 for empty masks)."""
+    lowest = masks & (~masks + 1)
+    return np.where(lowest != 0, np.log2(np.maximum(lowest, 1)).astype(np.uint8) + 1, 0).astype(np.uint8)
+
+
+def solve_singles(boards, topology: Optional[BoardTopology] = None,
+                  max_rounds: int = 100) -> Tuple[np.ndarray, np.ndarray]:
+    """Fill naked and hidden singles on all boards until none are left.
+
+    Returns (boards, stuck): a new array with the singles placed and a
+    flag for boards that turned out contradictory, where an empty cell
+    has no candidate or a unit has no place left for a missing digit.
+    """
+    boards, topology = _as_boards(boards, topology)
+    boards = boards.copy()
+    units, cell_units, digit_bits = _tables(topology)
+    full = digit_bits.dtype.type((1 << topology.size) - 1)
+    stuck = np.zeros(boards.shape[0], dtype=bool)
+    # Only boards that changed in the last round are worth another pass
+    active = np.flatnonzero((boards == 0).any(axis=1))
+
+    for _ in range(max_rounds):
+        if not active.size:
+            break
+        sub = boards[active]
+        empty = sub == 0
+        present, _ = _unit_masks(digit_bits[sub], units)
+        candidates = ~_peer_union(present, cell_units) & full
+        candidates[~empty] = 0
+        once, twice = _unit_masks(candidates, units)
+        stuck[active] |= ((empty & (candidates == 0)).any(axis=1)
+                          | ((present | once) != full).any(axis=1))
+
+        # Naked singles: one candidate left
+        single = empty & (candidates != 0) & ((candidates & (candidates - 1)) == 0)
+        placed = np.where(single, _lowest_digit(candidates), 0).astype(np.uint8)
+
+        # Hidden singles: a digit that fits only one cell of a unit
+        hidden = once & ~twice
+        for position in range(units.shape[1]):
+            cells = units[:, position]
+            digits = _lowest_digit(candidates[:, cells] & hidden)
+            take = (digits != 0) & (placed[:, cells] == 0)
+            rows, unit_index = np.nonzero(take)
+            placed[rows, cells[unit_index]] = digits[rows, unit_index]
+
+        changed = placed.any(axis=1)
+        sub[placed != 0] = placed[placed != 0]
+        boards[active] = sub
+        active = active[changed & ~stuck[active]]
+    return boards, stuck
+
+
+def solve_boards(boards, topology: Optional[BoardTopology] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Solve every board: singles in bulk, the rest with the backtracking solver.
+
+    Returns (solutions, solved); rows of unsolvable boards are left as
+    far as propagation got and flagged False.
+    """
+    boards, topology = _as_boards(boards, topology)
+    solutions, stuck = solve_singles(boards, topology)
+    report = validate_boards(solutions, topology)
+    solved = report.solved.copy()
+    for index in np.flatnonzero(~solved & ~stuck & report.valid):
+        solution = solve(boards[index].tolist(), topology)
+        if solution is not None:
+            solutions[index] = solution
+            solved[index] = True
+    return solutions, solved
@@ -0,0 +1,79 @@
+"""Boards/sec of the vectorized batch validator against per-board Python loops.
+
+Usage: python benchmarks/bench_batch.py [--boards N] [--puzzles N] [--size 9]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from batch_validator import candidate_masks, solve_boards, solve_singles, validate_boards  # noqa: E402
+from board_topology import box_shape, get_topology  # noqa: E402
+from conflict_engine import ConflictTracker  # noqa: E402
+from puzzle_generator import generate_puzzle  # noqa: E402
+from solver import solve  # noqa: E402
+
+
+def _boards_per_sec(func, boards, count):
+    """Boards handled per second by one call of ``func`` on ``boards``."""
+    start = time.perf_counter()
+    func(boards)
+    return count / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--boards', type=int, default=200_000, help='boards to validate')
+    parser.add_argument('--puzzles', type=int, default=200, help='distinct puzzles to tile them from')
+    parser.add_argument('--size', type=int, default=9)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    box_rows, box_cols = box_shape(args.size)
+    topology = get_topology(box_rows, box_cols)
+    puzzles = [generate_puzzle(0.6, args.seed + i, box_rows, box_cols) for i in range(args.puzzles)]
+
+    # Half solutions, half solutions with a few cells corrupted
+    rng = random.Random(args.seed)
+    rows = []
+    for puzzle in puzzles:
+        rows.append(puzzle.solution)
+        broken = list(puzzle.solution)
+        for _ in range(3):
+            broken[rng.randrange(topology.cell_count)] = rng.randrange(topology.size + 1)
+        rows.append(broken)
+    sample = np.array(rows, dtype=np.uint8)
+    boards = np.resize(sample, (args.boards, topology.cell_count))
+    givens = np.array([puzzle.givens for puzzle in puzzles], dtype=np.uint8)
+
+    def tracker_loop(batch):
+        tracker = ConflictTracker(topology)
+        for board in batch:
+            tracker.load(board)
+
+    def solve_loop(batch):
+        for board in batch:
+            solve(board, topology)
+
+    scalar_sample = sample.tolist()
+    results = [
+        ('validate_boards', _boards_per_sec(lambda b: validate_boards(b, topology), boards, len(boards))),
+        ('candidate_masks', _boards_per_sec(lambda b: candidate_masks(b, topology), boards, len(boards))),
+        ('ConflictTracker.load loop', _boards_per_sec(tracker_loop, scalar_sample, len(scalar_sample))),
+        ('solve_singles (puzzles)', _boards_per_sec(lambda b: solve_singles(b, topology), givens, len(givens))),
+        ('solve_boards (puzzles)', _boards_per_sec(lambda b: solve_boards(b, topology), givens, len(givens))),
+        ('solver.solve loop (puzzles)', _boards_per_sec(solve_loop, givens.tolist(), len(givens))),
+    ]
+
+    print(f'{len(boards)} boards, {len(givens)} puzzles, {args.size}x{args.size}')
+    for name, rate in results:
+        print(f'{name:<32} {rate:>14,.0f} boards/sec')
+
+
+if __name__ == '__main__':
+    main()
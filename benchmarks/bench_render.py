@@ -0,0 +1,82 @@
+"""Measure full-frame render time and allocations with and without the glyph cache.
+
+Usage: python benchmarks/bench_render.py [--frames N]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from glyph_cache import GlyphCache  # noqa: E402
+from puzzle_generator import generate_puzzle  # noqa: E402
+from pyg_sudoku import SudokuGame  # noqa: E402
+
+
+def _fill_board(game: SudokuGame) -> None:
+    """Give every empty cell either a digit or a set of pencil marks."""
+    game._load_puzzle(generate_puzzle(0.6, 1))
+    for i in range(game.TOTAL_CELLS):
+        if game.board.is_given(i):
+            continue
+        if i % 2:
+            game._set_cell_value(i, i % 9 + 1)
+        else:
+            game._set_cell_candidates(i, (1 << (2 + i % 8)) - 1)
+
+
+def _measure(game: SudokuGame, frames: int) -> dict:
+    """Render ``frames`` full frames and return per-frame statistics."""
+    game._invalidate_all()
+    game._render()
+    misses = game.glyphs.misses
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        game._invalidate_all()
+        game._render()
+    elapsed = time.perf_counter() - start
+    renders = game.glyphs.misses - misses
+
+    # Peak Python heap growth inside a frame, i.e. per-frame garbage
+    tracemalloc.start()
+    peak_total = 0
+    for _ in range(frames):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        game._invalidate_all()
+        game._render()
+        peak_total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+
+    return {
+        'ms_per_frame': elapsed * 1000 / frames,
+        'renders_per_frame': renders / frames,
+        'peak_kib_per_frame': peak_total / 1024 / frames,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=200)
+    args = parser.parse_args()
+
+    game = SudokuGame()
+    _fill_board(game)
+
+    cached = _measure(game, args.frames)
+    game.glyphs = GlyphCache(game.glyphs.fonts, max_entries=0)
+    uncached = _measure(game, args.frames)
+    game.puzzle_source.stop()
+
+    print(f'{"":<24}{"uncached":>12}{"cached":>12}')
+    for key in cached:
+        print(f'{key:<24}{uncached[key]:>12.2f}{cached[key]:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
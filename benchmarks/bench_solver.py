@@ -0,0 +1,74 @@
+"""Compare the in-project solver with the py-sudoku backend.
+
+Usage: python benchmarks/bench_solver.py [--repeat N] [--skip-py-sudoku]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from puzzle_generator import parse_grid  # noqa: E402
+from solver import count_solutions, solve  # noqa: E402
+
+# Well-known hard puzzles, all with a unique solution
+CORPUS = [
+    '800000000003600000070090200050007000000045700000100030001000068008500010090000400',
+    '4.....8.5.3..........7......2.....6.....8.4......1.......6.3.7.5..2.....1.4......',
+    '85...24..72......9..4.........1.7..23.5...9...4...........8..7..17..........36.4.',
+    '..53.....8......2..7..1.5..4....53...1..7...6..32...8..6.5....9..4....3......97..',
+    '12..4......5.69.1...9...5.........7.7...52.9..3......2.9.6...5.4..9..8.1..3...9.4',
+    '...57..3.1......2.7...234......8...4..7..4...49....6.5.42...3.....7..9....18.....',
+    '7..1523........92....3.....1....47.8.......6............9...5.6.4.9.7...8....6.1.',
+    '1....7.9..3..2...8..96..5....53..9...1..8...26....4...3......1..4......7..7...3..',
+    '1.......2.9.4...5...6...7...5.9.3.......7.......85..4.7.....6...3...9.8...2.....1',
+]
+
+
+def _time_per_call(func, boards, repeat):
+    """Return the mean seconds per call of ``func`` over ``boards``."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for board in boards:
+            func(board)
+    return (time.perf_counter() - start) / (repeat * len(boards))
+
+
+def _py_sudoku_solve(board):
+    from sudoku import Sudoku
+    rows = [board[i:i + 9] for i in range(0, 81, 9)]
+    return Sudoku(3, 3, board=rows).solve()
+
+
+def _py_sudoku_unique(board):
+    from sudoku import Sudoku
+    rows = [board[i:i + 9] for i in range(0, 81, 9)]
+    return Sudoku(3, 3, board=rows).has_multiple_solutions()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--skip-py-sudoku', action='store_true')
+    args = parser.parse_args()
+
+    boards = [parse_grid(text) for text in CORPUS]
+    for board in boards:
+        assert count_solutions(board) == 1
+
+    rows = [
+        ('native solve', _time_per_call(solve, boards, args.repeat)),
+        ('native count_solutions', _time_per_call(count_solutions, boards, args.repeat)),
+    ]
+    if not args.skip_py_sudoku:
+        rows.append(('py-sudoku solve', _time_per_call(_py_sudoku_solve, boards, 1)))
+        rows.append(('py-sudoku has_multiple_solutions', _time_per_call(_py_sudoku_unique, boards, 1)))
+
+    print(f'{len(boards)} puzzles')
+    for name, seconds in rows:
+        print(f'{name:<36} {seconds * 1000:9.3f} ms/puzzle')
+
+
+if __name__ == '__main__':
+    main()
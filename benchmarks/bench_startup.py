@@ -0,0 +1,104 @@
+"""Cold-start time of the game: interpreter start, imports, setup and the first frame.
+
+Every run is a fresh interpreter under SDL's dummy video driver, reporting
+milliseconds (lower is better):
+
+* import_ms: importing pygame and the game module
+* init_ms: constructing ``SudokuGame``
+* first_flip_ms: from the first line of the script to the first display update
+* process_ms: wall time of the whole process, interpreter start and exit included
+
+Usage:
+    python benchmarks/bench_startup.py --runs 10 --save startup.json
+    python benchmarks/bench_startup.py --compare startup.json --threshold 0.15
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_suite import Metrics, best_of, compare  # noqa: E402
+
+# Runs in the child; wraps the display calls to catch the first frame
+CHILD = '''
+import time
+start = time.perf_counter()
+import json, sys
+sys.path.insert(0, sys.argv[1])
+import pygame
+import pyg_sudoku
+imported = time.perf_counter()
+
+flips = []
+def first_frame(update):
+    def wrapper(*args):
+        if not flips:
+            flips.append(time.perf_counter())
+        return update(*args)
+    return wrapper
+pygame.display.flip = first_frame(pygame.display.flip)
+pygame.display.update = first_frame(pygame.display.update)
+
+game = pyg_sudoku.SudokuGame()
+created = time.perf_counter()
+pygame.event.post(pygame.event.Event(pygame.QUIT))
+game.run()
+print(json.dumps({'import_ms': (imported - start) * 1000, 'init_ms': (created - imported) * 1000,
+                  'first_flip_ms': (flips[0] - start) * 1000}))
+'''
+
+
+def measure_startup() -> Metrics:
+    """Start the game once in a fresh interpreter and return its timings."""
+    env = dict(os.environ, SDL_VIDEODRIVER='dummy', SDL_AUDIODRIVER='dummy',
+               PYGAME_HIDE_SUPPORT_PROMPT='1')
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CHILD, ROOT], env=env, check=True,
+                            capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    metrics = json.loads(result.stdout.strip().splitlines()[-1])
+    metrics['process_ms'] = elapsed * 1000
+    return metrics
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='cold starts to take the best of')
+    parser.add_argument('--save', metavar='PATH', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare against a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='relative slowdown that counts as a regression')
+    args = parser.parse_args()
+
+    # Warm the OS file cache so the first run is not an outlier
+    measure_startup()
+    results: Dict[str, Metrics] = best_of([{'startup': measure_startup()} for _ in range(args.runs)])
+
+    for name, value in results['startup'].items():
+        print(f'{"startup." + name:<32}{value:>14.2f}')
+
+    if args.save:
+        with open(args.save, 'w') as output:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'runs': args.runs, 'results': results}, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = compare(baseline, results, args.threshold)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        if regressions:
+            return 1
+        print(f'no regressions beyond {args.threshold:.0%}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
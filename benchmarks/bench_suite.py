@@ -0,0 +1,322 @@
+"""Headless benchmark suite: drive SudokuGame with scripted input and save baselines.
+
+Runs under SDL's dummy video driver. Each scenario reports throughput
+(``*_per_sec``, higher is better) and Python heap growth (``*_kib``,
+lower is better):
+
+* events: scripted keypresses, right-click popups, double-clicks,
+  start/reset and hover through ``_handle_event``, ``_update`` and ``_render``
+* render: full-frame redraws of a busy board
+* validation: ``_validate_all_cells`` (run when a puzzle loads) on a half-filled board
+* edits: single-cell digit entries and clears through ``_edit_cells``,
+  i.e. incremental validation and undo recording
+* candidates: Shift+Space candidate filling followed by an undo
+* hints: next-step lookup on a freshly loaded puzzle
+* generation: native puzzle generation from fixed seeds
+
+Usage:
+    python benchmarks/bench_suite.py --save baseline.json
+    python benchmarks/bench_suite.py --compare baseline.json --threshold 0.15
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from itertools import cycle
+from typing import Callable, Dict, List, Optional
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame  # noqa: E402
+
+from puzzle_generator import Puzzle, generate_puzzle  # noqa: E402
+from pyg_sudoku import SudokuGame  # noqa: E402
+
+Metrics = Dict[str, float]
+
+
+class _ScriptedSource:
+    """Puzzle source that cycles through pre-generated puzzles.
+
+    Keeps the pool's worker thread and generation time out of the
+    event and render measurements.
+    """
+
+    def __init__(self, puzzles: List[Puzzle]) -> None:
+        self.puzzles = puzzles
+        self.hits = 0
+        self.misses = 0
+        self._next = 0
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def prefetch(self, difficulty: float) -> None:
+        pass
+
+    def poll(self, difficulty: float) -> Optional[Puzzle]:
+        puzzle = self.puzzles[self._next % len(self.puzzles)]
+        self._next += 1
+        return puzzle
+
+    def get(self, difficulty: float) -> Optional[Puzzle]:
+        self.hits += 1
+        return self.poll(difficulty)
+
+
+def _make_game(seed: int) -> SudokuGame:
+    """Create a game on a fixed puzzle with a deterministic puzzle source."""
+    game = SudokuGame()
+    game.puzzle_source.stop()
+    game.puzzle_source = _ScriptedSource([generate_puzzle(0.6, seed + i) for i in range(4)])
+    game._load_puzzle(game.puzzle_source.get(game.difficulty))
+    game._render()
+    return game
+
+
+def _script(game: SudokuGame, count: int, seed: int) -> List[pygame.event.Event]:
+    """Build a reproducible stream of ``count`` input events."""
+    rng = random.Random(seed)
+    event = pygame.event.Event
+    events = []
+    while len(events) < count:
+        roll = rng.random()
+        pos = game.input_boxes[rng.randrange(game.TOTAL_CELLS)].center
+        if roll < 0.25:
+            events.append(event(pygame.MOUSEMOTION, pos=pos, rel=(0, 0), buttons=(0, 0, 0)))
+        elif roll < 0.45:
+            events.append(event(pygame.MOUSEBUTTONDOWN, pos=pos, button=1))
+            events.append(event(pygame.KEYDOWN, key=0, mod=0, unicode=rng.choice(game.VALID_NUMBERS)))
+        elif roll < 0.6:
+            # Right-click popup, then pick a number (or click outside)
+            events.append(event(pygame.MOUSEBUTTONDOWN, pos=pos, button=3))
+            pick = rng.randrange(9)
+            events.append(event(pygame.MOUSEBUTTONDOWN, pos=(pos[0] + (pick % 3 - 1) * 45,
+                                                             pos[1] + (pick // 3 - 1) * 45), button=1))
+        elif roll < 0.7:
+            # Double-click clears the cell
+            events.append(event(pygame.MOUSEBUTTONDOWN, pos=pos, button=1))
+            events.append(event(pygame.MOUSEBUTTONDOWN, pos=pos, button=1))
+        elif roll < 0.8:
+            events.append(event(pygame.KEYDOWN, key=pygame.K_SPACE, mod=0, unicode=' '))
+        elif roll < 0.88:
+            events.append(event(pygame.KEYDOWN, key=pygame.K_z, mod=pygame.KMOD_CTRL, unicode=''))
+        elif roll < 0.98:
+            events.append(event(pygame.MOUSEBUTTONDOWN, pos=pos, button=rng.choice((4, 5))))
+        elif roll < 0.99:
+            events.append(event(pygame.MOUSEBUTTONDOWN, pos=game.start_button.center, button=1))
+        else:
+            events.append(event(pygame.MOUSEBUTTONDOWN, pos=game.reset_button.center, button=1))
+    return events[:count]
+
+
+def _heap_kib(step: Callable[[], None], repeat: int) -> float:
+    """Mean peak Python heap growth of one ``step`` call, in KiB."""
+    tracemalloc.start()
+    total = 0
+    for _ in range(repeat):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        step()
+        total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return total / 1024 / repeat
+
+
+def _rate(step: Callable[[], None], repeat: int) -> float:
+    """Calls of ``step`` per second."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        step()
+    return repeat / (time.perf_counter() - start)
+
+
+def bench_events(events: int, per_frame: int, seed: int, frame_ms: int = 16) -> Metrics:
+    """Scripted input handled, updated and rendered like ``run()``, minus frame pacing."""
+    game = _make_game(seed)
+    script = _script(game, events, seed)
+    frames = [script[i:i + per_frame] for i in range(0, len(script), per_frame)]
+
+    def play(batches: List[List[pygame.event.Event]]) -> None:
+        for batch in batches:
+            game._begin_frame(frame_ms)
+            for event in batch:
+                game._handle_event(event)
+            game._update(frame_ms)
+            game._render()
+
+    start = time.perf_counter()
+    play(frames)
+    elapsed = time.perf_counter() - start
+    heap = _heap_kib(lambda: play(frames[:1]), min(len(frames), 200))
+    return {
+        'events_per_sec': len(script) / elapsed,
+        'frames_per_sec': len(frames) / elapsed,
+        'frame_kib': heap,
+    }
+
+
+def bench_render(frames: int, seed: int) -> Metrics:
+    """Full redraws of a board with digits and pencil marks everywhere."""
+    game = _make_game(seed)
+    for i in range(game.TOTAL_CELLS):
+        if game.board.is_given(i):
+            continue
+        if i % 2:
+            game._set_cell_value(i, i % 9 + 1)
+        else:
+            game._set_cell_candidates(i, (1 << (2 + i % 8)) - 1)
+
+    def frame() -> None:
+        game._invalidate_all()
+        game._render()
+
+    frame()
+    return {'frames_per_sec': _rate(frame, frames), 'frame_kib': _heap_kib(frame, min(frames, 100))}
+
+
+def bench_validation(repeat: int, seed: int) -> Metrics:
+    """Full-board validation after half the empty cells are filled."""
+    game = _make_game(seed)
+    rng = random.Random(seed)
+    for i in range(game.TOTAL_CELLS):
+        if not game.board.is_given(i) and rng.random() < 0.5:
+            game._set_cell_value(i, rng.randrange(1, 10))
+    validate = game._validate_all_cells
+    return {'validations_per_sec': _rate(validate, repeat), 'validation_kib': _heap_kib(validate, 50)}
+
+
+def bench_edits(repeat: int, seed: int) -> Metrics:
+    """Enter a digit in one empty cell and clear it again, each as one undo step."""
+    game = _make_game(seed)
+    rng = random.Random(seed)
+    empty = [i for i in range(game.TOTAL_CELLS) if not game.board.is_given(i)]
+    for i in empty:
+        if rng.random() < 0.5:
+            game._set_cell_value(i, rng.randrange(1, 10))
+    targets = [(cell, rng.randrange(1, 10)) for cell in empty if not game.board.digits[cell]]
+    steps = cycle(targets)
+
+    def edit() -> None:
+        cell, digit = next(steps)
+        game._edit_cells({cell: (digit, 0)})
+        game._edit_cells({cell: (0, 0)})
+
+    return {'edits_per_sec': 2 * _rate(edit, repeat), 'edit_kib': _heap_kib(edit, 50)}
+
+
+def bench_candidates(repeat: int, seed: int) -> Metrics:
+    """Fill every empty cell's pencil marks in one undo step, then undo it."""
+    game = _make_game(seed)
+
+    def fill_and_undo() -> None:
+        game._fill_all_candidates()
+        game._undo()
+
+    return {'fills_per_sec': _rate(fill_and_undo, repeat), 'fill_kib': _heap_kib(fill_and_undo, 50)}
+
+
+def bench_hints(repeat: int, seed: int) -> Metrics:
+    """Find the next hint on a freshly loaded puzzle."""
+    game = _make_game(seed)
+    find = game._find_hint
+    return {'hints_per_sec': _rate(find, repeat), 'hint_kib': _heap_kib(find, 50)}
+
+
+def bench_generation(count: int, seed: int) -> Metrics:
+    """Native generation at the default difficulty from fixed seeds."""
+    seeds = iter(range(seed, seed + 2 * count))
+    step = lambda: generate_puzzle(0.5, next(seeds))  # noqa: E731
+    return {'puzzles_per_sec': _rate(step, count), 'puzzle_kib': _heap_kib(step, min(count, 20))}
+
+
+def run_suite(scale: float, seed: int) -> Dict[str, Metrics]:
+    """Run every scenario; ``scale`` multiplies the iteration counts."""
+    def n(base: int) -> int:
+        return max(1, int(base * scale))
+
+    return {
+        'events': bench_events(n(4000), 4, seed),
+        'render': bench_render(n(300), seed),
+        'validation': bench_validation(n(2000), seed),
+        'edits': bench_edits(n(5000), seed),
+        'candidates': bench_candidates(n(500), seed),
+        'hints': bench_hints(n(2000), seed),
+        'generation': bench_generation(n(50), seed),
+    }
+
+
+def best_of(runs: List[Dict[str, Metrics]]) -> Dict[str, Metrics]:
+    """Merge repeated runs, keeping the best value of every metric to damp noise."""
+    best = {}
+    for scenario, metrics in runs[0].items():
+        best[scenario] = {}
+        for name in metrics:
+            values = [run[scenario][name] for run in runs]
+            best[scenario][name] = max(values) if name.endswith('_per_sec') else min(values)
+    return best
+
+
+def compare(baseline: Dict[str, Metrics], current: Dict[str, Metrics],
+            threshold: float) -> List[str]:
+    """Return one line per metric that is worse than ``baseline`` by more than ``threshold``."""
+    regressions = []
+    for scenario, metrics in baseline.items():
+        for name, old in metrics.items():
+            new = current.get(scenario, {}).get(name)
+            if new is None or not old:
+                continue
+            # Throughput should not drop; heap growth should not rise
+            change = (old - new) / old if name.endswith('_per_sec') else (new - old) / old
+            if change > threshold:
+                regressions.append(f'{scenario}.{name}: {old:.2f} -> {new:.2f} ({change:+.0%} worse)')
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--save', metavar='PATH', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare against a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='relative slowdown or heap growth that counts as a regression')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply iteration counts')
+    parser.add_argument('--repeat', type=int, default=3, help='runs to take the best of')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    results = best_of([run_suite(args.scale, args.seed) for _ in range(args.repeat)])
+    pygame.quit()
+
+    for scenario, metrics in results.items():
+        for name, value in metrics.items():
+            print(f'{scenario + "." + name:<32}{value:>14.2f}')
+
+    if args.save:
+        with open(args.save, 'w') as output:
+            json.dump({'python': platform.python_version(), 'pygame': pygame.version.ver,
+                       'machine': platform.machine(), 'scale': args.scale, 'seed': args.seed,
+                       'repeat': args.repeat,
+                       'results': results}, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = compare(baseline, results, args.threshold)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        if regressions:
+            return 1
+        print(f'no regressions beyond {args.threshold:.0%}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
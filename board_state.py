@@ -0,0 +1,89 @@
+"""Compact array-backed per-cell board state."""
+import sys
+from array import array
+
+
+class BoardState:
+    """Digits, flags and candidate masks for every cell in flat buffers.
+
+    ``digits`` holds 0 for an empty cell, ``flags`` the GIVEN/CONFLICT/
+    UNCERTAIN bits and ``candidates`` a pencil-mark bitmask where bit
+    ``d - 1`` stands for digit ``d``. Reset, copy and serialization are
+    plain buffer copies.
+    """
+    __slots__ = ('cell_count', 'symbol_count', 'digits', 'flags', 'candidates',
+                 '_zero_cells', '_zero_candidates')
+
+    GIVEN = 1
+    CONFLICT = 2
+    UNCERTAIN = 4
+
+    def __init__(self, cell_count: int = 81, symbol_count: int = 9) -> None:
+        """Create an empty board."""
+        self.cell_count = cell_count
+        self.symbol_count = symbol_count
+        # 16-bit masks while they fit, 32-bit masks for larger boards
+        typecode = 'H' if symbol_count <= 16 else 'I'
+        self._zero_cells = bytes(cell_count)
+        self._zero_candidates = array(typecode, [0]) * cell_count
+        self.digits = bytearray(cell_count)
+        self.flags = bytearray(cell_count)
+        self.candidates = array(typecode, self._zero_candidates)
+
+    def reset(self) -> None:
+        """Clear every cell with one buffer copy per array."""
+        self.digits[:] = self._zero_cells
+        self.flags[:] = self._zero_cells
+        self.candidates[:] = self._zero_candidates
+
+    def copy(self) -> 'BoardState':
+        """Return an independent copy."""
+        other = BoardState(self.cell_count, self.symbol_count)
+        other.digits[:] = self.digits
+        other.flags[:] = self.flags
+        other.candidates[:] = self.candidates
+        return other
+
+    def to_bytes(self) -> bytes:
+        """Serialize digits, flags and little-endian candidate masks."""
+        candidates = self.candidates
+        if sys.byteorder != 'little':
+            candidates = array(candidates.typecode, candidates)
+            candidates.byteswap()
+        return bytes(self.digits) + bytes(self.flags) + candidates.tobytes()
+
+    def load_bytes(self, data: bytes) -> None:
+        """Restore the state written by ``to_bytes``."""
+        count = self.cell_count
+        expected = 2 * count + count * self.candidates.itemsize
+        if len(data) != expected:
+            raise ValueError(f'expected {expected} bytes, got {len(data)}')
+        self.digits[:] = data[:count]
+        self.flags[:] = data[count:2 * count]
+        candidates = array(self.candidates.typecode, data[2 * count:])
+        if sys.byteorder != 'little':
+            candidates.byteswap()
+        self.candidates[:] = candidates
+
+    @classmethod
+    def from_bytes(cls, data: bytes, cell_count: int = 81, symbol_count: int = 9) -> 'BoardState':
+        """Create a board from the output of ``to_bytes``."""
+        board = cls(cell_count, symbol_count)
+        board.load_bytes(data)
+        return board
+
+    def is_given(self, cell_index: int) -> bool:
+        return bool(self.flags[cell_index] & self.GIVEN)
+
+    def has_conflict(self, cell_index: int) -> bool:
+        return bool(self.flags[cell_index] & self.CONFLICT)
+
+    def is_uncertain(self, cell_index: int) -> bool:
+        return bool(self.flags[cell_index] & self.UNCERTAIN)
+
+    def set_flag(self, cell_index: int, flag: int, enabled: bool) -> None:
+        """Set or clear one flag bit of a cell."""
+        if enabled:
+            self.flags[cell_index] |= flag
+        else:
+            self.flags[cell_index] &= ~flag & 0xFF
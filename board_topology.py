@@ -0,0 +1,77 @@
+"""Precomputed cell/unit index tables for Sudoku board geometries."""
+from functools import lru_cache
+from typing import NamedTuple, Tuple
+
+
+class BoardTopology(NamedTuple):
+    """Immutable index tables for one board geometry.
+
+    Units are numbered rows first, then columns, then boxes, so unit
+    ``size + c`` is column ``c`` and unit ``2 * size + b`` is box ``b``.
+    """
+    box_rows: int
+    box_cols: int
+    size: int
+    cell_count: int
+    row_of: Tuple[int, ...]
+    col_of: Tuple[int, ...]
+    box_of: Tuple[int, ...]
+    rows: Tuple[Tuple[int, ...], ...]
+    cols: Tuple[Tuple[int, ...], ...]
+    boxes: Tuple[Tuple[int, ...], ...]
+    units: Tuple[Tuple[int, ...], ...]
+    cell_units: Tuple[Tuple[int, int, int], ...]
+    cell_unit_masks: Tuple[int, ...]
+    peers: Tuple[Tuple[int, ...], ...]
+
+
+# Box shape (rows, columns) for each supported board size
+BOX_SHAPES = {
+    4: (2, 2),
+    6: (2, 3),
+    8: (2, 4),
+    9: (3, 3),
+    12: (3, 4),
+    16: (4, 4),
+    25: (5, 5),
+}
+
+
+def box_shape(size: int) -> Tuple[int, int]:
+    """Return the box shape for a board of ``size`` x ``size`` cells."""
+    if size not in BOX_SHAPES:
+        raise ValueError(f'unsupported board size {size}; choose one of {sorted(BOX_SHAPES)}')
+    return BOX_SHAPES[size]
+
+
+@lru_cache(maxsize=None)
+def get_topology(box_rows: int = 3, box_cols: int = 3) -> BoardTopology:
+    """Return the shared topology for boxes of ``box_rows`` x ``box_cols`` cells."""
+    size = box_rows * box_cols
+    cell_count = size * size
+
+    row_of = tuple(cell // size for cell in range(cell_count))
+    col_of = tuple(cell % size for cell in range(cell_count))
+    box_of = tuple(row_of[cell] // box_rows * box_rows + col_of[cell] // box_cols
+                   for cell in range(cell_count))
+
+    rows = tuple(tuple(range(size * r, size * (r + 1))) for r in range(size))
+    cols = tuple(tuple(range(c, cell_count, size)) for c in range(size))
+    boxes = tuple(tuple(cell for cell in range(cell_count) if box_of[cell] == b)
+                  for b in range(size))
+    units = rows + cols + boxes
+
+    cell_units = tuple((row_of[cell], size + col_of[cell], 2 * size + box_of[cell])
+                       for cell in range(cell_count))
+    cell_unit_masks = tuple(sum(1 << unit for unit in cell_units[cell])
+                            for cell in range(cell_count))
+
+    peers = []
+    for cell in range(cell_count):
+        peer_set = set(rows[row_of[cell]]) | set(cols[col_of[cell]]) | set(boxes[box_of[cell]])
+        peer_set.discard(cell)
+        peers.append(tuple(sorted(peer_set)))
+
+    return BoardTopology(box_rows, box_cols, size, cell_count,
+                         row_of, col_of, box_of, rows, cols, boxes, units,
+                         cell_units, cell_unit_masks, tuple(peers))
@@ -0,0 +1,109 @@
+"""Board-wide pencil-mark candidates derived from the conflict tracker's unit masks."""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from board_topology import BoardTopology
+from conflict_engine import ConflictTracker
+from solver import propagate_singles
+
+
+class CandidateEngine:
+    """Answer candidate queries in O(1) per cell.
+
+    The conflict tracker already keeps a bitmask of the digits present in
+    every row, column and box, so a cell's candidates are the digits
+    missing from its three units. Masks use bit ``d - 1`` for digit ``d``,
+    like ``BoardState.candidates``.
+    """
+
+    def __init__(self, tracker: ConflictTracker, topology: BoardTopology) -> None:
+        """Read unit masks from ``tracker``, which must track the same board."""
+        self.tracker = tracker
+        self.topology = topology
+        self.full_mask = (1 << topology.size) - 1
+
+    def candidates(self, cell_index: int) -> int:
+        """Return the digits no peer of the cell holds.
+
+        The cell's own digit stays a candidate unless a peer repeats it.
+        """
+        present = self.tracker.present_mask
+        duplicate = self.tracker.duplicate_mask
+        row, col, box = self.topology.cell_units[cell_index]
+        used = present[row] | present[col] | present[box]
+        digit = self.tracker.values[cell_index]
+        if digit and not (duplicate[row] | duplicate[col] | duplicate[box]) & (1 << digit):
+            used &= ~(1 << digit)
+        # The tracker uses bit d for digit d
+        return self.full_mask & ~(used >> 1)
+
+    def all_candidates(self) -> List[int]:
+        """Return the candidates of every empty cell, 0 for filled cells."""
+        values = self.tracker.values
+        return [0 if values[cell_index] else self.candidates(cell_index)
+                for cell_index in range(self.topology.cell_count)]
+
+    def prune_placements(self, changes: Dict[int, Tuple[int, int]], digits: Sequence[int],
+                         candidates: Sequence[int]) -> Dict[int, Tuple[int, int]]:
+        """Extend {cell: (digit, candidates)} so placed digits leave their peers' pencil marks.
+
+        ``digits`` and ``candidates`` describe the board before the change.
+        """
+        changes = dict(changes)
+        placed = [(cell_index, digit) for cell_index, (digit, _) in changes.items()
+                  if digit and digit != digits[cell_index]]
+        for cell_index, digit in placed:
+            bit = 1 << (digit - 1)
+            for peer in self.topology.peers[cell_index]:
+                peer_digit, peer_mask = changes.get(peer, (digits[peer], candidates[peer]))
+                if peer_mask & bit:
+                    changes[peer] = (peer_digit, peer_mask & ~bit)
+        return changes
+
+    def next_single(self) -> Optional[Tuple[int, int, str]]:
+        """Return (cell, digit, technique) of the first cell a single forces.
+
+        Naked singles are looked for before hidden ones. Returns None if
+        the board has conflicts or neither technique applies.
+        """
+        if self.tracker.conflict_count:
+            return None
+        masks = self.all_candidates()
+        for cell_index, mask in enumerate(masks):
+            if mask and not mask & (mask - 1):
+                return cell_index, mask.bit_length(), 'naked single'
+
+        # A digit that fits only one cell of a unit
+        for unit in self.topology.units:
+            once = twice = 0
+            for cell_index in unit:
+                twice |= once & masks[cell_index]
+                once |= masks[cell_index]
+            hidden = once & ~twice
+            if hidden:
+                bit = hidden & -hidden
+                for cell_index in unit:
+                    if masks[cell_index] & bit:
+                        return cell_index, bit.bit_length(), 'hidden single'
+        return None
+
+    def singles(self) -> Optional[List[int]]:
+        """Run naked and hidden singles to a fixed point from the current digits.
+
+        Returns the resulting candidate masks (single bits for decided
+        cells), or None if the board has conflicts or a dead end.
+        """
+        if self.tracker.conflict_count:
+            return None
+        values = self.tracker.values
+        board = []
+        for cell_index in range(self.topology.cell_count):
+            if values[cell_index]:
+                board.append(1 << (values[cell_index] - 1))
+            else:
+                mask = self.candidates(cell_index)
+                if not mask:
+                    return None
+                board.append(mask)
+        if not propagate_singles(board, self.topology):
+            return None
+        return board
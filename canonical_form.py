@@ -0,0 +1,409 @@
+"""Canonical form of 9x9 style puzzles under the Sudoku symmetry group.
+
+Two puzzles are equivalent when one can be turned into the other by
+relabeling digits, permuting rows within a band or columns within a
+stack, swapping bands or stacks, and transposing. The canonical form is
+the lexicographically smallest equivalent grid, with 0 for empty cells
+and digits relabeled in order of first appearance.
+
+Usage: python pyg_sudoku.py dedupe puzzles.txt --index seen.idx
+"""
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby, permutations, product
+from typing import BinaryIO, Deque, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from solver import topology_for
+
+
+# Sorts after every real label: a digit that has not been labeled yet
+_NEW = 1 << 16
+
+# Search state: (transposed, rows used so far, band of the last row, stack groups,
+# column parts per stack, labels); the order of used rows no longer matters
+_State = Tuple[int, Tuple[int, ...], int, Tuple[Tuple[int, ...], ...],
+               Tuple[Tuple[Tuple[int, ...], ...], ...], Tuple[int, ...]]
+
+
+def _stack_block(row: Sequence[int], parts: Sequence[Tuple[int, ...]],
+                 labels: Sequence[int]) -> Tuple[Tuple[int, ...], list]:
+    """Return a stack's smallest output for ``row`` and its refined parts.
+
+    Inside each part of interchangeable columns, empty cells go first,
+    then already-labeled digits by label, then unlabeled digits. A
+    refined part is a tuple of columns, or a list of unlabeled columns
+    whose order still has to be branched on.
+    """
+    block = []
+    refined = []
+    for part in parts:
+        if len(part) == 1:
+            # Most parts are single columns once a few rows are placed
+            digit = row[part[0]]
+            if not digit:
+                block.append(0)
+                refined.append(part)
+            elif labels[digit]:
+                block.append(labels[digit])
+                refined.append(part)
+            else:
+                block.append(_NEW)
+                refined.append(list(part))
+            continue
+        empty = tuple(column for column in part if not row[column])
+        known = sorted((labels[row[column]], column) for column in part
+                       if row[column] and labels[row[column]])
+        new = [column for column in part if row[column] and not labels[row[column]]]
+        block.extend([0] * len(empty))
+        block.extend(label for label, _ in known)
+        block.extend([_NEW] * len(new))
+        if empty:
+            refined.append(empty)
+        # Equal labels only happen on boards with conflicts; keep them together
+        for label, group in groupby(known, key=lambda item: item[0]):
+            refined.append(tuple(column for _, column in group))
+        if new:
+            refined.append(new)
+    return tuple(block), refined
+
+
+def _arrange(row: Sequence[int], state: _State) -> Tuple[Tuple[int, ...], list, dict]:
+    """Return the smallest symbolic output of ``row`` over the orders ``state`` allows.
+
+    Also returns the runs of tied stacks inside each group and each
+    stack's refined parts, which ``_refine`` turns into successor states.
+    """
+    blocks = {}
+    refined = {}
+    for stack, parts in enumerate(state[4]):
+        blocks[stack], refined[stack] = _stack_block(row, parts, state[5])
+
+    output = []
+    runs = []
+    for group in state[3]:
+        ordered = sorted(group, key=blocks.__getitem__)
+        run = [ordered[0]]
+        for stack in ordered[1:]:
+            if blocks[stack] == blocks[run[0]]:
+                run.append(stack)
+            else:
+                runs.append(run)
+                run = [stack]
+        runs.append(run)
+        for stack in ordered:
+            output.extend(blocks[stack])
+    return tuple(output), runs, {stack: (blocks[stack], refined[stack]) for stack in blocks}
+
+
+def _refine(row: Sequence[int], state: _State, row_index: int, box: int, runs: list,
+            stacks: dict) -> Iterator[_State]:
+    """Yield the successor states of ``state`` after placing ``row``.
+
+    Unlabeled digits get labels in output order, so their relative order
+    matters from now on: tied stacks and parts holding them are branched
+    on, everything else stays interchangeable.
+    """
+    run_options = []
+    for run in runs:
+        if len(run) > 1 and _NEW in stacks[run[0]][0]:
+            run_options.append([[(stack,) for stack in order] for order in permutations(run)])
+        else:
+            run_options.append([[tuple(sorted(run))]])
+
+    part_options = []
+    for stack in range(len(stacks)):
+        # Each ordering of a stack's unlabeled columns makes them singleton parts
+        choices = [[tuple((column,) for column in order) for order in permutations(part)]
+                   if isinstance(part, list) else [(part,)]
+                   for part in stacks[stack][1]]
+        part_options.append([tuple(part for split in choice for part in split)
+                             for choice in product(*choices)])
+
+    for run_choice in product(*run_options):
+        groups = tuple(group for option in run_choice for group in option)
+        for parts in product(*part_options):
+            labels = list(state[5])
+            next_label = max(labels) + 1
+            for group in groups:
+                for stack in group:
+                    for part in parts[stack]:
+                        for column in part:
+                            digit = row[column]
+                            if digit and not labels[digit]:
+                                labels[digit] = next_label
+                                next_label += 1
+            used = tuple(sorted(state[1] + (row_index,)))
+            yield (state[0], used, row_index // box, groups, parts, tuple(labels))
+
+
+def canonical_form(givens: Sequence[int]) -> Tuple[int, ...]:
+    """Return the minimal lexicographic representative of a puzzle.
+
+    Rows are fixed one at a time. Columns are not enumerated up front:
+    a state keeps groups of stacks and parts of columns whose order does
+    not matter yet and only splits them when a row tells them apart, so
+    sparse and highly symmetric puzzles stay cheap.
+    """
+    topology = topology_for(givens)
+    if topology.box_rows != topology.box_cols:
+        raise ValueError('canonical forms need square boxes')
+    size = topology.size
+    box = topology.box_rows
+
+    grid = [tuple(givens[row * size:(row + 1) * size]) for row in range(size)]
+    grids = (grid, [tuple(column) for column in zip(*grid)])
+    stack_parts = tuple((tuple(range(stack * box, (stack + 1) * box)),) for stack in range(box))
+    states: List[_State] = [(flip, (), -1, (tuple(range(box)),), stack_parts, (0,) * (size + 1))
+                            for flip in (0, 1)]
+
+    result: List[int] = []
+    label_count = 0
+    for position in range(size):
+        best = None
+        winners = []
+        for state in states:
+            rows = grids[state[0]]
+            used = state[1]
+            if position % box:
+                band = state[2]
+                choices = [r for r in range(band * box, (band + 1) * box) if r not in used]
+            else:
+                used_bands = {r // box for r in used}
+                choices = [r for r in range(size) if r // box not in used_bands]
+            for row_index in choices:
+                output, runs, stacks = _arrange(rows[row_index], state)
+                if best is None or output < best:
+                    best = output
+                    winners = []
+                if output == best:
+                    winners.append((state, row_index, runs, stacks))
+
+        # Number the unlabeled digits in order of appearance
+        for value in best:
+            if value == _NEW:
+                label_count += 1
+                result.append(label_count)
+            else:
+                result.append(value)
+
+        next_states = {}
+        for state, row_index, runs, stacks in winners:
+            for successor in _refine(grids[state[0]][row_index], state, row_index, box, runs, stacks):
+                next_states[successor] = None
+        states = list(next_states)
+    return tuple(result)
+
+
+def canonical_key(givens: Sequence[int]) -> bytes:
+    """Return a 16-byte hash of the canonical form, shared by equivalent puzzles."""
+    return hashlib.blake2b(bytes(canonical_form(givens)), digest_size=16).digest()
+
+
+class DedupeIndex:
+    """Set of 64-bit canonical puzzle hashes in an open-addressing table.
+
+    The table is a memory-mapped file (an anonymous map without a path)
+    with 8 bytes per slot, so memory use is bounded by the table size
+    rather than Python objects, and the index persists across runs. It
+    doubles when half full.
+    """
+    MAGIC = b'PSDX'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHxxQQ')
+    SLOT = struct.Struct('<Q')
+
+    def __init__(self, path: Optional[str] = None, capacity: int = 1 << 16) -> None:
+        """Open the index at ``path``, creating it if it does not exist."""
+        self.path = path
+        if path and os.path.exists(path):
+            self._file = open(path, 'r+b')
+            self._map = mmap.mmap(self._file.fileno(), 0)
+            magic, version, self.count, self.capacity = self.HEADER.unpack_from(self._map, 0)
+            if magic != self.MAGIC or version != self.VERSION:
+                raise ValueError(f'{path} is not a version {self.VERSION} dedupe index')
+        else:
+            self.count = 0
+            self.capacity = max(16, 1 << (capacity - 1).bit_length())
+            self._file, self._map = self._create(path, self.capacity)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, key: bytes) -> bool:
+        return self._find(self._hash(key))[1]
+
+    def add(self, key: bytes) -> bool:
+        """Add a canonical key; return False if it was already present."""
+        value = self._hash(key)
+        offset, found = self._find(value)
+        if found:
+            return False
+        self.SLOT.pack_into(self._map, offset, value)
+        self.count += 1
+        if 2 * self.count > self.capacity:
+            self._grow()
+        return True
+
+    def close(self) -> None:
+        """Write the header and close the map."""
+        self.HEADER.pack_into(self._map, 0, self.MAGIC, self.VERSION, self.count, self.capacity)
+        self._map.close()
+        if self._file is not None:
+            self._file.close()
+
+    @staticmethod
+    def _hash(key: bytes) -> int:
+        """Map a key to a nonzero 64-bit slot value (0 marks an empty slot)."""
+        return int.from_bytes(key[:8], 'little') | 1
+
+    def _find(self, value: int) -> Tuple[int, bool]:
+        """Return the offset of ``value``'s slot and whether it is filled with it."""
+        mask = self.capacity - 1
+        index = (value >> 1) & mask
+        while True:
+            offset = self.HEADER.size + index * self.SLOT.size
+            stored = self.SLOT.unpack_from(self._map, offset)[0]
+            if stored == value:
+                return offset, True
+            if not stored:
+                return offset, False
+            index = (index + 1) & mask
+
+    def _create(self, path: Optional[str], capacity: int) -> Tuple[Optional[BinaryIO], mmap.mmap]:
+        """Create an empty, zero-filled table."""
+        size = self.HEADER.size + capacity * self.SLOT.size
+        if path is None:
+            return None, mmap.mmap(-1, size)
+        table = open(path, 'w+b')
+        table.truncate(size)
+        return table, mmap.mmap(table.fileno(), 0)
+
+    def _grow(self) -> None:
+        """Rehash every key into a table twice the size."""
+        old_file, old_map, old_capacity = self._file, self._map, self.capacity
+        temp_path = self.path + '.tmp' if self.path else None
+        self.capacity *= 2
+        self._file, self._map = self._create(temp_path, self.capacity)
+        for index in range(old_capacity):
+            value = self.SLOT.unpack_from(old_map, self.HEADER.size + index * self.SLOT.size)[0]
+            if value:
+                self.SLOT.pack_into(self._map, self._find(value)[0], value)
+        old_map.close()
+        if old_file is not None:
+            old_file.close()
+            self._map.close()
+            self._file.close()
+            os.replace(temp_path, self.path)
+            self._file = open(self.path, 'r+b')
+            self._map = mmap.mmap(self._file.fileno(), 0)
+
+
+def _canonical_keys(puzzles: Sequence[Sequence[int]]) -> List[bytes]:
+    """Canonicalize a chunk of puzzles (runs in a worker process)."""
+    return [canonical_key(givens) for givens in puzzles]
+
+
+def _chunks(lines: TextIO, chunk_size: int) -> Iterator[Tuple[List[str], List[List[int]]]]:
+    """Yield (lines, puzzles) chunks of puzzle lines, skipping blanks and comments."""
+    # Imported here because puzzle_generator imports the rater, which imports this module
+    from puzzle_corpus import parse_line
+
+    kept_lines: List[str] = []
+    puzzles: List[List[int]] = []
+    for line in lines:
+        parsed = parse_line(line)
+        if parsed is None:
+            continue
+        kept_lines.append(line)
+        puzzles.append(parsed[0])
+        if len(puzzles) == chunk_size:
+            yield kept_lines, puzzles
+            kept_lines, puzzles = [], []
+    if puzzles:
+        yield kept_lines, puzzles
+
+
+def dedupe_lines(lines: TextIO, output: TextIO, index: DedupeIndex, workers: int = 1,
+                 chunk_size: int = 256) -> Tuple[int, int]:
+    """Copy puzzle lines whose canonical form is new to ``index``.
+
+    Keys are computed by up to ``workers`` processes with at most
+    ``2 * workers`` chunks in flight; lines keep their input order so the
+    first of several equivalent puzzles is the one kept. Returns
+    (kept, dropped).
+    """
+    kept = dropped = 0
+
+    def keep(chunk_lines: List[str], keys: List[bytes]) -> None:
+        nonlocal kept, dropped
+        for line, key in zip(chunk_lines, keys):
+            if index.add(key):
+                output.write(line if line.endswith('\n') else line + '\n')
+                kept += 1
+            else:
+                dropped += 1
+
+    if workers <= 1:
+        for chunk_lines, puzzles in _chunks(lines, chunk_size):
+            keep(chunk_lines, _canonical_keys(puzzles))
+        return kept, dropped
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: Deque = deque()
+        for chunk_lines, puzzles in _chunks(lines, chunk_size):
+            pending.append((chunk_lines, executor.submit(_canonical_keys, puzzles)))
+            if len(pending) >= 2 * workers:
+                chunk_lines, future = pending.popleft()
+                keep(chunk_lines, future.result())
+        while pending:
+            chunk_lines, future = pending.popleft()
+            keep(chunk_lines, future.result())
+    return kept, dropped
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Entry point for the ``dedupe`` command."""
+    parser = argparse.ArgumentParser(prog='dedupe', description='Drop puzzles equivalent to one already seen.')
+    parser.add_argument('input', help="81-char puzzle file, '-' for stdin")
+    parser.add_argument('--index', help='persistent index of puzzles seen in earlier runs')
+    parser.add_argument('--output', default='-', help="output file, '-' for stdout")
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        index = DedupeIndex(args.index)
+    except (ValueError, OSError) as error:
+        print(f'error: {error}', file=sys.stderr)
+        return 1
+    try:
+        lines = sys.stdin if args.input == '-' else open(args.input)
+        output = sys.stdout if args.output == '-' else open(args.output, 'w')
+        try:
+            kept, dropped = dedupe_lines(lines, output, index, args.workers)
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+            if output is not sys.stdout:
+                output.close()
+    except (ValueError, OSError) as error:
+        print(f'error: {error}', file=sys.stderr)
+        return 1
+    finally:
+        index.close()
+
+    elapsed = time.perf_counter() - start
+    rate = (kept + dropped) / elapsed if elapsed else 0.0
+    print(f'kept {kept}, dropped {dropped} equivalent puzzles ({rate:.1f} puzzles/sec)', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Incremental conflict tracking for Sudoku boards."""
+from typing import Iterable, List, Set
+
+from board_topology import BoardTopology
+
+
+class ConflictTracker:
+    """Track duplicate digits per row, column and box with bitmasks.
+
+    Every unit keeps a bitmask of the digits it contains, a bitmask of the
+    digits it contains more than once and the cells holding each digit, so
+    changing one cell only touches its three units.
+    """
+
+    def __init__(self, topology: BoardTopology) -> None:
+        """Create an empty tracker for the given board geometry."""
+        self.total_cells = topology.cell_count
+        self.cell_units = topology.cell_units
+        grid_size = topology.size
+        unit_count = len(topology.units)
+
+        self.values = [0] * self.total_cells
+        self.holders = [[set() for _ in range(grid_size + 1)] for _ in range(unit_count)]
+        self.present_mask = [0] * unit_count
+        self.duplicate_mask = [0] * unit_count
+        self.conflicts = [False] * self.total_cells
+        self.conflict_count = 0
+
+    def clear(self) -> None:
+        """Empty every cell."""
+        for cell_index in range(self.total_cells):
+            self.set(cell_index, 0)
+
+    def load(self, values: Iterable[int]) -> None:
+        """Replace the whole board, e.g. after generating a new puzzle."""
+        self.clear()
+        for cell_index, digit in enumerate(values):
+            if digit:
+                self.set(cell_index, digit)
+
+    def is_conflict(self, cell_index: int) -> bool:
+        """Return True if the cell shares its digit with a peer."""
+        return self.conflicts[cell_index]
+
+    def set(self, cell_index: int, digit: int) -> List[int]:
+        """Set a cell (0 clears it) and return the cells whose conflict state changed."""
+        old_digit = self.values[cell_index]
+        if old_digit == digit:
+            return []
+
+        affected: Set[int] = {cell_index}
+        units = self.cell_units[cell_index]
+
+        if old_digit:
+            bit = 1 << old_digit
+            for unit in units:
+                holders = self.holders[unit][old_digit]
+                holders.discard(cell_index)
+                count = len(holders)
+                if count == 0:
+                    self.present_mask[unit] &= ~bit
+                elif count == 1:
+                    self.duplicate_mask[unit] &= ~bit
+                affected.update(holders)
+
+        self.values[cell_index] = digit
+
+        if digit:
+            bit = 1 << digit
+            for unit in units:
+                holders = self.holders[unit][digit]
+                holders.add(cell_index)
+                count = len(holders)
+                if count == 1:
+                    self.present_mask[unit] |= bit
+                elif count == 2:
+                    self.duplicate_mask[unit] |= bit
+                affected.update(holders)
+
+        changed = []
+        for other_index in affected:
+            has_conflict = self._compute_conflict(other_index)
+            if has_conflict != self.conflicts[other_index]:
+                self.conflicts[other_index] = has_conflict
+                self.conflict_count += 1 if has_conflict else -1
+                changed.append(other_index)
+        return changed
+
+    def _compute_conflict(self, cell_index: int) -> bool:
+        """Check the cell's digit against the duplicate masks of its units."""
+        digit = self.values[cell_index]
+        if not digit:
+            return False
+        bit = 1 << digit
+        for unit in self.cell_units[cell_index]:
+            if self.duplicate_mask[unit] & bit:
+                return True
+        return False
@@ -0,0 +1,393 @@
+"""Rate puzzles by the hardest human technique needed to solve them.
+
+The rater solves like a person would: it always applies the simplest
+technique that makes progress and reports the hardest one it needed.
+Scores loosely follow Sudoku Explainer's scale. When no technique
+applies it falls back to search and adds half a point per nested guess.
+
+Usage: python pyg_sudoku.py rate puzzles.txt --cache ratings.db
+"""
+import argparse
+import dbm
+import hashlib
+import struct
+import sys
+import time
+from itertools import combinations
+from typing import Callable, List, NamedTuple, Optional, Sequence, TextIO, Tuple
+
+from board_topology import BoardTopology
+from canonical_form import canonical_key
+from solver import guess_depth, propagate_singles, topology_for
+
+# (name, score) from easiest to hardest; backtracking scores one guess
+TECHNIQUES = (
+    ('hidden single', 1.5),
+    ('naked single', 2.3),
+    ('pointing', 2.6),
+    ('claiming', 2.8),
+    ('naked pair', 3.0),
+    ('x-wing', 3.2),
+    ('hidden pair', 3.4),
+    ('naked triple', 3.6),
+    ('hidden triple', 4.0),
+    ('backtracking', 5.0),
+)
+# Extra score per nested guess beyond the first
+GUESS_SCORE = 0.5
+
+
+class Rating(NamedTuple):
+    """Score of a puzzle and the hardest technique it needed."""
+    score: float
+    technique: str
+
+
+class _HumanSolver:
+    """Candidate grid that technique steps eliminate from in place."""
+
+    def __init__(self, givens: Sequence[int], topology: BoardTopology) -> None:
+        self.topology = topology
+        self.values = [0] * topology.cell_count
+        self.candidates = [(1 << topology.size) - 1] * topology.cell_count
+        self.unsolved = topology.cell_count
+        for cell, digit in enumerate(givens):
+            if digit:
+                if not self.candidates[cell] >> (digit - 1) & 1:
+                    raise ValueError('givens contain a conflict')
+                self._place(cell, 1 << (digit - 1))
+
+    def _place(self, cell: int, bit: int) -> None:
+        """Fill a cell and remove its digit from its peers."""
+        self.values[cell] = bit.bit_length()
+        self.candidates[cell] = 0
+        self.unsolved -= 1
+        candidates = self.candidates
+        for peer in self.topology.peers[cell]:
+            candidates[peer] &= ~bit
+
+    def _eliminate(self, cells: Sequence[int], bits: int) -> bool:
+        """Remove ``bits`` from ``cells``; return True if anything changed."""
+        changed = False
+        candidates = self.candidates
+        for cell in cells:
+            if candidates[cell] & bits:
+                candidates[cell] &= ~bits
+                changed = True
+        return changed
+
+    def hidden_single(self) -> bool:
+        """Place digits that fit in only one cell of a unit."""
+        candidates = self.candidates
+        placed = False
+        for unit in self.topology.units:
+            seen_once = 0
+            seen_twice = 0
+            for cell in unit:
+                mask = candidates[cell]
+                seen_twice |= seen_once & mask
+                seen_once |= mask
+            hidden = seen_once & ~seen_twice
+            while hidden:
+                bit = hidden & -hidden
+                hidden ^= bit
+                for cell in unit:
+                    if candidates[cell] & bit:
+                        self._place(cell, bit)
+                        placed = True
+                        break
+        return placed
+
+    def naked_single(self) -> bool:
+        """Place cells that have a single candidate left."""
+        placed = False
+        for cell, mask in enumerate(self.candidates):
+            if mask and not mask & (mask - 1):
+                self._place(cell, mask)
+                placed = True
+        return placed
+
+    def _confined(self, units: Sequence[Sequence[int]], unit_of: Sequence[int],
+                  targets: Sequence[Sequence[int]]) -> bool:
+        """Eliminate a digit confined to one target unit inside each of ``units``."""
+        candidates = self.candidates
+        for unit in units:
+            union = 0
+            for cell in unit:
+                union |= candidates[cell]
+            while union:
+                bit = union & -union
+                union ^= bit
+                cells = [cell for cell in unit if candidates[cell] & bit]
+                target = unit_of[cells[0]]
+                if len(cells) > 1 and all(unit_of[cell] == target for cell in cells):
+                    inside = set(unit)
+                    if self._eliminate([cell for cell in targets[target] if cell not in inside], bit):
+                        return True
+        return False
+
+    def pointing(self) -> bool:
+        """A digit confined to one row or column of a box leaves the rest of that line."""
+        topology = self.topology
+        return (self._confined(topology.boxes, topology.row_of, topology.rows)
+                or self._confined(topology.boxes, topology.col_of, topology.cols))
+
+    def claiming(self) -> bool:
+        """A digit confined to one box within a line leaves the rest of that box."""
+        topology = self.topology
+        return (self._confined(topology.rows, topology.box_of, topology.boxes)
+                or self._confined(topology.cols, topology.box_of, topology.boxes))
+
+    def _naked_subset(self, size: int) -> bool:
+        """``size`` cells of a unit sharing ``size`` candidates own those digits."""
+        candidates = self.candidates
+        for unit in self.topology.units:
+            open_cells = [cell for cell in unit if candidates[cell]]
+            if len(open_cells) <= size:
+                continue
+            small = [cell for cell in open_cells if candidates[cell].bit_count() <= size]
+            for subset in combinations(small, size):
+                union = 0
+                for cell in subset:
+                    union |= candidates[cell]
+                if union.bit_count() == size:
+                    others = [cell for cell in open_cells if cell not in subset]
+                    if self._eliminate(others, union):
+                        return True
+        return False
+
+    def _hidden_subset(self, size: int) -> bool:
+        """``size`` digits confined to ``size`` cells of a unit exclude other digits there."""
+        candidates = self.candidates
+        for unit in self.topology.units:
+            positions = {}
+            for bit_index in range(self.topology.size):
+                bit = 1 << bit_index
+                cells = frozenset(cell for cell in unit if candidates[cell] & bit)
+                if 1 < len(cells) <= size:
+                    positions[bit] = cells
+            if len(positions) < size:
+                continue
+            for digits in combinations(positions, size):
+                cells = frozenset().union(*(positions[bit] for bit in digits))
+                if len(cells) == size:
+                    keep = sum(digits)
+                    changed = False
+                    for cell in cells:
+                        if candidates[cell] & ~keep:
+                            candidates[cell] &= keep
+                            changed = True
+                    if changed:
+                        return True
+        return False
+
+    def naked_pair(self) -> bool:
+        return self._naked_subset(2)
+
+    def naked_triple(self) -> bool:
+        return self._naked_subset(3)
+
+    def hidden_pair(self) -> bool:
+        return self._hidden_subset(2)
+
+    def hidden_triple(self) -> bool:
+        return self._hidden_subset(3)
+
+    def x_wing(self) -> bool:
+        """A digit in exactly the same two columns of two rows leaves those columns (and vice versa)."""
+        topology = self.topology
+        candidates = self.candidates
+        for lines, crosses, cross_of in ((topology.rows, topology.cols, topology.col_of),
+                                         (topology.cols, topology.rows, topology.row_of)):
+            for bit_index in range(topology.size):
+                bit = 1 << bit_index
+                seen = {}
+                for line_index, line in enumerate(lines):
+                    spots = 0
+                    for cell in line:
+                        if candidates[cell] & bit:
+                            spots |= 1 << cross_of[cell]
+                    if spots.bit_count() != 2:
+                        continue
+                    if spots in seen:
+                        wing = set(lines[seen[spots]]) | set(line)
+                        first = (spots & -spots).bit_length() - 1
+                        second = spots.bit_length() - 1
+                        others = [cell for cross in (first, second) for cell in crosses[cross]
+                                  if cell not in wing]
+                        if self._eliminate(others, bit):
+                            return True
+                    else:
+                        seen[spots] = line_index
+        return False
+
+    def rate(self) -> Rating:
+        """Solve with the simplest technique that works and return the rating."""
+        steps: List[Tuple[str, float, Callable[[], bool]]] = [
+            (name, score, getattr(self, name.replace(' ', '_').replace('-', '_')))
+            for name, score in TECHNIQUES[:-1]
+        ]
+        hardest = TECHNIQUES[0]
+        while self.unsolved:
+            for name, score, step in steps:
+                if step():
+                    if score > hardest[1]:
+                        hardest = (name, score)
+                    break
+            else:
+                return self._rate_search(hardest)
+        return Rating(hardest[1], hardest[0])
+
+    def _rate_search(self, hardest: Tuple[str, float]) -> Rating:
+        """Score a board the techniques got stuck on by its guess depth."""
+        board = [1 << (digit - 1) if digit else mask
+                 for digit, mask in zip(self.values, self.candidates)]
+        if not propagate_singles(board, self.topology):
+            raise ValueError('puzzle has no solution')
+        depth = guess_depth(board, self.topology)
+        if depth < 0:
+            raise ValueError('puzzle has no solution')
+        name, score = TECHNIQUES[-1]
+        return Rating(score + GUESS_SCORE * max(0, depth - 1), name)
+
+
+def rate_puzzle(givens: Sequence[int], topology: Optional[BoardTopology] = None) -> Rating:
+    """Rate a puzzle; raises ValueError if it has conflicts or no solution."""
+    return _HumanSolver(givens, topology_for(givens, topology)).rate()
+
+
+def puzzle_key(givens: Sequence[int]) -> bytes:
+    """Return the exact cache key of a puzzle: a hash of its givens."""
+    return hashlib.blake2b(bytes(givens), digest_size=16).digest()
+
+
+class RatingCache:
+    """Persistent puzzle -> rating map stored with ``dbm``.
+
+    Ratings are stored under both the exact ``puzzle_key`` and the
+    ``canonical_key``, so equivalent puzzles share a rating while a puzzle
+    seen before is found without canonicalizing it (about 1 ms each).
+    Without a path the cache lives in memory only.
+    """
+    RECORD = struct.Struct('<HB')
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        """Open (creating if needed) the cache at ``path``."""
+        self._db = dbm.open(path, 'c') if path else {}
+        self.hits = 0
+        self.misses = 0
+
+    def close(self) -> None:
+        """Flush and close the database."""
+        if not isinstance(self._db, dict):
+            self._db.close()
+
+    def get(self, givens: Sequence[int], key: Optional[bytes] = None) -> Optional[Rating]:
+        """Return the stored rating of a puzzle, if any.
+
+        ``key`` is the puzzle's canonical key, if the caller already has it.
+        """
+        record = self._lookup(givens, key)[0]
+        return None if record is None else self._unpack(record)
+
+    def put(self, givens: Sequence[int], rating: Rating, key: Optional[bytes] = None) -> None:
+        """Store the rating of a puzzle under its exact and canonical keys."""
+        technique = [name for name, _ in TECHNIQUES].index(rating.technique)
+        record = self.RECORD.pack(round(rating.score * 100), technique)
+        self._db[puzzle_key(givens)] = record
+        self._db[canonical_key(givens) if key is None else key] = record
+
+    def rate(self, givens: Sequence[int], topology: Optional[BoardTopology] = None,
+             key: Optional[bytes] = None) -> Rating:
+        """Return the cached rating of a puzzle, rating it on a miss."""
+        record, key = self._lookup(givens, key)
+        if record is not None:
+            self.hits += 1
+            return self._unpack(record)
+        self.misses += 1
+        rating = rate_puzzle(givens, topology)
+        self.put(givens, rating, key)
+        return rating
+
+    def _lookup(self, givens: Sequence[int],
+                key: Optional[bytes]) -> Tuple[Optional[bytes], Optional[bytes]]:
+        """Find a puzzle's record; returns it and the canonical key, if one was computed.
+
+        The exact key is tried first. A puzzle found only through an
+        equivalent one is stored under its exact key as well.
+        """
+        exact = puzzle_key(givens)
+        record = self._db.get(exact)
+        if record is None:
+            if key is None:
+                key = canonical_key(givens)
+            record = self._db.get(key)
+            if record is not None:
+                self._db[exact] = record
+        return record, key
+
+    def _unpack(self, record: bytes) -> Rating:
+        """Decode a stored record."""
+        hundredths, technique = self.RECORD.unpack(record)
+        return Rating(hundredths / 100, TECHNIQUES[technique][0])
+
+
+def rate_lines(lines: TextIO, output: TextIO, cache: Optional[RatingCache] = None) -> int:
+    """Rate every puzzle line and write ``<puzzle> <score> <technique>`` lines."""
+    # Imported here because puzzle_generator imports this module
+    from puzzle_corpus import parse_line
+    from puzzle_generator import format_grid
+
+    count = 0
+    for line_number, line in enumerate(lines, 1):
+        parsed = parse_line(line)
+        if parsed is None:
+            continue
+        givens = parsed[0]
+        try:
+            rating = rate_puzzle(givens) if cache is None else cache.rate(givens)
+        except ValueError as error:
+            raise ValueError(f'line {line_number}: {error}') from None
+        output.write(f'{format_grid(givens)} {rating.score:.1f} {rating.technique}\n')
+        count += 1
+    return count
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Entry point for the ``rate`` command."""
+    parser = argparse.ArgumentParser(prog='rate', description='Rate puzzles by solving technique.')
+    parser.add_argument('input', help="81-char puzzle file, '-' for stdin")
+    parser.add_argument('--cache', help='persistent rating cache file')
+    parser.add_argument('--output', default='-', help="output file, '-' for stdout")
+    args = parser.parse_args(argv)
+
+    # Without a cache file nothing is reused, so skip the keying entirely
+    cache = RatingCache(args.cache) if args.cache else None
+    start = time.perf_counter()
+    try:
+        lines = sys.stdin if args.input == '-' else open(args.input)
+        output = sys.stdout if args.output == '-' else open(args.output, 'w')
+        try:
+            count = rate_lines(lines, output, cache)
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+            if output is not sys.stdout:
+                output.close()
+    except (ValueError, OSError) as error:
+        print(f'error: {error}', file=sys.stderr)
+        return 1
+    finally:
+        if cache is not None:
+            cache.close()
+
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed else 0.0
+    cached = cache.hits if cache is not None else 0
+    print(f'rated {count} puzzles in {elapsed:.2f}s ({rate:.1f} puzzles/sec, '
+          f'{cached} cached)', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""Undo/redo history stored as per-cell deltas."""
+from collections import deque
+from typing import Deque, Dict, Iterable, NamedTuple, Optional, Tuple
+
+# cell -> (digit, candidates)
+CellChanges = Dict[int, Tuple[int, int]]
+
+
+class CellEdit(NamedTuple):
+    """One cell's value and pencil marks before and after an edit."""
+    cell: int
+    old_digit: int
+    old_candidates: int
+    new_digit: int
+    new_candidates: int
+
+
+class EditHistory:
+    """Bounded undo/redo stack of edits.
+
+    Each step is the tuple of ``CellEdit`` records of one user action, so
+    memory grows with the cells touched rather than the board size. At
+    most ``max_depth`` steps are kept; older ones are dropped.
+    """
+
+    def __init__(self, max_depth: int = 1000) -> None:
+        """Create an empty history."""
+        self.max_depth = max_depth
+        self._steps: Deque[Tuple[CellEdit, ...]] = deque()
+        # Absolute step numbers: _steps[0] leads from state _base to _base + 1
+        self._base = 0
+        self._position = 0
+
+    def __len__(self) -> int:
+        return len(self._steps)
+
+    @property
+    def position(self) -> int:
+        """Absolute number of the current step."""
+        return self._position
+
+    @property
+    def can_undo(self) -> bool:
+        return self._position > self._base
+
+    @property
+    def can_redo(self) -> bool:
+        return self._position < self._base + len(self._steps)
+
+    def clear(self) -> None:
+        """Forget every step, e.g. when a new puzzle is loaded."""
+        self._steps.clear()
+        self._base = 0
+        self._position = 0
+
+    def record(self, edits: Iterable[CellEdit]) -> None:
+        """Push a step that has already been applied to the board.
+
+        Steps that could have been redone are discarded.
+        """
+        edits = tuple(edits)
+        if not edits:
+            return
+
+        # A new edit forks the history: drop the redo tail
+        while self._base + len(self._steps) > self._position:
+            self._steps.pop()
+
+        self._steps.append(edits)
+        self._position += 1
+
+        while len(self._steps) > self.max_depth:
+            self._steps.popleft()
+            self._base += 1
+
+    def undo(self) -> Optional[CellChanges]:
+        """Step back once; return the cell values to restore, or None."""
+        if not self.can_undo:
+            return None
+        return self.seek(self._position - 1)
+
+    def redo(self) -> Optional[CellChanges]:
+        """Step forward once; return the cell values to apply, or None."""
+        if not self.can_redo:
+            return None
+        return self.seek(self._position + 1)
+
+    def seek(self, target: int) -> CellChanges:
+        """Move to absolute step ``target`` and return the cells that change.
+
+        Consecutive edits of the same cell collapse into one change.
+        """
+        target = max(self._base, min(target, self._base + len(self._steps)))
+        changes: CellChanges = {}
+
+        if target < self._position:
+            for step in range(self._position - 1, target - 1, -1):
+                for edit in self._steps[step - self._base]:
+                    changes[edit.cell] = (edit.old_digit, edit.old_candidates)
+        else:
+            for step in range(self._position, target):
+                for edit in self._steps[step - self._base]:
+                    changes[edit.cell] = (edit.new_digit, edit.new_candidates)
+        self._position = target
+        return changes
@@ -0,0 +1,140 @@
+"""Opt-in per-frame timing of the game's hot paths.
+
+The profiler wraps the named methods of one object with timing shims, so
+nothing is patched (and nothing costs anything) unless it is enabled.
+Spans are kept in bounded buffers and can be written out as a Chrome
+trace (``chrome://tracing`` / Perfetto) or as CSV.
+"""
+import csv
+import json
+import os
+import time
+from collections import deque
+from functools import wraps
+from typing import Callable, Deque, Iterable, List, Optional, Tuple
+
+import pygame
+
+# (name, frame number, start ns, duration ns)
+Span = Tuple[str, int, int, int]
+
+
+class FrameProfiler:
+    """Collect frame times and per-method spans for a running game.
+
+    ``window`` frames feed the FPS and percentile figures; at most
+    ``max_spans`` spans are kept for export, oldest dropped first.
+    """
+
+    def __init__(self, window: int = 600, max_spans: int = 200_000,
+                 overlay_interval_ms: int = 500) -> None:
+        """Create an idle profiler; call ``instrument`` to attach it."""
+        self.window = window
+        self.overlay_interval_ms = overlay_interval_ms
+        self.frame = 0
+        self.frame_times: Deque[int] = deque(maxlen=window)
+        self.frame_ends: Deque[int] = deque(maxlen=window)
+        self.spans: Deque[Span] = deque(maxlen=max_spans)
+        self._origin = time.perf_counter_ns()
+        self._frame_start = 0
+        self._overlay: Optional[pygame.Surface] = None
+        self._overlay_time = 0
+
+    def instrument(self, target: object, names: Iterable[str]) -> None:
+        """Replace ``target``'s methods ``names`` with timed wrappers.
+
+        The wrappers are instance attributes, so calls through ``self``
+        are timed too and the class itself stays untouched.
+        """
+        for name in names:
+            setattr(target, name, self._timed(name, getattr(target, name)))
+
+    def _timed(self, name: str, method: Callable) -> Callable:
+        spans = self.spans
+        clock = time.perf_counter_ns
+
+        @wraps(method)
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                spans.append((name, self.frame, start, clock() - start))
+        return timed
+
+    def begin_frame(self) -> None:
+        """Mark the start of a frame's work (after any idle wait)."""
+        self.frame += 1
+        self._frame_start = time.perf_counter_ns()
+
+    def end_frame(self) -> None:
+        """Mark the end of a frame and record its duration."""
+        end = time.perf_counter_ns()
+        duration = end - self._frame_start
+        self.frame_times.append(duration)
+        self.frame_ends.append(end)
+        self.spans.append(('frame', self.frame, self._frame_start, duration))
+
+    def fps(self) -> float:
+        """Frames per second over the last second of recorded frames."""
+        if not self.frame_ends:
+            return 0.0
+        last = self.frame_ends[-1]
+        recent = [end for end in self.frame_ends if last - end < 1_000_000_000]
+        if len(recent) < 2:
+            return 0.0
+        return (len(recent) - 1) * 1e9 / (last - recent[0])
+
+    def percentile(self, fraction: float) -> float:
+        """Frame time in milliseconds at ``fraction`` (0..1) of the window."""
+        if not self.frame_times:
+            return 0.0
+        ordered = sorted(self.frame_times)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] / 1e6
+
+    def summary(self) -> str:
+        """One-line FPS and frame-time summary."""
+        return (f'{self.fps():.0f} fps  p50 {self.percentile(0.5):.2f} ms  '
+                f'p99 {self.percentile(0.99):.2f} ms')
+
+    def draw_overlay(self, screen: pygame.Surface, font: pygame.font.Font,
+                     position: Tuple[int, int], color: Tuple[int, int, int],
+                     background: Tuple[int, int, int]) -> pygame.Rect:
+        """Draw the summary at ``position`` and return the area to update.
+
+        The text is re-rendered at most every ``overlay_interval_ms``.
+        """
+        now = pygame.time.get_ticks()
+        if self._overlay is None or now - self._overlay_time >= self.overlay_interval_ms:
+            self._overlay = font.render(self.summary(), True, color, background)
+            self._overlay_time = now
+        rect = self._overlay.get_rect(topleft=position)
+        # Clear a wider strip so a shorter line does not leave old text behind
+        rect.width = max(rect.width, screen.get_width() - position[0] * 2)
+        screen.fill(background, rect)
+        screen.blit(self._overlay, position)
+        return rect
+
+    def _rows(self) -> List[Tuple[str, int, float, float]]:
+        """Spans as (name, frame, start ms, duration ms) from the profiler's start."""
+        origin = self._origin
+        return [(name, frame, (start - origin) / 1e6, duration / 1e6)
+                for name, frame, start, duration in self.spans]
+
+    def export(self, path: str) -> None:
+        """Write spans to ``path``: CSV for ``.csv``, Chrome trace JSON otherwise."""
+        rows = self._rows()
+        if os.path.splitext(path)[1].lower() == '.csv':
+            with open(path, 'w', newline='') as output:
+                writer = csv.writer(output)
+                writer.writerow(('name', 'frame', 'start_ms', 'duration_ms'))
+                writer.writerows((name, frame, f'{start:.4f}', f'{duration:.4f}')
+                                 for name, frame, start, duration in rows)
+            return
+
+        # Complete ('X') events in microseconds; nesting follows from the times
+        events = [{'name': name, 'ph': 'X', 'ts': start * 1000, 'dur': duration * 1000,
+                   'pid': 1, 'tid': 1, 'args': {'frame': frame}}
+                  for name, frame, start, duration in rows]
+        with open(path, 'w') as output:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, output)
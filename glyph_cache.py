@@ -0,0 +1,53 @@
+"""LRU cache for rendered text and other reusable surfaces."""
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, Tuple
+
+import pygame
+
+Color = Tuple[int, int, int]
+
+
+class GlyphCache:
+    """Cache rendered surfaces so a frame does not re-render unchanged text.
+
+    Text is keyed on (font name, text, color); other surfaces, such as
+    pencil-mark layouts, are cached under any hashable key through
+    ``get``. ``max_entries=0`` disables caching, which is handy when
+    measuring what the cache saves.
+    """
+
+    def __init__(self, fonts: Dict[str, pygame.font.Font], max_entries: int = 512) -> None:
+        """Create an empty cache over the named fonts."""
+        self.fonts = fonts
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._surfaces: 'OrderedDict[Hashable, pygame.Surface]' = OrderedDict()
+
+    def get(self, key: Hashable, build: Callable[[], pygame.Surface]) -> pygame.Surface:
+        """Return the surface cached under ``key``, building it on a miss."""
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self._surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = build()
+        if self.max_entries:
+            self._surfaces[key] = surface
+            if len(self._surfaces) > self.max_entries:
+                self._surfaces.popitem(last=False)
+        return surface
+
+    def render(self, font_name: str, text: str, color: Color) -> pygame.Surface:
+        """Return ``text`` rendered antialiased in the named font."""
+        return self.get((font_name, text, color),
+                        lambda: self.fonts[font_name].render(text, True, color))
+
+    def prewarm(self, font_name: str, texts: Iterable[str], colors: Iterable[Color]) -> None:
+        """Render every text in every color ahead of time."""
+        colors = tuple(colors)
+        for text in texts:
+            for color in colors:
+                self.render(font_name, text, color)
@@ -0,0 +1,556 @@
+"""Race server and clients: players solve the same puzzle, spectators mirror every board.
+
+Messages travel over TCP as a little-endian length (``I``) followed by a
+body that starts with its tag:
+
+* ``HELLO`` (client): role (player or spectator) and a UTF-8 name
+* ``WELCOME`` (server): client id, box rows, box cols, seed, difficulty
+  in hundredths and the givens, one byte per cell
+* ``EDITS`` (player): the player's timestamp and the cells it changed in
+  one frame, each as (cell, digit, candidate mask)
+* ``DELTA`` (server): every ``EDITS`` received during one server frame,
+  grouped by player with the sender's timestamp echoed back
+* ``FINISH`` (server): a player's id and solve time in milliseconds
+
+Only changed cells are sent, and all players' edits of a frame go out as
+one message, so the server writes once per client per frame however many
+players are active. A player measures latency as the time from sending
+its edits to seeing them come back in a ``DELTA``.
+
+Usage:
+    python pyg_sudoku.py serve --port 8765 --seed 1
+    python pyg_sudoku.py --join 127.0.0.1:8765 --name alice
+    python pyg_sudoku.py race --players 200 --spectators 5 --duration 10
+"""
+import argparse
+import asyncio
+import random
+import struct
+import sys
+import threading
+import time
+from array import array
+from contextlib import suppress
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from board_topology import box_shape, get_topology
+from edit_history import CellChanges
+from puzzle_generator import Puzzle, generate_puzzle
+from solver import solve
+
+LENGTH = struct.Struct('<I')
+HELLO = struct.Struct('<BB')
+WELCOME = struct.Struct('<BHBBqH')
+EDITS = struct.Struct('<BqH')
+ENTRY = struct.Struct('<HBI')
+DELTA = struct.Struct('<BII')
+GROUP = struct.Struct('<HqH')
+FINISH = struct.Struct('<BHI')
+
+TAG_HELLO = ord('H')
+TAG_WELCOME = ord('W')
+TAG_EDITS = ord('E')
+TAG_DELTA = ord('D')
+TAG_FINISH = ord('F')
+
+ROLE_PLAYER = 0
+ROLE_SPECTATOR = 1
+
+# Largest message either side accepts
+MAX_MESSAGE = 1 << 24
+
+
+class ProtocolError(ValueError):
+    """Raised for malformed or unexpected messages."""
+
+
+def _frame(body: bytes) -> bytes:
+    """Prefix a message body with its length."""
+    return LENGTH.pack(len(body)) + body
+
+
+async def _read_message(reader: asyncio.StreamReader) -> bytes:
+    """Read one length-prefixed message body."""
+    (length,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+    if not 0 < length <= MAX_MESSAGE:
+        raise ProtocolError(f'bad message length {length}')
+    return await reader.readexactly(length)
+
+
+def encode_edits(stamp: int, changes: CellChanges) -> bytes:
+    """Body of an ``EDITS`` message for {cell: (digit, candidates)}."""
+    return EDITS.pack(TAG_EDITS, stamp, len(changes)) + b''.join(
+        ENTRY.pack(cell, digit, candidates) for cell, (digit, candidates) in changes.items())
+
+
+@lru_cache(maxsize=8)
+def _solution(givens: Tuple[int, ...], box_rows: int, box_cols: int) -> Tuple[int, ...]:
+    """Solve the race puzzle once per process, however many clients share it."""
+    solution = solve(list(givens), get_topology(box_rows, box_cols))
+    if solution is None:
+        raise ProtocolError('the race puzzle has no solution')
+    return tuple(solution)
+
+
+class _Player:
+    """Server-side board of one player."""
+    __slots__ = ('name', 'digits', 'candidates', 'correct', 'finished_ms')
+
+    def __init__(self, name: str, puzzle: Puzzle) -> None:
+        self.name = name
+        self.digits = bytearray(puzzle.givens)
+        self.candidates = array('I', [0]) * len(puzzle.givens)
+        self.correct = sum(1 for digit in puzzle.givens if digit)
+        self.finished_ms: Optional[int] = None
+
+
+class RaceServer:
+    """Host one race: hand out the puzzle and fan edits out once per frame.
+
+    Clients whose unsent data exceeds ``max_buffer`` bytes are dropped
+    instead of letting one slow reader grow the server's memory.
+    """
+
+    def __init__(self, puzzle: Puzzle, frame_ms: int = 16, max_buffer: int = 1 << 20) -> None:
+        """Create the server; call ``start`` to listen."""
+        self.puzzle = puzzle
+        self.frame_ms = frame_ms
+        self.max_buffer = max_buffer
+        self.topology = get_topology(puzzle.box_rows, puzzle.box_cols)
+        self.players: Dict[int, _Player] = {}
+        self.frame = 0
+        self.edits_received = 0
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self._writers: Dict[int, asyncio.StreamWriter] = {}
+        self._groups: List[bytes] = []
+        self._finishes: List[bytes] = []
+        self._next_id = 0
+        self._start = 0.0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._ticker: Optional[asyncio.Task] = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> Tuple[str, int]:
+        """Listen and start the frame clock; returns the bound address."""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self._start = time.perf_counter()
+        self._ticker = asyncio.create_task(self._tick())
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def close(self) -> None:
+        """Send what is pending, then disconnect everyone."""
+        if self._ticker is not None:
+            self._ticker.cancel()
+        self.flush()
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _tick(self) -> None:
+        """Flush the pending edits every frame."""
+        interval = self.frame_ms / 1000
+        while True:
+            await asyncio.sleep(interval)
+            self.flush()
+
+    def flush(self) -> None:
+        """Broadcast this frame's edits and finishes as one write per client."""
+        if not self._groups and not self._finishes:
+            return
+        self.frame += 1
+        data = bytearray()
+        if self._groups:
+            data += _frame(DELTA.pack(TAG_DELTA, self.frame, len(self._groups)) + b''.join(self._groups))
+        for body in self._finishes:
+            data += _frame(body)
+        self._groups.clear()
+        self._finishes.clear()
+
+        data = bytes(data)
+        for client_id, writer in list(self._writers.items()):
+            if writer.transport.get_write_buffer_size() > self.max_buffer:
+                del self._writers[client_id]
+                writer.close()
+                self.dropped += 1
+                continue
+            writer.write(data)
+        self.messages_sent += len(self._writers)
+        self.bytes_sent += len(data) * len(self._writers)
+
+    def _sync_groups(self) -> List[bytes]:
+        """Every player's edited cells, for a client that joins mid-race."""
+        groups = []
+        for player_id, player in self.players.items():
+            entries = [ENTRY.pack(cell, player.digits[cell], player.candidates[cell])
+                       for cell, given in enumerate(self.puzzle.givens)
+                       if not given and (player.digits[cell] or player.candidates[cell])]
+            if entries:
+                groups.append(GROUP.pack(player_id, 0, len(entries)) + b''.join(entries))
+        return groups
+
+    def _receive_edits(self, player_id: int, body: bytes) -> None:
+        """Apply a player's edits and queue them for the next frame."""
+        _, stamp, count = EDITS.unpack_from(body, 0)
+        entries = body[EDITS.size:]
+        if len(entries) != count * ENTRY.size:
+            raise ProtocolError('truncated edits')
+        player = self.players[player_id]
+        givens = self.puzzle.givens
+        solution = self.puzzle.solution
+        size = self.topology.size
+        for cell, digit, candidates in ENTRY.iter_unpack(entries):
+            if cell >= len(givens) or digit > size or candidates >> size:
+                raise ProtocolError(f'bad edit of cell {cell}')
+            if givens[cell]:
+                continue
+            player.correct += (digit == solution[cell]) - (player.digits[cell] == solution[cell])
+            player.digits[cell] = digit
+            player.candidates[cell] = candidates
+        self.edits_received += count
+        # Forwarded as received; clients skip given cells the same way
+        self._groups.append(GROUP.pack(player_id, stamp, count) + entries)
+
+        if player.correct == len(givens) and player.finished_ms is None:
+            player.finished_ms = int((time.perf_counter() - self._start) * 1000)
+            self._finishes.append(FINISH.pack(TAG_FINISH, player_id, player.finished_ms))
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve one connection from its HELLO until it disconnects."""
+        client_id = None
+        try:
+            body = await _read_message(reader)
+            if len(body) < HELLO.size or body[0] != TAG_HELLO:
+                raise ProtocolError('expected HELLO')
+            role = body[1]
+            name = body[HELLO.size:].decode('utf-8', 'replace')
+
+            client_id = self._next_id
+            self._next_id += 1
+            if role == ROLE_PLAYER:
+                self.players[client_id] = _Player(name, self.puzzle)
+            puzzle = self.puzzle
+            seed = -1 if puzzle.seed is None else puzzle.seed
+            writer.write(_frame(WELCOME.pack(TAG_WELCOME, client_id, puzzle.box_rows, puzzle.box_cols,
+                                             seed, round(puzzle.difficulty * 100))
+                                + bytes(puzzle.givens)))
+            sync = self._sync_groups()
+            if sync:
+                writer.write(_frame(DELTA.pack(TAG_DELTA, self.frame, len(sync)) + b''.join(sync)))
+            self._writers[client_id] = writer
+
+            while True:
+                body = await _read_message(reader)
+                if body[0] != TAG_EDITS or role != ROLE_PLAYER:
+                    raise ProtocolError(f'unexpected message {body[0]:#x}')
+                self._receive_edits(client_id, body)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except (ProtocolError, struct.error) as error:
+            print(f'race: dropping client {client_id}: {error}', file=sys.stderr)
+        finally:
+            self._writers.pop(client_id, None)
+            writer.close()
+
+
+class RaceClient:
+    """Headless race client; spectators (``mirror``) keep every player's board."""
+
+    def __init__(self, mirror: bool = False) -> None:
+        """Create an unconnected client."""
+        self.mirror = mirror
+        self.player_id = -1
+        self.puzzle: Optional[Puzzle] = None
+        # Player id -> digits and candidate masks, kept when mirroring
+        self.boards: Dict[int, Tuple[bytearray, array]] = {}
+        self.finishes: Dict[int, int] = {}
+        self.latencies_ns: List[int] = []
+        self.deltas = 0
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+
+    async def connect(self, host: str, port: int, name: str = '', spectator: bool = False) -> Puzzle:
+        """Join a race and return its puzzle (solved locally; the server does not send it)."""
+        reader, self._writer = await asyncio.open_connection(host, port)
+        role = ROLE_SPECTATOR if spectator else ROLE_PLAYER
+        self._writer.write(_frame(HELLO.pack(TAG_HELLO, role) + name.encode('utf-8')))
+
+        body = await _read_message(reader)
+        if body[0] != TAG_WELCOME:
+            raise ProtocolError('expected WELCOME')
+        _, self.player_id, box_rows, box_cols, seed, hundredths = WELCOME.unpack_from(body, 0)
+        givens = tuple(body[WELCOME.size:])
+        if len(givens) != get_topology(box_rows, box_cols).cell_count:
+            raise ProtocolError('givens do not match the board size')
+        self.puzzle = Puzzle(givens, _solution(givens, box_rows, box_cols), None if seed < 0 else seed,
+                             hundredths / 100, box_rows, box_cols)
+        self._reader_task = asyncio.create_task(self._read_loop(reader))
+        return self.puzzle
+
+    def send_edits(self, changes: CellChanges) -> None:
+        """Send one frame's edits as a single message."""
+        if changes and self._writer is not None:
+            self._writer.write(_frame(encode_edits(time.perf_counter_ns(), changes)))
+
+    async def close(self) -> None:
+        """Disconnect."""
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._reader_task
+        if self._writer is not None:
+            self._writer.close()
+
+    async def _read_loop(self, reader: asyncio.StreamReader) -> None:
+        """Apply incoming deltas and finishes until the server goes away."""
+        try:
+            while True:
+                body = await _read_message(reader)
+                if body[0] == TAG_DELTA:
+                    self._apply_delta(body)
+                elif body[0] == TAG_FINISH:
+                    _, player_id, time_ms = FINISH.unpack(body)
+                    self.finishes[player_id] = time_ms
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    def _apply_delta(self, body: bytes) -> None:
+        """Record latency of our own edits and, when mirroring, apply everyone's."""
+        now = time.perf_counter_ns()
+        self.deltas += 1
+        _, _, group_count = DELTA.unpack_from(body, 0)
+        offset = DELTA.size
+        givens = self.puzzle.givens
+        for _ in range(group_count):
+            player_id, stamp, count = GROUP.unpack_from(body, offset)
+            offset += GROUP.size
+            end = offset + count * ENTRY.size
+            if player_id == self.player_id and stamp:
+                self.latencies_ns.append(now - stamp)
+            if self.mirror:
+                board = self.boards.get(player_id)
+                if board is None:
+                    board = self.boards[player_id] = (bytearray(givens), array('I', [0]) * len(givens))
+                digits, candidates = board
+                for cell, digit, mask in ENTRY.iter_unpack(body[offset:end]):
+                    if not givens[cell]:
+                        digits[cell] = digit
+                        candidates[cell] = mask
+            offset = end
+
+
+class RacePuzzleSource:
+    """Puzzle source that always answers with the race puzzle."""
+
+    def __init__(self, puzzle: Puzzle) -> None:
+        self.puzzle = puzzle
+        self.hits = 0
+        self.misses = 0
+
+    def start(self) -> None:
+        """Nothing to start."""
+
+    def stop(self) -> None:
+        """Nothing to stop."""
+
+    def prefetch(self, difficulty: float) -> None:
+        """The server picked the puzzle; difficulty does not matter."""
+
+    def poll(self, difficulty: float) -> Optional[Puzzle]:
+        return self.puzzle
+
+    def get(self, difficulty: float) -> Optional[Puzzle]:
+        self.hits += 1
+        return self.puzzle
+
+
+class RaceLink:
+    """Run a ``RaceClient`` on a background event loop for the game's thread."""
+
+    def __init__(self, host: str, port: int, name: str = '', timeout: float = 10.0) -> None:
+        """Connect and wait for the race puzzle."""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='race-link', daemon=True)
+        self._thread.start()
+        self.client = RaceClient()
+        # The timeout is applied on the loop so a failed attempt is finished before it stops
+        connect = asyncio.wait_for(self.client.connect(host, port, name), timeout)
+        try:
+            self.puzzle = asyncio.run_coroutine_threadsafe(connect, self._loop).result()
+        except BaseException:
+            # Leave no loop thread behind when the server cannot be joined
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(5)
+            raise
+
+    def send_edits(self, changes: CellChanges) -> None:
+        """Queue one frame's edits without blocking."""
+        self._loop.call_soon_threadsafe(self.client.send_edits, dict(changes))
+
+    def close(self) -> None:
+        """Disconnect and stop the loop."""
+        asyncio.run_coroutine_threadsafe(self.client.close(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+
+
+def parse_address(text: str) -> Tuple[str, int]:
+    """Split ``host:port``."""
+    host, _, port = text.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f'expected HOST:PORT, got {text!r}')
+    return host, int(port)
+
+
+async def _simulated_player(client: RaceClient, rng: random.Random, edits_per_sec: float,
+                            stop_time: float) -> Tuple[bytearray, array]:
+    """Fill cells at random moments, sometimes with pencil marks first; return the final board."""
+    puzzle = client.puzzle
+    size = get_topology(puzzle.box_rows, puzzle.box_cols).size
+    digits = bytearray(puzzle.givens)
+    candidates = array('I', [0]) * len(digits)
+    empty = [cell for cell, given in enumerate(puzzle.givens) if not given]
+    rng.shuffle(empty)
+    loop = asyncio.get_running_loop()
+    while empty:
+        delay = rng.expovariate(edits_per_sec)
+        if loop.time() + delay > stop_time:
+            break
+        await asyncio.sleep(delay)
+        cell = empty.pop()
+        changes = {cell: (puzzle.solution[cell], 0)}
+        if empty and rng.random() < 0.3:
+            # Pencil-mark another cell in the same frame
+            other = empty[-1]
+            changes[other] = (0, rng.randrange(1, 1 << size))
+        for changed, (digit, mask) in changes.items():
+            digits[changed] = digit
+            candidates[changed] = mask
+        client.send_edits(changes)
+    return digits, candidates
+
+
+async def simulate(players: int, spectators: int, duration: float, edits_per_sec: float,
+                   puzzle: Optional[Puzzle] = None, address: Optional[Tuple[str, int]] = None,
+                   frame_ms: int = 16, seed: int = 1) -> Dict[str, float]:
+    """Race simulated clients on localhost and return latency and traffic figures.
+
+    Without ``address`` a server for ``puzzle`` is started in the same
+    process. ``mismatches`` counts player boards some spectator did not
+    mirror exactly.
+    """
+    server = None
+    if address is None:
+        server = RaceServer(puzzle, frame_ms)
+        address = await server.start()
+    host, port = address
+
+    player_clients = [RaceClient() for _ in range(players)]
+    spectator_clients = [RaceClient(mirror=True) for _ in range(spectators)]
+    for index, client in enumerate(player_clients):
+        await client.connect(host, port, f'sim-{index}')
+    for client in spectator_clients:
+        await client.connect(host, port, spectator=True)
+
+    rng = random.Random(seed)
+    stop_time = asyncio.get_running_loop().time() + duration
+    start = time.perf_counter()
+    boards = await asyncio.gather(*(_simulated_player(client, random.Random(rng.random()),
+                                                      edits_per_sec, stop_time)
+                                    for client in player_clients))
+    elapsed = time.perf_counter() - start
+    # Let the last frame reach everyone
+    await asyncio.sleep(5 * frame_ms / 1000 + 0.2)
+
+    mismatches = 0
+    for spectator in spectator_clients:
+        for client, (digits, candidates) in zip(player_clients, boards):
+            mirrored = spectator.boards.get(client.player_id)
+            if mirrored is None:
+                mismatches += digits != bytearray(client.puzzle.givens)
+            else:
+                mismatches += mirrored[0] != digits or mirrored[1] != candidates
+
+    latencies = sorted(latency for client in player_clients for latency in client.latencies_ns)
+    finished = max((len(client.finishes) for client in spectator_clients + player_clients), default=0)
+    for client in player_clients + spectator_clients:
+        await client.close()
+    results = {
+        'messages': len(latencies),
+        'messages_per_sec': len(latencies) / elapsed,
+        'latency_p50_ms': latencies[len(latencies) // 2] / 1e6 if latencies else 0.0,
+        'latency_p99_ms': latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] / 1e6
+        if latencies else 0.0,
+        'latency_max_ms': latencies[-1] / 1e6 if latencies else 0.0,
+        'finished': finished,
+        'mismatches': mismatches,
+    }
+    if server is not None:
+        results['server_frames'] = server.frame
+        results['server_kib_sent'] = server.bytes_sent / 1024
+        results['dropped'] = server.dropped
+        await server.close()
+    return results
+
+
+async def _serve(puzzle: Puzzle, host: str, port: int, frame_ms: int) -> None:
+    """Run a race server until interrupted, reporting finishes."""
+    server = RaceServer(puzzle, frame_ms)
+    host, port = await server.start(host, port)
+    print(f'race on {host}:{port}, seed {puzzle.seed}', file=sys.stderr)
+    reported = set()
+    try:
+        while True:
+            await asyncio.sleep(1)
+            for player_id, player in server.players.items():
+                if player.finished_ms is not None and player_id not in reported:
+                    reported.add(player_id)
+                    print(f'{player.name or player_id} finished in {player.finished_ms / 1000:.1f} s')
+    finally:
+        await server.close()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Entry point for the ``serve`` and ``race`` commands."""
+    parser = argparse.ArgumentParser(prog='pyg_sudoku.py', description='Race the same puzzle over TCP.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('serve', 'host a race'), ('race', 'run simulated clients against a race')):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('--size', type=int, default=9, help='board size')
+        command.add_argument('--difficulty', type=float, default=0.5)
+        command.add_argument('--seed', type=int, default=None, help='puzzle seed (random by default)')
+        command.add_argument('--frame-ms', type=int, default=16, help='server batching interval')
+    commands.choices['serve'].add_argument('--host', default='127.0.0.1')
+    commands.choices['serve'].add_argument('--port', type=int, default=8765)
+    race = commands.choices['race']
+    race.add_argument('--connect', metavar='HOST:PORT', help='race an existing server instead of a local one')
+    race.add_argument('--players', type=int, default=200)
+    race.add_argument('--spectators', type=int, default=5)
+    race.add_argument('--duration', type=float, default=10.0, help='seconds of simulated play')
+    race.add_argument('--edits-per-sec', type=float, default=2.0, help='edits per simulated player')
+    args = parser.parse_args(argv)
+
+    seed = random.randrange(sys.maxsize) if args.seed is None else args.seed
+    address = parse_address(args.connect) if args.command == 'race' and args.connect else None
+    # A remote server has its own puzzle
+    puzzle = None if address else generate_puzzle(args.difficulty, seed, *box_shape(args.size))
+    if args.command == 'serve':
+        try:
+            asyncio.run(_serve(puzzle, args.host, args.port, args.frame_ms))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    results = asyncio.run(simulate(args.players, args.spectators, args.duration, args.edits_per_sec,
+                                   puzzle, address, args.frame_ms, seed))
+    for name, value in results.items():
+        print(f'{name:<24}{value:>14.2f}')
+    return 1 if results['mismatches'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
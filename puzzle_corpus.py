@@ -0,0 +1,298 @@
+"""Compact binary puzzle library with memory-mapped random access.
+
+File layout (little-endian):
+
+* header: magic ``PSDC``, version, box rows, box cols, record size,
+  band count and record count
+* index: one ``(first record, record count)`` pair per difficulty band,
+  where band ``b`` holds puzzles of difficulty ``b / 100``
+* records sorted by band: givens then solution, 4 bits per cell
+
+Usage:
+    python pyg_sudoku.py corpus import puzzles.txt puzzles.bin
+    python pyg_sudoku.py corpus export puzzles.bin puzzles.txt
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+from typing import Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from board_topology import get_topology
+from puzzle_generator import Puzzle, format_grid, parse_grid
+from solver import solve
+
+MAGIC = b'PSDC'
+VERSION = 1
+BAND_COUNT = 101
+HEADER = struct.Struct('<4sHBBHHI')
+INDEX_ENTRY = struct.Struct('<II')
+DATA_OFFSET = HEADER.size + BAND_COUNT * INDEX_ENTRY.size
+
+
+class CorpusError(ValueError):
+    """Raised for malformed corpus files or input lines."""
+
+
+def pack_cells(values: Sequence[int]) -> bytes:
+    """Pack digits 0..15 two per byte, high nibble first."""
+    padded = list(values) + [0] * (len(values) % 2)
+    return bytes((high << 4) | low for high, low in zip(padded[0::2], padded[1::2]))
+
+
+def unpack_cells(data: bytes, cell_count: int) -> Tuple[int, ...]:
+    """Inverse of ``pack_cells``."""
+    values = []
+    for byte in data:
+        values.append(byte >> 4)
+        values.append(byte & 0x0F)
+    return tuple(values[:cell_count])
+
+
+def difficulty_band(difficulty: float) -> int:
+    """Map a difficulty in [0, 1] to its index band."""
+    return max(0, min(BAND_COUNT - 1, round(difficulty * 100)))
+
+
+def parse_line(line: str, cell_count: int = 81) -> Optional[Tuple[List[int], Optional[List[int]], float]]:
+    """Parse ``<puzzle> [<solution>] [... <difficulty>]``.
+
+    Returns None for blank and ``#`` comment lines. A missing difficulty
+    defaults to the fraction of empty cells, as in the difficulty box.
+    """
+    tokens = line.split()
+    if not tokens or tokens[0].startswith('#'):
+        return None
+    if len(tokens[0]) != cell_count:
+        raise CorpusError(f'expected {cell_count} cells, got {len(tokens[0])}')
+
+    try:
+        givens = parse_grid(tokens[0])
+        solution = None
+        if len(tokens) > 1 and len(tokens[1]) == cell_count and not set(tokens[1]) & set('0.'):
+            solution = parse_grid(tokens[1])
+    except ValueError as error:
+        raise CorpusError(str(error)) from None
+
+    difficulty = sum(1 for value in givens if not value) / cell_count
+    if len(tokens) > 1 and '.' in tokens[-1]:
+        try:
+            difficulty = float(tokens[-1])
+        except ValueError:
+            pass
+    return givens, solution, difficulty
+
+
+class PuzzleCorpus:
+    """Read-only, memory-mapped view of a corpus file."""
+
+    def __init__(self, path: str) -> None:
+        """Map the file and read its header and band index."""
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._map) < DATA_OFFSET:
+            raise CorpusError(f'{path} is too short to be a puzzle corpus')
+        magic, version, self.box_rows, self.box_cols, self.record_size, band_count, self.record_count = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION or band_count != BAND_COUNT:
+            raise CorpusError(f'{path} is not a version {VERSION} puzzle corpus')
+        if len(self._map) < DATA_OFFSET + self.record_count * self.record_size:
+            raise CorpusError(f'{path} is truncated')
+
+        self.cell_count = get_topology(self.box_rows, self.box_cols).cell_count
+        self._packed_size = self.record_size // 2
+        self.bands = [INDEX_ENTRY.unpack_from(self._map, HEADER.size + band * INDEX_ENTRY.size)
+                      for band in range(BAND_COUNT)]
+
+    def __len__(self) -> int:
+        return self.record_count
+
+    def close(self) -> None:
+        """Unmap and close the file."""
+        self._map.close()
+        self._file.close()
+
+    def record(self, index: int) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+        """Return (givens, solution) of record ``index``."""
+        offset = DATA_OFFSET + index * self.record_size
+        data = self._map[offset:offset + self.record_size]
+        return (unpack_cells(data[:self._packed_size], self.cell_count),
+                unpack_cells(data[self._packed_size:], self.cell_count))
+
+    def records(self) -> Iterator[Tuple[int, Tuple[int, ...], Tuple[int, ...]]]:
+        """Yield (band, givens, solution) for every record in file order."""
+        for band, (first, count) in enumerate(self.bands):
+            for index in range(first, first + count):
+                yield (band,) + self.record(index)
+
+    def random_puzzle(self, difficulty: float, rng: random.Random) -> Puzzle:
+        """Pick a random puzzle from the band nearest to ``difficulty``."""
+        if not self.record_count:
+            raise CorpusError(f'{self.path} is empty')
+        target = difficulty_band(difficulty)
+        # At most BAND_COUNT probes, independent of the corpus size
+        for distance in range(BAND_COUNT):
+            for band in (target - distance, target + distance):
+                if 0 <= band < BAND_COUNT and self.bands[band][1]:
+                    first, count = self.bands[band]
+                    givens, solution = self.record(first + rng.randrange(count))
+                    return Puzzle(givens, solution, None, band / 100, self.box_rows, self.box_cols)
+        raise CorpusError(f'{self.path} has no puzzles')
+
+
+class CorpusPuzzleSource:
+    """Serve puzzles from a corpus through the same interface as ``PuzzlePool``."""
+
+    def __init__(self, corpus: PuzzleCorpus) -> None:
+        self.corpus = corpus
+        self.hits = 0
+        self.misses = 0
+        self._rng = random.Random()
+
+    def start(self) -> None:
+        """Nothing to start; lookups are synchronous and O(1)."""
+
+    def stop(self) -> None:
+        """Close the corpus file."""
+        self.corpus.close()
+
+    def prefetch(self, difficulty: float) -> None:
+        """Nothing to prefetch."""
+
+    def poll(self, difficulty: float) -> Optional[Puzzle]:
+        """Return a random puzzle for ``difficulty``."""
+        return self.corpus.random_puzzle(difficulty, self._rng)
+
+    def get(self, difficulty: float) -> Optional[Puzzle]:
+        """Return a random puzzle for ``difficulty``; always a hit."""
+        self.hits += 1
+        return self.poll(difficulty)
+
+
+def _read_records(input_path: str, box_rows: int, box_cols: int) -> Iterator[Tuple[int, bytes]]:
+    """Yield (band, packed record) for every puzzle line of a text file."""
+    topology = get_topology(box_rows, box_cols)
+    with open(input_path) as text:
+        for line_number, line in enumerate(text, 1):
+            try:
+                parsed = parse_line(line, topology.cell_count)
+            except CorpusError as error:
+                raise CorpusError(f'{input_path}:{line_number}: {error}') from None
+            if parsed is None:
+                continue
+            givens, solution, difficulty = parsed
+            if solution is None:
+                solution = solve(givens, topology)
+                if solution is None:
+                    raise CorpusError(f'{input_path}:{line_number}: puzzle has no solution')
+            yield difficulty_band(difficulty), pack_cells(givens) + pack_cells(solution)
+
+
+def import_text(input_path: str, output_path: str, box_rows: int = 3, box_cols: int = 3) -> int:
+    """Convert a text file of puzzles into a corpus file.
+
+    Streams the input twice (once to count puzzles per band, once to
+    write each record straight to its slot in the memory-mapped output),
+    so memory use does not depend on the number of puzzles.
+    """
+    size = box_rows * box_cols
+    if size > 15:
+        raise CorpusError('the corpus format stores at most 15 symbols per cell')
+    cell_count = size * size
+    record_size = 2 * ((cell_count + 1) // 2)
+
+    # Pass 1: count puzzles per band without solving anything
+    band_counts = [0] * BAND_COUNT
+    with open(input_path) as text:
+        for line_number, line in enumerate(text, 1):
+            try:
+                parsed = parse_line(line, cell_count)
+            except CorpusError as error:
+                raise CorpusError(f'{input_path}:{line_number}: {error}') from None
+            if parsed is not None:
+                band_counts[difficulty_band(parsed[2])] += 1
+    record_count = sum(band_counts)
+
+    # Records are grouped by band; cursors hold each band's next free slot
+    cursors = []
+    first = 0
+    for count in band_counts:
+        cursors.append(first)
+        first += count
+
+    temp_path = output_path + '.tmp'
+    try:
+        _write_corpus(input_path, temp_path, box_rows, box_cols, record_size, band_counts, cursors)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.replace(temp_path, output_path)
+    return record_count
+
+
+def _write_corpus(input_path: str, path: str, box_rows: int, box_cols: int, record_size: int,
+                  band_counts: List[int], cursors: List[int]) -> None:
+    """Write the header, band index and records of a corpus file."""
+    record_count = sum(band_counts)
+    with open(path, 'w+b') as output:
+        output.truncate(DATA_OFFSET + record_count * record_size)
+        output.write(HEADER.pack(MAGIC, VERSION, box_rows, box_cols, record_size, BAND_COUNT, record_count))
+        for band in range(BAND_COUNT):
+            output.write(INDEX_ENTRY.pack(cursors[band], band_counts[band]))
+        output.flush()
+
+        # Pass 2: write each record straight into its band's slot
+        if record_count:
+            with mmap.mmap(output.fileno(), 0) as mapped:
+                for band, record in _read_records(input_path, box_rows, box_cols):
+                    offset = DATA_OFFSET + cursors[band] * record_size
+                    mapped[offset:offset + record_size] = record
+                    cursors[band] += 1
+                mapped.flush()
+
+
+def export_text(corpus_path: str, output: TextIO) -> int:
+    """Write every puzzle of a corpus as ``<puzzle> <solution> <difficulty>`` lines."""
+    corpus = PuzzleCorpus(corpus_path)
+    try:
+        for band, givens, solution in corpus.records():
+            output.write(f'{format_grid(givens)} {format_grid(solution)} {band / 100:.2f}\n')
+        return corpus.record_count
+    finally:
+        corpus.close()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Entry point for the ``corpus`` command."""
+    parser = argparse.ArgumentParser(prog='corpus', description='Convert puzzle libraries.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help='convert an 81-char text file to a corpus')
+    import_parser.add_argument('input')
+    import_parser.add_argument('output')
+    export_parser = commands.add_parser('export', help='convert a corpus to an 81-char text file')
+    export_parser.add_argument('input')
+    export_parser.add_argument('output', nargs='?', default='-')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'import':
+            count = import_text(args.input, args.output)
+        elif args.output == '-':
+            count = export_text(args.input, sys.stdout)
+        else:
+            with open(args.output, 'w') as output:
+                count = export_text(args.input, output)
+    except (CorpusError, OSError) as error:
+        print(f'error: {error}', file=sys.stderr)
+        return 1
+    print(f'{count} puzzles', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""Seeded puzzle generation with a guaranteed unique solution."""
+import random
+import sys
+import threading
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from board_topology import BoardTopology, get_topology
+from solver import count_solutions, iter_solutions, random_solution
+
+# py-sudoku seeds and shuffles the global ``random`` module
+_PY_SUDOKU_LOCK = threading.Lock()
+
+# One character per digit; boards up to 25x25 use letters after 9
+SYMBOLS = '123456789ABCDEFGHIJKLMNOP'
+
+
+class Puzzle(NamedTuple):
+    """A puzzle together with the data needed to reproduce it.
+
+    ``seed`` is None for puzzles that did not come from the generator and
+    ``rating`` is set when the puzzle was generated for a rating band.
+    """
+    givens: Tuple[int, ...]
+    solution: Tuple[int, ...]
+    seed: Optional[int]
+    difficulty: float
+    box_rows: int = 3
+    box_cols: int = 3
+    rating: Optional[float] = None
+
+
+def _make_unique(givens: List[int], solution: Sequence[int],
+                 topology: BoardTopology) -> None:
+    """Add clues from ``solution`` until ``givens`` has exactly one solution."""
+    while True:
+        solutions = []
+        for candidate in iter_solutions(givens, topology):
+            solutions.append(candidate)
+            if len(solutions) == 2:
+                break
+        if len(solutions) < 2:
+            return
+        # Fix a cell where two solutions disagree, preferring the target solution
+        for cell, (first, second) in enumerate(zip(*solutions)):
+            if first != second:
+                givens[cell] = solution[cell]
+                break
+
+
+def _dig_holes(solution: Sequence[int], difficulty: float, rng: random.Random,
+               topology: BoardTopology) -> List[int]:
+    """Remove up to ``difficulty`` of the cells while keeping the solution unique."""
+    givens = list(solution)
+    target = int(difficulty * topology.cell_count)
+    order = list(range(topology.cell_count))
+    rng.shuffle(order)
+
+    removed = 0
+    for cell in order:
+        if removed >= target:
+            break
+        digit = givens[cell]
+        givens[cell] = 0
+        if count_solutions(givens, 2, topology) == 1:
+            removed += 1
+        else:
+            givens[cell] = digit
+    return givens
+
+
+def _generate_native(difficulty: float, seed: int, topology: BoardTopology) -> Tuple[List[int], List[int]]:
+    """Generate a puzzle with the in-project solver."""
+    rng = random.Random(seed)
+    solution = random_solution(topology, rng)
+    return _dig_holes(solution, difficulty, rng, topology), solution
+
+
+def _generate_py_sudoku(difficulty: float, seed: int, topology: BoardTopology) -> Tuple[List[int], List[int]]:
+    """Generate a puzzle with py-sudoku and repair it if it is not unique."""
+    from sudoku import Sudoku
+
+    with _PY_SUDOKU_LOCK:
+        puzzle = Sudoku(topology.box_cols, topology.box_rows, seed=seed).difficulty(difficulty)
+    givens = [cell_value or 0 for row in puzzle.board for cell_value in row]
+    solution = next(iter_solutions(givens, topology))
+    _make_unique(givens, solution, topology)
+    return givens, solution
+
+
+BACKENDS = {
+    'native': _generate_native,
+    'py-sudoku': _generate_py_sudoku,
+}
+
+
+def generate_puzzle(difficulty: float, seed: int, box_rows: int = 3, box_cols: int = 3,
+                    backend: str = 'native') -> Puzzle:
+    """Generate a uniquely solvable puzzle.
+
+    ``difficulty`` is the fraction of cells to remove; removal stops early
+    if no further cell can be removed without losing uniqueness.
+    """
+    topology = get_topology(box_rows, box_cols)
+    givens, solution = BACKENDS[backend](difficulty, seed, topology)
+    return Puzzle(tuple(givens), tuple(solution), seed, difficulty, box_rows, box_cols)
+
+
+def generate_rated_puzzle(min_rating: float, max_rating: float, seed: int,
+                          box_rows: int = 3, box_cols: int = 3, backend: str = 'native',
+                          max_attempts: int = 50) -> Optional[Puzzle]:
+    """Generate a puzzle whose technique rating lies in [min_rating, max_rating].
+
+    Tries puzzles from seeds derived from ``seed``, removing more cells
+    after a too-easy puzzle and fewer after a too-hard one. The result is
+    reproducible with ``generate_puzzle(puzzle.difficulty, puzzle.seed)``.
+    Returns None if no attempt lands in the band.
+    """
+    # Imported here: the rater pulls in canonical_form, which the game does not need at startup
+    from difficulty_rater import rate_puzzle
+
+    topology = get_topology(box_rows, box_cols)
+    rng = random.Random(seed)
+    difficulty = 0.6
+    for _ in range(max_attempts):
+        puzzle = generate_puzzle(difficulty, rng.randrange(sys.maxsize), box_rows, box_cols, backend)
+        rating = rate_puzzle(puzzle.givens, topology).score
+        if rating < min_rating:
+            difficulty = round(min(0.9, difficulty + 0.05), 2)
+        elif rating > max_rating:
+            difficulty = round(max(0.2, difficulty - 0.05), 2)
+        else:
+            return puzzle._replace(rating=rating)
+    return None
+
+
+def parse_grid(text: str) -> List[int]:
+    """Parse an 81-char style grid where '0' or '.' marks an empty cell.
+
+    Digits above 9 are written as letters from ``SYMBOLS``.
+    """
+    try:
+        return [0 if char in '0.' else SYMBOLS.index(char.upper()) + 1 for char in text.strip()]
+    except ValueError:
+        raise ValueError(f'unexpected symbol in grid {text.strip()!r}') from None
+
+
+def format_grid(values: Sequence[Optional[int]]) -> str:
+    """Format a flat board as an 81-char style grid using '.' for empty cells."""
+    return ''.join(SYMBOLS[value - 1] if value else '.' for value in values)
@@ -0,0 +1,107 @@
+"""Background pre-generation of puzzles so starting a game never blocks."""
+import random
+import sys
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Optional
+
+from puzzle_generator import Puzzle, generate_puzzle
+
+
+class PuzzlePool:
+    """Keep up to ``depth`` ready puzzles for each recently used difficulty.
+
+    A daemon worker thread refills the queues; ``get`` never waits for it.
+    Only the ``max_difficulties`` most recently requested difficulties are
+    kept so scrolling through the difficulty box does not fill 99 queues.
+    """
+
+    def __init__(self, depth: int = 2, max_difficulties: int = 3,
+                 generate: Callable[[float, int], Puzzle] = generate_puzzle) -> None:
+        """Create the pool; call ``start`` to launch the worker."""
+        self.depth = depth
+        self.max_difficulties = max_difficulties
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self._generate = generate
+        self._rng = random.Random()
+        self._queues: 'OrderedDict[float, Deque[Puzzle]]' = OrderedDict()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='puzzle-pool', daemon=True)
+
+    @staticmethod
+    def _key(difficulty: float) -> float:
+        """Difficulties move in 0.01 steps, so round to match the UI."""
+        return round(difficulty, 2)
+
+    def start(self) -> None:
+        """Start the worker thread."""
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Ask the worker to exit after its current puzzle."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def prefetch(self, difficulty: float) -> None:
+        """Mark a difficulty as wanted so the worker fills its queue."""
+        key = self._key(difficulty)
+        with self._condition:
+            if key in self._queues:
+                self._queues.move_to_end(key, last=False)
+            else:
+                self._queues[key] = deque(maxlen=self.depth)
+                self._queues.move_to_end(key, last=False)
+                while len(self._queues) > self.max_difficulties:
+                    self._queues.popitem()
+            self._condition.notify_all()
+
+    def poll(self, difficulty: float) -> Optional[Puzzle]:
+        """Take a ready puzzle if there is one, without touching the counters."""
+        key = self._key(difficulty)
+        with self._condition:
+            queue = self._queues.get(key)
+            puzzle = queue.popleft() if queue else None
+            self._condition.notify_all()
+        return puzzle
+
+    def get(self, difficulty: float) -> Optional[Puzzle]:
+        """Take a ready puzzle, counting a hit, or schedule one and return None."""
+        self.prefetch(difficulty)
+        puzzle = self.poll(difficulty)
+        if puzzle is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return puzzle
+
+    def _next_key(self) -> Optional[float]:
+        """Return the most recently wanted difficulty whose queue is not full."""
+        for key, queue in self._queues.items():
+            if len(queue) < self.depth:
+                return key
+        return None
+
+    def _run(self) -> None:
+        """Worker loop: generate puzzles until stopped."""
+        while True:
+            with self._condition:
+                key = self._next_key()
+                while key is None and not self._stopped:
+                    self._condition.wait()
+                    key = self._next_key()
+                if self._stopped:
+                    return
+                seed = self._rng.randint(0, sys.maxsize - 1)
+
+            puzzle = self._generate(key, seed)
+
+            with self._condition:
+                self.generated += 1
+                queue = self._queues.get(key)
+                if queue is not None:
+                    queue.append(puzzle)
+                self._condition.notify_all()
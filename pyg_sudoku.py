@@ -1,10 +1,42 @@
+import argparse
+import os
 import sys
-import random
-from typing import Dict, List, Tuple, Set, Optional
+from bisect import bisect_right
+from functools import partial
+from math import isqrt
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Tuple, Optional
 
+# Keep stdout clean for headless commands that stream to it
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
 import pygame
-from pygame.locals import QUIT, KEYDOWN
-from sudoku import Sudoku
+from pygame.locals import QUIT, KEYDOWN, KMOD_CTRL, KMOD_SHIFT
+
+from autosave import DEFAULT_PATH, Autosaver, Snapshot
+from board_state import BoardState
+from board_topology import BOX_SHAPES, box_shape, get_topology
+from candidate_engine import CandidateEngine
+from conflict_engine import ConflictTracker
+from edit_history import CellChanges, CellEdit, EditHistory
+from glyph_cache import Color, GlyphCache
+from puzzle_generator import SYMBOLS, Puzzle, generate_puzzle
+from puzzle_pool import PuzzlePool
+
+# Only needed for --profile, --record, --corpus and --join, so imported on use to keep startup short
+if TYPE_CHECKING:
+    from frame_profiler import FrameProfiler
+    from multiplayer import RaceLink
+    from session_log import SessionRecorder
+
+# Posted once when the board becomes a valid solution, with time_ms,
+# difficulty, seed and steps (edits on the undo stack) for timing and stats
+PUZZLE_COMPLETE = pygame.event.custom_type()
+
+
+class Hint(NamedTuple):
+    """A cell to look at next and the digit that belongs there."""
+    cell: int
+    digit: int
+    reason: str  # 'mistake', 'naked single', 'hidden single' or 'solution'
 
 
 class SudokuGame:
@@ -17,6 +49,8 @@ class SudokuGame:
     GRID_OFFSET_X = 70
     GRID_OFFSET_Y = 20
     CELL_SPACING = 5
+    # Width and height the board fills, whatever its size
+    GRID_EXTENT = 640
     FPS = 60
     
     # Colors
@@ -27,8 +61,9 @@ class SudokuGame:
     RED = (204, 0, 0)
     LIGHT_GREEN = (144, 238, 144)
     YELLOW = (255, 255, 0)
+    LIGHT_RED = (255, 204, 204)
     
-    # Game configuration
+    # Game configuration (defaults for 9x9; set per board in _initialize_validation_groups)
     VALID_NUMBERS = '123456789'
     GRID_SIZE = 9
     TOTAL_CELLS = GRID_SIZE * GRID_SIZE
@@ -38,27 +73,145 @@ class SudokuGame:
     POPUP_SPACING = 45
     POPUP_ALPHA = 180
     
-    def __init__(self) -> None:
-        """Initialize the Sudoku game."""
-        pygame.init()
+    # Hot paths timed when profiling, and where the overlay goes. Every frame
+    # goes through _render and edits through _edit_cells; the rest show up
+    # as sub-spans when they run (full redraws, puzzle loads, single cells)
+    PROFILED_METHODS = ('_handle_event', '_edit_cells', '_set_cell_value', '_check_completion',
+                        '_validate_all_cells', '_render', '_draw_cell', '_draw_grid',
+                        '_draw_ui_elements', '_draw_number_popup')
+    PROFILE_OVERLAY_POS = (10, 770)
+    
+    # Pencil-mark layouts are blitted inside the cell border
+    PENCIL_MARK_INSET = 4
+    
+    # Number of ready puzzles kept per difficulty
+    PUZZLE_POOL_DEPTH = 2
+    # How often the idle loop wakes up to check for a pending puzzle
+    GENERATING_POLL_MS = 50
+    
+    # Undo history: most steps kept
+    UNDO_DEPTH = 1000
+    
+    def __init__(self, corpus_path: Optional[str] = None, box_rows: int = 3, box_cols: int = 3,
+                 profiler: Optional['FrameProfiler'] = None,
+                 recorder: Optional['SessionRecorder'] = None,
+                 autosaver: Optional[Autosaver] = None, snapshot: Optional[Snapshot] = None,
+                 race: Optional['RaceLink'] = None) -> None:
+        """Initialize the Sudoku game.
+        
+        With ``corpus_path`` puzzles are drawn from a corpus file instead of
+        being generated, and the corpus decides the board size. A
+        ``profiler`` times the hot paths and shows an FPS overlay; a
+        ``recorder`` logs the session's input for replay. An ``autosaver``
+        saves the game periodically and on exit, and a ``snapshot`` of the
+        same board size is resumed instead of starting on an empty board.
+        With a ``race`` link the board is the race's puzzle and every edit
+        is streamed to the race server.
+        """
+        # Only what the game uses: no audio, joystick or other subsystems to bring up
+        pygame.display.init()
+        pygame.font.init()
         self.screen = pygame.display.set_mode((self.SCREEN_WIDTH, self.SCREEN_HEIGHT))
         pygame.display.set_caption("Pygame Sudoku")
         
-        # Fonts
-        self.font = pygame.font.Font(None, 50)
-        self.mini_font = pygame.font.SysFont("Arial", 20)
+        corpus = None
+        if corpus_path:
+            from puzzle_corpus import PuzzleCorpus
+            corpus = PuzzleCorpus(corpus_path)
+        if corpus is not None:
+            box_rows, box_cols = corpus.box_rows, corpus.box_cols
+        self._initialize_validation_groups(box_rows, box_cols)
+        
+        # Fonts scale with the cell size; pencil marks need a grid on big boards
+        self.font = pygame.font.Font(None, 50 * self.CELL_SIZE // 70)
+        self.popup_font = pygame.font.Font(None, 50)
+        # pygame's bundled font; a SysFont lookup scans the system fonts first
+        self.mini_font = pygame.font.Font(None, 20)
+        pencil_size = 20 if self.GRID_SIZE <= 9 else max(10, self.CELL_SIZE // self.pencil_columns + 2)
+        self.small_font = pygame.font.Font(None, pencil_size)
+        
+        # Pre-rendered glyphs
+        self.glyphs = GlyphCache({'digit': self.font, 'popup': self.popup_font,
+                                  'pencil': self.small_font, 'label': self.mini_font})
+        self.glyphs.prewarm('digit', self.VALID_NUMBERS, (self.DEEP_GRAY, self.RED))
+        self.glyphs.prewarm('popup', self.VALID_NUMBERS, (self.DEEP_GRAY, self.WHITE))
+        self.glyphs.prewarm('pencil', self.VALID_NUMBERS, (self.DEEP_GRAY,))
+        self.glyphs.prewarm('label', ('start', 'reset', '...'), (self.DEEP_GRAY,))
         
         # Game state
         self.clock = pygame.time.Clock()
+        self.DOUBLE_CLICK_DELAY = 300  # milliseconds
+        self._initialize_session_state()
+        
+        # Puzzle source: the race's puzzle, a corpus file or background pre-generation
+        self.race = race
+        if race is not None:
+            from multiplayer import RacePuzzleSource
+            self.puzzle_source = RacePuzzleSource(race.puzzle)
+        elif corpus is not None:
+            from puzzle_corpus import CorpusPuzzleSource
+            self.puzzle_source = CorpusPuzzleSource(corpus)
+        else:
+            self.puzzle_source = PuzzlePool(self.PUZZLE_POOL_DEPTH,
+                                            generate=partial(generate_puzzle, box_rows=box_rows, box_cols=box_cols))
+        # Every puzzle the source hands out is logged when recording
+        self.recorder = recorder
+        if recorder is not None:
+            from session_log import RecordingPuzzleSource
+            recorder.begin_session(box_rows, box_cols)
+            self.puzzle_source = RecordingPuzzleSource(self.puzzle_source, recorder)
+        # Started by run() once the first frame is up
+        self.puzzle_source.prefetch(self.difficulty)
+        
+        # The overlay and circle sprites never change, so build them once
+        self.popup_overlay = pygame.Surface((self.SCREEN_WIDTH, self.SCREEN_HEIGHT), pygame.SRCALPHA)
+        self.popup_overlay.fill((255, 255, 255, self.POPUP_ALPHA))
+        self.popup_sprites = {(number, is_valid): self._render_popup_sprite(number, is_valid)
+                              for number in self.VALID_NUMBERS for is_valid in (True, False)}
+        
+        # Initialize game components
+        self._initialize_grid()
+        self._initialize_game_state()
+        self._initialize_ui_elements()
+        
+        # Profiling is opt-in: without a profiler no method is wrapped
+        self.profiler = profiler
+        if profiler is not None:
+            self.profile_font = pygame.font.Font(None, 20)
+            profiler.instrument(self, self.PROFILED_METHODS)
+        
+        # Resuming only restores buffers, so nothing is generated at startup
+        self.autosaver = autosaver
+        if autosaver is not None:
+            self.next_autosave_time = autosaver.interval_ms
+        if (snapshot is not None
+                and (snapshot.puzzle.box_rows, snapshot.puzzle.box_cols) == (box_rows, box_cols)):
+            self._resume(snapshot)
+        if race is not None:
+            self._load_puzzle(race.puzzle)
+        
+    def _initialize_session_state(self) -> None:
+        """Reset everything a play session changes apart from the board."""
         self.running = True
         self.is_complete = False
         self.time_elapsed = 0
+        # Game clock in milliseconds, advanced by frame times rather than read from SDL
+        self.session_time = 0
+        self.next_autosave_time = 0
+        self.autosaved_key = None
         self.difficulty = 0.50
+        self.puzzle = None
+        # Bumped on every digit or pencil-mark change so derived data knows when to refresh
+        self.board_version = 0
+        self.is_generating = False
+        self.pending_difficulty = self.difficulty
         
         # Number popup state
         self.show_popup = False
         self.popup_cell_index = -1
         self.popup_rects = []
+        self.popup_valid_key = None
+        self.popup_valid_numbers = 0
         
         # Cell focus state
         self.focused_cell_index = -1
@@ -66,34 +219,51 @@ class SudokuGame:
         # Double-click detection
         self.last_click_time = 0
         self.last_click_cell = -1
-        self.DOUBLE_CLICK_DELAY = 300  # milliseconds
-        
-        # Initialize game components
-        self._initialize_grid()
-        self._initialize_game_state()
-        self._initialize_ui_elements()
-        self._initialize_validation_groups()
         
+        # Dirty-region rendering state
+        self.hovered_cell_index = -1
+        self.hovered_widget = None
+        self.dirty_cells = set()
+        self.dirty_widgets = set()
+        self.needs_full_redraw = True
+    
     def _initialize_grid(self) -> None:
         """Initialize the visual grid of input boxes."""
         self.input_boxes = []
         rect = pygame.Rect(self.GRID_OFFSET_X, self.GRID_OFFSET_Y, 
                           self.CELL_SIZE, self.CELL_SIZE)
         
-        for row in range(self.GRID_SIZE):
-            for col in range(self.GRID_SIZE):
-                copy = rect.copy()
-                copy.top += ((self.CELL_SIZE * row) + (row // 3) * self.CELL_SPACING)
-                copy.left += ((self.CELL_SIZE * col) + (col // 3) * self.CELL_SPACING)
-                self.input_boxes.append(copy)
+        box_rows = self.topology.box_rows
+        box_cols = self.topology.box_cols
+        
+        for cell_index in range(self.TOTAL_CELLS):
+            row = self.topology.row_of[cell_index]
+            col = self.topology.col_of[cell_index]
+            copy = rect.copy()
+            copy.top += ((self.CELL_SIZE * row) + (row // box_rows) * self.CELL_SPACING)
+            copy.left += ((self.CELL_SIZE * col) + (col // box_cols) * self.CELL_SPACING)
+            self.input_boxes.append(copy)
+        
+        # Row tops and column lefts let _cell_at bisect instead of scanning every box
+        size = self.GRID_SIZE
+        self.column_lefts = [self.input_boxes[col].left for col in range(size)]
+        self.row_tops = [self.input_boxes[row * size].top for row in range(size)]
     
     def _initialize_game_state(self) -> None:
-        """Initialize the game state dictionaries."""
-        self.box_values = {i: '' for i in range(self.TOTAL_CELLS)}
-        self.box_is_initial = {i: False for i in range(self.TOTAL_CELLS)}
-        self.box_has_conflict = {i: False for i in range(self.TOTAL_CELLS)}
-        self.box_multiple_values = {i: '' for i in range(self.TOTAL_CELLS)}
-        self.box_is_uncertain = {i: False for i in range(self.TOTAL_CELLS)}
+        """Initialize the board state."""
+        self.board = BoardState(self.TOTAL_CELLS, self.GRID_SIZE)
+        # Kept up to date by the edit paths so completion is an O(1) check
+        self.filled_count = 0
+        self.uncertain_count = 0
+        self.completion_pending = False
+        # Filled cells whose digit differs from the puzzle's solution
+        self.wrong_cells = set()
+        self.hint = None
+        self.conflict_tracker = ConflictTracker(self.topology)
+        self.candidate_engine = CandidateEngine(self.conflict_tracker, self.topology)
+        self.history = EditHistory(self.UNDO_DEPTH)
+        # Cells changed this frame, sent to the race server as one message
+        self.race_outbox = {}
     
     def _initialize_ui_elements(self) -> None:
         """Initialize the UI elements (timer, difficulty, start button, reset button)."""
@@ -101,148 +271,347 @@ class SudokuGame:
         self.difficulty_box = pygame.Rect(300, 700, 80, 35)
         self.start_button = pygame.Rect(400, 700, 80, 35)
         self.reset_button = pygame.Rect(500, 700, 80, 35)
+        
+        self.ui_widgets = {
+            'timer': (self.timer_box, self._draw_timer),
+            'difficulty': (self.difficulty_box, self._draw_difficulty_box),
+            'start': (self.start_button, self._draw_start_button),
+            'reset': (self.reset_button, self._draw_reset_button),
+        }
+    
+    def _initialize_validation_groups(self, box_rows: int, box_cols: int) -> None:
+        """Attach the shared topology tables for Sudoku rules and size the board."""
+        self.topology = get_topology(box_rows, box_cols)
+        self.GRID_SIZE = self.topology.size
+        self.TOTAL_CELLS = self.topology.cell_count
+        self.VALID_NUMBERS = SYMBOLS[:self.GRID_SIZE]
+        boxes_across = max(self.GRID_SIZE // box_rows, self.GRID_SIZE // box_cols)
+        self.CELL_SIZE = (self.GRID_EXTENT - (boxes_across - 1) * self.CELL_SPACING) // self.GRID_SIZE
+        # Pencil marks and the number popup are laid out in a square-ish grid
+        self.pencil_columns = isqrt(self.GRID_SIZE - 1) + 1
     
-    def _initialize_validation_groups(self) -> None:
-        """Initialize the validation groups for Sudoku rules."""
-        self.horizontal_groups = []
-        self.vertical_groups = []
-        self.nine_box_groups = []
+    def _validate_all_cells(self) -> None:
+        """Rebuild conflict state and cell counts for the whole board (used when loading a puzzle)."""
+        self.conflict_tracker.load(self.board.digits)
+        for i in range(self.TOTAL_CELLS):
+            self.board.set_flag(i, BoardState.CONFLICT, self.conflict_tracker.is_conflict(i))
+        self.filled_count = self.TOTAL_CELLS - self.board.digits.count(0)
+        self.uncertain_count = sum(1 for flag in self.board.flags if flag & BoardState.UNCERTAIN)
+        self.completion_pending = True
+        self.wrong_cells.clear()
+        if self.puzzle is not None:
+            solution = self.puzzle.solution
+            self.wrong_cells.update(i for i, digit in enumerate(self.board.digits)
+                                    if digit and digit != solution[i])
+        self._set_hint(None)
+    
+    def _set_cell_value(self, cell_index: int, digit: int) -> List[int]:
+        """Set a cell's digit (0 clears it) and update conflicts incrementally.
         
-        # Horizontal groups (rows)
-        for i in range(self.GRID_SIZE):
-            group = [x for x in range(self.GRID_SIZE * i, self.GRID_SIZE * (i + 1))]
-            self.horizontal_groups.append(group)
+        Returns the cells whose conflict state changed.
+        """
+        self.filled_count += bool(digit) - bool(self.board.digits[cell_index])
+        self.board.digits[cell_index] = digit
+        self.board_version += 1
+        self.completion_pending = True
+        self._invalidate_cell(cell_index)
+        # Only this cell can start or stop diverging from the solution
+        if self.puzzle is not None and digit and digit != self.puzzle.solution[cell_index]:
+            self.wrong_cells.add(cell_index)
+        else:
+            self.wrong_cells.discard(cell_index)
+        if self.hint is not None and self.hint.cell == cell_index:
+            self._set_hint(None)
+        changed = self.conflict_tracker.set(cell_index, digit)
+        for other_index in changed:
+            self.board.set_flag(other_index, BoardState.CONFLICT,
+                                self.conflict_tracker.is_conflict(other_index))
+            self._invalidate_cell(other_index)
+        return changed
+    
+    def _set_cell_candidates(self, cell_index: int, candidates: int) -> None:
+        """Set a cell's pencil-mark bitmask; 0 makes the cell certain again."""
+        self.uncertain_count += bool(candidates) - self.board.is_uncertain(cell_index)
+        self.board.candidates[cell_index] = candidates
+        self.board.set_flag(cell_index, BoardState.UNCERTAIN, bool(candidates))
+        self.board_version += 1
+        self.completion_pending = True
+        self._invalidate_cell(cell_index)
+    
+    def _apply_cells(self, changes: CellChanges) -> None:
+        """Write {cell: (digit, candidates)}, touching only cells that differ."""
+        if self.race is not None:
+            self.race_outbox.update(changes)
+        for cell_index, (digit, candidates) in changes.items():
+            if self.board.digits[cell_index] != digit:
+                self._set_cell_value(cell_index, digit)
+            if self.board.candidates[cell_index] != candidates:
+                self._set_cell_candidates(cell_index, candidates)
+    
+    def _edit_cells(self, changes: CellChanges) -> None:
+        """Apply a user edit and record it as one undo step.
         
-        # Vertical groups (columns)
-        for i in range(self.GRID_SIZE):
-            group = [x for x in range(i, self.TOTAL_CELLS, self.GRID_SIZE)]
-            self.vertical_groups.append(group)
-        
-        # 3x3 box groups
-        for box_index in range(self.GRID_SIZE):
-            group = []
-            for cell_index in range(self.GRID_SIZE):
-                row = box_index // 3 * 3 + cell_index // 3
-                col = box_index % 3 * 3 + cell_index % 3
-                index = row * self.GRID_SIZE + col
-                group.append(index)
-            self.nine_box_groups.append(group)
-    
-    def _validate_input(self, cell_index: int, group: List[int]) -> None:
-        """Validate input against a group and mark conflicts."""
-        for other_index in group:
-            if cell_index == other_index:
-                continue
-            if (not self.box_is_initial[other_index] and 
-                self.box_values[cell_index] == self.box_values[other_index] and 
-                self.box_values[cell_index]):
-                self.box_has_conflict[cell_index] = True
-                self.box_has_conflict[other_index] = True
+        Placing a digit also removes it from the pencil marks of the cell's
+        peers, within the same step.
+        """
+        changes = self.candidate_engine.prune_placements(changes, self.board.digits, self.board.candidates)
+        
+        edits = []
+        for cell_index, (digit, candidates) in changes.items():
+            old_digit = self.board.digits[cell_index]
+            old_candidates = self.board.candidates[cell_index]
+            if (old_digit, old_candidates) != (digit, candidates):
+                edits.append(CellEdit(cell_index, old_digit, old_candidates, digit, candidates))
+        if edits:
+            self._apply_cells(changes)
+            self.history.record(edits)
     
-    def _validate_all_cells(self) -> None:
-        """Validate all cells against Sudoku rules."""
-        # Reset conflict flags
-        self.box_has_conflict = {i: False for i in range(self.TOTAL_CELLS)}
-        
-        # Check each filled cell
-        for cell_index, value in self.box_values.items():
-            if value:
-                # Check horizontal group
-                self._validate_input(cell_index, self.horizontal_groups[cell_index // self.GRID_SIZE])
-                # Check vertical group
-                self._validate_input(cell_index, self.vertical_groups[cell_index % self.GRID_SIZE])
-                # Check 3x3 box group
-                for box_group in self.nine_box_groups:
-                    if cell_index in box_group:
-                        self._validate_input(cell_index, box_group)
-                        break
-    
-    def _get_valid_numbers(self, cell_index: int) -> Set[str]:
-        """Get set of valid numbers for a specific cell."""
-        if self.box_is_initial[cell_index]:
-            return set()
-        
-        valid_numbers = set(self.VALID_NUMBERS)
-        
-        # Check horizontal group
-        for other_index in self.horizontal_groups[cell_index // self.GRID_SIZE]:
-            if other_index != cell_index and self.box_values[other_index]:
-                valid_numbers.discard(self.box_values[other_index])
-        
-        # Check vertical group
-        for other_index in self.vertical_groups[cell_index % self.GRID_SIZE]:
-            if other_index != cell_index and self.box_values[other_index]:
-                valid_numbers.discard(self.box_values[other_index])
-        
-        # Check 3x3 box group
-        for box_group in self.nine_box_groups:
-            if cell_index in box_group:
-                for other_index in box_group:
-                    if other_index != cell_index and self.box_values[other_index]:
-                        valid_numbers.discard(self.box_values[other_index])
-                break
+    def _undo(self) -> None:
+        """Revert the last edit; conflicts update only around the touched cells."""
+        changes = self.history.undo()
+        if changes:
+            self._apply_cells(changes)
+    
+    def _redo(self) -> None:
+        """Re-apply the last undone edit."""
+        changes = self.history.redo()
+        if changes:
+            self._apply_cells(changes)
+    
+    def _invalidate_cell(self, cell_index: int) -> None:
+        """Schedule a cell to be redrawn."""
+        self.dirty_cells.add(cell_index)
+    
+    def _invalidate_widget(self, name: str) -> None:
+        """Schedule a UI widget to be redrawn."""
+        self.dirty_widgets.add(name)
+    
+    def _invalidate_all(self) -> None:
+        """Schedule a full-screen redraw."""
+        self.needs_full_redraw = True
+    
+    def _set_focus(self, cell_index: int) -> None:
+        """Move the keyboard focus to a cell (-1 for none)."""
+        if cell_index != self.focused_cell_index:
+            if self.focused_cell_index != -1:
+                self._invalidate_cell(self.focused_cell_index)
+            if cell_index != -1:
+                self._invalidate_cell(cell_index)
+            self.focused_cell_index = cell_index
+    
+    def _cell_at(self, pos: Tuple[int, int]) -> int:
+        """Return the index of the cell under ``pos``, or -1."""
+        x, y = pos
+        col = bisect_right(self.column_lefts, x) - 1
+        row = bisect_right(self.row_tops, y) - 1
+        if (col < 0 or row < 0 or x >= self.column_lefts[col] + self.CELL_SIZE
+                or y >= self.row_tops[row] + self.CELL_SIZE):
+            return -1
+        return row * self.GRID_SIZE + col
+    
+    def _update_hover(self, pos: Tuple[int, int]) -> None:
+        """Track the hovered cell and widget, redrawing only what changed."""
+        cell_index = self._cell_at(pos)
+        if cell_index != self.hovered_cell_index:
+            if self.hovered_cell_index != -1:
+                self._invalidate_cell(self.hovered_cell_index)
+            if cell_index != -1:
+                self._invalidate_cell(cell_index)
+            self.hovered_cell_index = cell_index
         
-        return valid_numbers
+        widget = None
+        for name, (rect, _) in self.ui_widgets.items():
+            if rect.collidepoint(pos):
+                widget = name
+                break
+        if widget != self.hovered_widget:
+            if self.hovered_widget is not None:
+                self._invalidate_widget(self.hovered_widget)
+            if widget is not None:
+                self._invalidate_widget(widget)
+            self.hovered_widget = widget
+    
+    def _get_valid_numbers(self, cell_index: int) -> int:
+        """Get the bitmask of digits that do not clash with the cell's peers."""
+        if self.board.is_given(cell_index):
+            return 0
+        return self.candidate_engine.candidates(cell_index)
+    
+    def _digits_of(self, mask: int) -> str:
+        """Return the symbols of a candidate bitmask in ascending order."""
+        return ''.join(symbol for bit, symbol in enumerate(self.VALID_NUMBERS) if mask >> bit & 1)
     
     def _reset_user_input(self) -> None:
         """Reset all user-input numbers, keeping initial puzzle."""
-        for i in range(self.TOTAL_CELLS):
-            if not self.box_is_initial[i]:
-                self.box_values[i] = ''
-                self.box_multiple_values[i] = ''
-                self.box_is_uncertain[i] = False
+        self._edit_cells({i: (0, 0) for i in range(self.TOTAL_CELLS) if not self.board.is_given(i)})
         
-        # Reset conflicts and completion
-        self.box_has_conflict = {i: False for i in range(self.TOTAL_CELLS)}
+        # Reset completion
         self.is_complete = False
-        self._validate_all_cells()
+        self.completion_pending = True
+        self._invalidate_widget('timer')
     
-    def _generate_new_puzzle(self) -> None:
-        """Generate a new Sudoku puzzle with current difficulty."""
-        puzzle = Sudoku(3, 3, seed=random.randint(0, sys.maxsize - 1)).difficulty(self.difficulty)
+    def _request_new_puzzle(self) -> None:
+        """Start a new puzzle from the pool, or wait for one without blocking."""
+        puzzle = self.puzzle_source.get(self.difficulty)
+        if puzzle is None:
+            self.is_generating = True
+            self.pending_difficulty = self.difficulty
+        else:
+            self.is_generating = False
+            self._load_puzzle(puzzle)
+        self._invalidate_widget('start')
+    
+    def _poll_pending_puzzle(self) -> None:
+        """Load the requested puzzle once the pool has produced it."""
+        puzzle = self.puzzle_source.poll(self.pending_difficulty)
+        if puzzle is None:
+            # Keep the pending difficulty wanted even if the wheel moved on
+            self.puzzle_source.prefetch(self.pending_difficulty)
+        else:
+            self.is_generating = False
+            self._load_puzzle(puzzle)
+            self._invalidate_widget('start')
+    
+    def _load_puzzle(self, puzzle: Puzzle) -> None:
+        """Replace the board with a generated puzzle."""
+        self.puzzle = puzzle
         
         # Reset game state
-        self.box_values = {i: '' for i in range(self.TOTAL_CELLS)}
-        self.box_is_initial = {i: False for i in range(self.TOTAL_CELLS)}
-        self.box_has_conflict = {i: False for i in range(self.TOTAL_CELLS)}
-        self.box_multiple_values = {i: '' for i in range(self.TOTAL_CELLS)}
-        self.box_is_uncertain = {i: False for i in range(self.TOTAL_CELLS)}
+        self.board.reset()
         
         # Fill initial values from puzzle
-        index = 0
-        for row in puzzle.board:
-            for cell_value in row:
-                if cell_value:
-                    self.box_values[index] = str(cell_value)
-                    self.box_is_initial[index] = True
-                index += 1
+        self.board.digits[:] = bytes(puzzle.givens)
+        for index, cell_value in enumerate(puzzle.givens):
+            if cell_value:
+                self.board.flags[index] = BoardState.GIVEN
+        self._validate_all_cells()
+        self.board_version += 1
+        self.history.clear()
+        if self.race is not None:
+            # Restarting clears this player's board on the race server too
+            self.race_outbox = {i: (0, 0) for i in range(self.TOTAL_CELLS) if not puzzle.givens[i]}
         
         # Reset game state
         self.is_complete = False
         self.time_elapsed = 0
+        self._invalidate_all()
+    
+    def _snapshot(self) -> Snapshot:
+        """Capture the current game for autosaving."""
+        return Snapshot(self.puzzle, self.board.to_bytes(), self.time_elapsed, self.difficulty,
+                        self.is_complete, self.focused_cell_index)
+    
+    def _resume(self, snapshot: Snapshot) -> None:
+        """Restore a saved game; the undo history starts empty."""
+        self.puzzle = snapshot.puzzle
+        self.board.load_bytes(snapshot.board)
+        self._validate_all_cells()
+        self.board_version += 1
+        self.history.clear()
+        
+        self.is_complete = snapshot.is_complete
+        self.time_elapsed = snapshot.time_elapsed
+        self.difficulty = self.pending_difficulty = snapshot.difficulty
+        self.puzzle_source.prefetch(self.difficulty)
+        if 0 <= snapshot.focused_cell < self.TOTAL_CELLS:
+            self._set_focus(snapshot.focused_cell)
+        # The file on disk already holds this state
+        self.autosaved_key = (self.board_version, self.time_elapsed)
+        self._invalidate_all()
+    
+    def _autosave(self) -> None:
+        """Hand a snapshot to the autosaver, unless nothing changed, and schedule the next one."""
+        self.next_autosave_time = self.session_time + self.autosaver.interval_ms
+        # An empty board has nothing worth keeping, so the last game is not overwritten
+        key = (self.board_version, self.time_elapsed)
+        if self.puzzle is not None and key != self.autosaved_key:
+            self.autosaver.save(self._snapshot())
+            self.autosaved_key = key
     
     def _handle_number_input(self, key: str) -> None:
         """Handle number key input for the focused cell."""
-        if self.focused_cell_index != -1 and not self.box_is_initial[self.focused_cell_index]:
-            # If cell is uncertain, clear uncertainty and set single value
-            if self.box_is_uncertain[self.focused_cell_index]:
-                self.box_is_uncertain[self.focused_cell_index] = False
-                self.box_multiple_values[self.focused_cell_index] = ''
-            
-            self.box_values[self.focused_cell_index] = key
-            self._validate_all_cells()
+        if self.focused_cell_index != -1 and not self.board.is_given(self.focused_cell_index):
+            # Set a single value, clearing any uncertainty
+            self._edit_cells({self.focused_cell_index: (self.VALID_NUMBERS.index(key) + 1, 0)})
     
     def _handle_space_input(self) -> None:
         """Handle space key input for filling multiple valid numbers."""
-        if self.focused_cell_index != -1 and not self.box_is_initial[self.focused_cell_index]:
+        if self.focused_cell_index != -1 and not self.board.is_given(self.focused_cell_index):
             valid_numbers = self._get_valid_numbers(self.focused_cell_index)
             
-            if len(valid_numbers) > 1:
+            if valid_numbers.bit_count() > 1:
                 # Clear single value and set multiple values
-                self.box_values[self.focused_cell_index] = ''
-                self.box_multiple_values[self.focused_cell_index] = ''.join(sorted(valid_numbers))
-                self.box_is_uncertain[self.focused_cell_index] = True
-                self._validate_all_cells()
+                self._edit_cells({self.focused_cell_index: (0, valid_numbers)})
+    
+    def _fill_all_candidates(self) -> None:
+        """Fill pencil marks for every empty cell in one undo step."""
+        changes = {}
+        for cell_index, mask in enumerate(self.candidate_engine.all_candidates()):
+            if not self.board.digits[cell_index] and mask.bit_count() > 1:
+                changes[cell_index] = (0, mask)
+        self._edit_cells(changes)
+    
+    def _apply_singles(self) -> None:
+        """Place every digit forced by naked and hidden singles.
+        
+        Existing pencil marks are narrowed to what the singles leave.
+        Does nothing while the board has conflicts.
+        """
+        solved = self.candidate_engine.singles()
+        if solved is None:
+            return
+        
+        changes = {}
+        for cell_index, mask in enumerate(solved):
+            if self.board.digits[cell_index]:
+                continue
+            if not mask & (mask - 1):
+                changes[cell_index] = (mask.bit_length(), 0)
+            elif self.board.candidates[cell_index]:
+                changes[cell_index] = (0, self.board.candidates[cell_index] & mask)
+        self._edit_cells(changes)
+    
+    def _find_hint(self) -> Optional[Hint]:
+        """Return the next step from the current board, or None without a puzzle.
+        
+        Mistakes come first, then cells forced by singles; when only harder
+        techniques would help, the empty cell with the fewest candidates
+        gets its digit from the solution.
+        """
+        if self.puzzle is None or self.is_complete:
+            return None
+        solution = self.puzzle.solution
+        if self.wrong_cells:
+            cell_index = min(self.wrong_cells)
+            return Hint(cell_index, solution[cell_index], 'mistake')
+        
+        single = self.candidate_engine.next_single()
+        if single is not None:
+            return Hint(*single)
+        empty = [i for i in range(self.TOTAL_CELLS) if not self.board.digits[i]]
+        if not empty:
+            return None
+        cell_index = min(empty, key=lambda i: self.candidate_engine.candidates(i).bit_count())
+        return Hint(cell_index, solution[cell_index], 'solution')
+    
+    def _set_hint(self, hint: Optional[Hint]) -> None:
+        """Highlight a hint's cell (None clears the highlight)."""
+        if self.hint is not None:
+            self._invalidate_cell(self.hint.cell)
+        self.hint = hint
+        if hint is not None:
+            self._invalidate_cell(hint.cell)
+    
+    def _show_hint(self) -> None:
+        """Highlight the next step; asking again for the same step fills it in."""
+        hint = self._find_hint()
+        if hint is None:
+            return
+        if hint == self.hint:
+            self._edit_cells({hint.cell: (hint.digit, 0)})
+            return
+        self._set_hint(hint)
+        self._set_focus(hint.cell)
     
     def _handle_mouse_wheel(self, direction: int) -> None:
         """Handle mouse wheel input for difficulty adjustment."""
@@ -253,98 +622,139 @@ class SudokuGame:
         
         # Clamp difficulty values
         self.difficulty = max(0.01, min(0.99, self.difficulty))
+        self.puzzle_source.prefetch(self.difficulty)
+        self._invalidate_widget('difficulty')
     
     def _check_completion(self) -> None:
-        """Check if the puzzle is completed."""
-        if self.is_complete:
+        """Check if the puzzle is completed; O(1) unless the board just filled up."""
+        if self.is_complete or not self.completion_pending:
             return
+        self.completion_pending = False
         
-        # Check if there are any uncertain cells
-        if any(self.box_is_uncertain.values()):
+        # Every cell filled, none pencil-marked and no duplicates anywhere
+        if (self.filled_count != self.TOTAL_CELLS or self.uncertain_count
+                or self.conflict_tracker.conflict_count):
             return
         
-        total = 0
-        for value in self.box_values.values():
-            total += int(value) if value else 0
+        # Confirm from the unit masks: each unit holds every digit exactly once
+        full = ((1 << self.GRID_SIZE) - 1) << 1
+        if any(mask != full for mask in self.conflict_tracker.present_mask):
+            return
         
-        # Check if all cells are filled and no conflicts
-        self.is_complete = (total == 45 * self.GRID_SIZE and 
-                          not any(self.box_has_conflict.values()))
+        self.is_complete = True
+        pygame.event.post(pygame.event.Event(PUZZLE_COMPLETE, time_ms=self.time_elapsed,
+                                             difficulty=self.difficulty if self.puzzle is None
+                                             else self.puzzle.difficulty,
+                                             seed=None if self.puzzle is None else self.puzzle.seed,
+                                             steps=self.history.position))
     
-    def _draw_grid(self, mouse_pos: Tuple[int, int]) -> None:
+    def _draw_grid(self) -> None:
         """Draw the Sudoku grid."""
-        for i, box in enumerate(self.input_boxes):
-            # Determine box color
-            if self.box_is_initial[i]:
-                bg_color = self.LIGHT_GRAY
-            else:
-                bg_color = self.WHITE
-            
-            # Draw box background
-            pygame.draw.rect(self.screen, bg_color, box)
-            
-            # Determine border color and width
-            if self.show_popup and i == self.popup_cell_index:
-                # Keep the popup cell highlighted
-                border_color = self.GREEN
-                border_width = 2
-            elif i == self.focused_cell_index:
-                # Focused cell
-                if self.box_is_uncertain[i]:
-                    # Uncertain cell has yellow border
-                    border_color = self.YELLOW
-                    border_width = 2
-                else:
-                    # Normal focused cell has green border
-                    border_color = self.GREEN
-                    border_width = 2
-            elif self.box_is_uncertain[i]:
-                # Uncertain but not focused has yellow border
+        for i in range(self.TOTAL_CELLS):
+            self._draw_cell(i)
+    
+    def _draw_cell(self, i: int) -> pygame.Rect:
+        """Draw a single cell and return the screen area it covers."""
+        box = self.input_boxes[i]
+        
+        # Determine box color
+        if self.board.is_given(i):
+            bg_color = self.LIGHT_GRAY
+        elif self.hint is not None and i == self.hint.cell:
+            bg_color = self.LIGHT_RED if self.hint.reason == 'mistake' else self.LIGHT_GREEN
+        else:
+            bg_color = self.WHITE
+        
+        # Draw box background
+        pygame.draw.rect(self.screen, bg_color, box)
+        
+        # Determine border color and width
+        if self.show_popup and i == self.popup_cell_index:
+            # Keep the popup cell highlighted
+            border_color = self.GREEN
+            border_width = 2
+        elif i == self.focused_cell_index:
+            # Focused cell
+            if self.board.is_uncertain(i):
+                # Uncertain cell has yellow border
                 border_color = self.YELLOW
-                border_width = 1
-            elif box.collidepoint(mouse_pos) and not self.box_is_initial[i] and not self.show_popup:
-                # Hover effect: just thicker border
-                border_color = self.DEEP_GRAY
                 border_width = 2
             else:
-                border_color = self.DEEP_GRAY
-                border_width = 1
-            
-            # Draw box border
-            pygame.draw.rect(self.screen, border_color, box, border_width, 3)
-            
-            # Draw number(s)
-            if self.box_values[i]:
-                # Single number
-                text_color = self.RED if self.box_has_conflict[i] else self.DEEP_GRAY
-                text_surface = self.font.render(self.box_values[i], True, text_color)
-                text_rect = text_surface.get_rect(center=box.center)
-                self.screen.blit(text_surface, text_rect)
-            elif self.box_multiple_values[i] and self.box_is_uncertain[i]:
-                # Multiple numbers in uncertain state
-                self._draw_multiple_numbers(box, self.box_multiple_values[i])
-    
-    def _draw_multiple_numbers(self, box: pygame.Rect, numbers: str) -> None:
+                # Normal focused cell has green border
+                border_color = self.GREEN
+                border_width = 2
+        elif self.board.is_uncertain(i):
+            # Uncertain but not focused has yellow border
+            border_color = self.YELLOW
+            border_width = 1
+        elif i == self.hovered_cell_index and not self.board.is_given(i) and not self.show_popup:
+            # Hover effect: just thicker border
+            border_color = self.DEEP_GRAY
+            border_width = 2
+        else:
+            border_color = self.DEEP_GRAY
+            border_width = 1
+        
+        # Draw box border
+        pygame.draw.rect(self.screen, border_color, box, border_width, 3)
+        
+        # Draw number(s)
+        digit = self.board.digits[i]
+        if digit:
+            # Single number
+            text_color = self.RED if self.board.has_conflict(i) else self.DEEP_GRAY
+            text_surface = self.glyphs.render('digit', self.VALID_NUMBERS[digit - 1], text_color)
+            text_rect = text_surface.get_rect(center=box.center)
+            self.screen.blit(text_surface, text_rect)
+        elif self.board.candidates[i] and self.board.is_uncertain(i):
+            # Multiple numbers in uncertain state
+            self._draw_multiple_numbers(box, self.board.candidates[i], bg_color)
+        
+        return box
+    
+    def _draw_multiple_numbers(self, box: pygame.Rect, candidates: int, background: Color) -> None:
         """Draw multiple numbers in a cell with automatic spacing."""
-        if not numbers:
+        if not candidates:
             return
         
-        # Use smaller font for multiple numbers
-        small_font = pygame.font.Font(None, 20)
+        # The layout is cached per candidate mask and cell background; skip the cell border
+        marks = self.glyphs.get(('pencil-layout', candidates, background),
+                                lambda: self._render_pencil_marks(self._digits_of(candidates), background))
+        inset = self.PENCIL_MARK_INSET
+        area = marks.get_rect().inflate(-2 * inset, -2 * inset)
+        self.screen.blit(marks, (box.left + inset, box.top + inset), area)
+    
+    def _render_pencil_marks(self, numbers: str, background: Color) -> pygame.Surface:
+        """Lay out pencil marks on a cell-sized surface filled with ``background``."""
+        marks = pygame.Surface((self.CELL_SIZE, self.CELL_SIZE))
+        marks.fill(background)
+        box = marks.get_rect()
         
         # Calculate layout based on number of digits
         num_count = len(numbers)
         
-        if num_count <= 3:
+        if self.GRID_SIZE > 9:
+            # Fixed grid on big boards: each digit keeps its own slot inside the border
+            columns = self.pencil_columns
+            inner = box.inflate(-2 * self.PENCIL_MARK_INSET, -2 * self.PENCIL_MARK_INSET)
+            for num in numbers:
+                slot = self.VALID_NUMBERS.index(num)
+                x = inner.left + inner.width * (slot % columns * 2 + 1) // (2 * columns)
+                y = inner.top + inner.height * (slot // columns * 2 + 1) // (2 * columns)
+                text_surface = self.glyphs.render('pencil', num, self.DEEP_GRAY)
+                text_rect = text_surface.get_rect(center=(x, y))
+                marks.blit(text_surface, text_rect)
+        
+        elif num_count <= 3:
             # Horizontal layout for 1-3 numbers
             total_width = box.width - 10
             spacing = total_width // (num_count + 1)
             for i, num in enumerate(numbers):
                 x = box.left + spacing * (i + 1)
                 y = box.centery
-                text_surface = small_font.render(num, True, self.DEEP_GRAY)
+                text_surface = self.glyphs.render('pencil', num, self.DEEP_GRAY)
                 text_rect = text_surface.get_rect(center=(x, y))
-                self.screen.blit(text_surface, text_rect)
+                marks.blit(text_surface, text_rect)
         
         elif num_count <= 6:
             # Two rows for 4-6 numbers
@@ -357,9 +767,9 @@ class SudokuGame:
                 col = i % numbers_per_row
                 x = box.left + spacing * (col + 1)
                 y = box.centery + (row - 0.5) * 25
-                text_surface = small_font.render(num, True, self.DEEP_GRAY)
+                text_surface = self.glyphs.render('pencil', num, self.DEEP_GRAY)
                 text_rect = text_surface.get_rect(center=(x, y))
-                self.screen.blit(text_surface, text_rect)
+                marks.blit(text_surface, text_rect)
         
         else:
             # 3x3 grid for 7-9 numbers
@@ -378,32 +788,39 @@ class SudokuGame:
             for i, num in enumerate(numbers):
                 if i < len(positions):
                     x, y = positions[i]
-                    text_surface = small_font.render(num, True, self.DEEP_GRAY)
+                    text_surface = self.glyphs.render('pencil', num, self.DEEP_GRAY)
                     text_rect = text_surface.get_rect(center=(x, y))
-                    self.screen.blit(text_surface, text_rect)
+                    marks.blit(text_surface, text_rect)
+        
+        return marks
     
     def _show_number_popup(self, cell_index: int) -> None:
         """Show number popup for a specific cell."""
-        if self.box_is_initial[cell_index]:
+        if self.board.is_given(cell_index):
             return
         
         self.show_popup = True
         self.popup_cell_index = cell_index
         self.popup_rects = []
+        self._invalidate_all()
         
-        # Calculate popup position
+        # Calculate popup position, keeping every circle's center on screen
+        columns = self.pencil_columns
+        rows = (self.GRID_SIZE + columns - 1) // columns
         cell_rect = self.input_boxes[cell_index]
-        center_x = cell_rect.centerx
-        center_y = cell_rect.centery
+        half_width = (columns - 1) * self.POPUP_SPACING // 2
+        half_height = (rows - 1) * self.POPUP_SPACING // 2
+        center_x = min(max(cell_rect.centerx, half_width), self.SCREEN_WIDTH - half_width)
+        center_y = min(max(cell_rect.centery, half_height), self.SCREEN_HEIGHT - half_height)
         
-        # Create popup circles in 3x3 grid
-        for i in range(9):
-            row = i // 3
-            col = i % 3
+        # Create popup circles in a grid, 3x3 on a 9x9 board
+        for i in range(self.GRID_SIZE):
+            row = i // columns
+            col = i % columns
             
             # Calculate position relative to cell
-            offset_x = (col - 1) * self.POPUP_SPACING
-            offset_y = (row - 1) * self.POPUP_SPACING
+            offset_x = (2 * col - (columns - 1)) * self.POPUP_SPACING // 2
+            offset_y = (2 * row - (rows - 1)) * self.POPUP_SPACING // 2
             
             popup_x = center_x + offset_x
             popup_y = center_y + offset_y
@@ -420,6 +837,39 @@ class SudokuGame:
         self.show_popup = False
         self.popup_cell_index = -1
         self.popup_rects = []
+        self._invalidate_all()
+    
+    def _get_popup_valid_numbers(self) -> int:
+        """Return the popup cell's valid numbers, recomputed only after board edits."""
+        key = (self.popup_cell_index, self.board_version)
+        if key != self.popup_valid_key:
+            self.popup_valid_numbers = self._get_valid_numbers(self.popup_cell_index)
+            self.popup_valid_key = key
+        return self.popup_valid_numbers
+    
+    def _render_popup_sprite(self, number: str, is_valid: bool) -> Tuple[pygame.Surface, Tuple[int, int]]:
+        """Pre-render one popup circle with its digit.
+        
+        Returns the sprite and the offset of the circle center inside it.
+        """
+        if is_valid:
+            color = self.LIGHT_GREEN
+            text_color = self.DEEP_GRAY
+        else:
+            color = self.RED
+            text_color = self.WHITE
+        
+        text_surface = self.glyphs.render('popup', number, text_color)
+        circle_rect = pygame.Rect(0, 0, self.POPUP_RADIUS * 2, self.POPUP_RADIUS * 2)
+        text_rect = text_surface.get_rect(center=circle_rect.center)
+        bounds = circle_rect.union(text_rect)
+        center = (circle_rect.centerx - bounds.left, circle_rect.centery - bounds.top)
+        
+        sprite = pygame.Surface(bounds.size, pygame.SRCALPHA)
+        pygame.draw.circle(sprite, color, center, self.POPUP_RADIUS)
+        pygame.draw.circle(sprite, self.DEEP_GRAY, center, self.POPUP_RADIUS, 2)
+        sprite.blit(text_surface, text_surface.get_rect(center=center))
+        return sprite, center
     
     def _draw_number_popup(self) -> None:
         """Draw number popup if active."""
@@ -427,33 +877,17 @@ class SudokuGame:
             return
         
         # Get valid numbers for this cell
-        valid_numbers = self._get_valid_numbers(self.popup_cell_index)
+        valid_numbers = self._get_popup_valid_numbers()
         
         # Draw semi-transparent background
-        popup_surface = pygame.Surface((self.SCREEN_WIDTH, self.SCREEN_HEIGHT), pygame.SRCALPHA)
-        popup_surface.fill((255, 255, 255, self.POPUP_ALPHA))
-        self.screen.blit(popup_surface, (0, 0))
+        self.screen.blit(self.popup_overlay, (0, 0))
         
         # Draw number circles
         for i, rect in enumerate(self.popup_rects):
-            number = str(i + 1)
-            
-            # Determine color based on validity
-            if number in valid_numbers:
-                color = self.LIGHT_GREEN
-                text_color = self.DEEP_GRAY
-            else:
-                color = self.RED
-                text_color = self.WHITE
-            
-            # Draw circle
-            pygame.draw.circle(self.screen, color, rect.center, self.POPUP_RADIUS)
-            pygame.draw.circle(self.screen, self.DEEP_GRAY, rect.center, self.POPUP_RADIUS, 2)
-            
-            # Draw number
-            text_surface = self.font.render(number, True, text_color)
-            text_rect = text_surface.get_rect(center=rect.center)
-            self.screen.blit(text_surface, text_rect)
+            number = self.VALID_NUMBERS[i]
+            is_valid = bool(valid_numbers >> i & 1)
+            sprite, (center_x, center_y) = self.popup_sprites[number, is_valid]
+            self.screen.blit(sprite, (rect.centerx - center_x, rect.centery - center_y))
     
     def _handle_popup_click(self, mouse_pos: Tuple[int, int]) -> bool:
         """Handle click on number popup. Returns True if a number was selected."""
@@ -462,11 +896,7 @@ class SudokuGame:
         
         for i, rect in enumerate(self.popup_rects):
             if rect.collidepoint(mouse_pos):
-                number = str(i + 1)
-                self.box_values[self.popup_cell_index] = number
-                self.box_multiple_values[self.popup_cell_index] = ''
-                self.box_is_uncertain[self.popup_cell_index] = False
-                self._validate_all_cells()
+                self._edit_cells({self.popup_cell_index: (i + 1, 0)})
                 self._hide_number_popup()
                 return True
         
@@ -474,140 +904,316 @@ class SudokuGame:
         self._hide_number_popup()
         return False
     
-    def _draw_ui_elements(self, mouse_pos: Tuple[int, int]) -> None:
-        """Draw UI elements (timer, difficulty, start button)."""
-        # Draw timer
+    def _draw_ui_elements(self) -> None:
+        """Draw UI elements (timer, difficulty, start button, reset button)."""
+        for _, draw in self.ui_widgets.values():
+            draw()
+    
+    def _draw_timer(self) -> pygame.Rect:
+        """Draw the timer box."""
         timer_color = self.GREEN if self.is_complete else self.DEEP_GRAY
+        pygame.draw.rect(self.screen, self.WHITE, self.timer_box)
         pygame.draw.rect(self.screen, timer_color, self.timer_box, 1, 3)
         
         elapsed_seconds = self.time_elapsed // 1000
         minutes = str(elapsed_seconds // 60).zfill(2)
         seconds = str(elapsed_seconds % 60).zfill(2)
         
+        # Rendered directly: every second is a new label that would evict cached glyphs
         timer_text = self.mini_font.render(f'{minutes}:{seconds}', True, timer_color)
         timer_rect = timer_text.get_rect(center=self.timer_box.center)
         self.screen.blit(timer_text, timer_rect)
+        return self.timer_box
+    
+    def _draw_button(self, name: str, rect: pygame.Rect, label: str) -> pygame.Rect:
+        """Draw a bordered box with a centered label and a hover background."""
+        bg_color = self.LIGHT_GRAY if self.hovered_widget == name else self.WHITE
+        pygame.draw.rect(self.screen, bg_color, rect)
+        pygame.draw.rect(self.screen, self.DEEP_GRAY, rect, 1, 3)
         
-        # Draw difficulty box
-        diff_bg_color = self.LIGHT_GRAY if self.difficulty_box.collidepoint(mouse_pos) else self.WHITE
-        pygame.draw.rect(self.screen, diff_bg_color, self.difficulty_box)
-        pygame.draw.rect(self.screen, self.DEEP_GRAY, self.difficulty_box, 1, 3)
+        text = self.glyphs.render('label', label, self.DEEP_GRAY)
+        text_rect = text.get_rect(center=rect.center)
+        self.screen.blit(text, text_rect)
+        return rect
+    
+    def _draw_difficulty_box(self) -> pygame.Rect:
+        """Draw the difficulty box."""
+        return self._draw_button('difficulty', self.difficulty_box, f'{self.difficulty:.2f}')
+    
+    def _draw_start_button(self) -> pygame.Rect:
+        """Draw the start button, showing progress while a puzzle is generated."""
+        start_label = '...' if self.is_generating else 'start'
+        return self._draw_button('start', self.start_button, start_label)
+    
+    def _draw_reset_button(self) -> pygame.Rect:
+        """Draw the reset button."""
+        return self._draw_button('reset', self.reset_button, 'reset')
+    
+    def _render(self) -> None:
+        """Redraw what changed since the last frame and push it to the display."""
+        dirty = self.dirty_cells or self.dirty_widgets
+        if self.needs_full_redraw or (dirty and self.show_popup):
+            # The popup overlay covers the whole screen
+            self.screen.fill(self.WHITE)
+            self._draw_grid()
+            self._draw_ui_elements()
+            self._draw_number_popup()
+            pygame.display.flip()
+        elif dirty:
+            rects = [self._draw_cell(i) for i in self.dirty_cells]
+            rects.extend(self.ui_widgets[name][1]() for name in self.dirty_widgets)
+            pygame.display.update(rects)
         
-        diff_text = self.mini_font.render(f'{self.difficulty:.2f}', True, self.DEEP_GRAY)
-        diff_rect = diff_text.get_rect(center=self.difficulty_box.center)
-        self.screen.blit(diff_text, diff_rect)
+        self.needs_full_redraw = False
+        self.dirty_cells.clear()
+        self.dirty_widgets.clear()
+    
+    def _idle_timeout(self) -> int:
+        """Return how long the loop may block waiting for input (0 = forever)."""
+        if self.is_generating:
+            return self.GENERATING_POLL_MS
+        if self.is_complete:
+            return 0
+        # Wake up when the timer display changes
+        return 1000 - self.time_elapsed % 1000
+    
+    def _handle_event(self, event: pygame.event.Event) -> None:
+        """Dispatch a single pygame event."""
+        if event.type == QUIT:
+            self.running = False
         
-        # Draw start button
-        start_bg_color = self.LIGHT_GRAY if self.start_button.collidepoint(mouse_pos) else self.WHITE
-        pygame.draw.rect(self.screen, start_bg_color, self.start_button)
-        pygame.draw.rect(self.screen, self.DEEP_GRAY, self.start_button, 1, 3)
+        elif event.type == KEYDOWN:
+            if event.mod & KMOD_CTRL and event.key == pygame.K_h:
+                self._show_hint()
+            elif event.mod & KMOD_CTRL and event.key in (pygame.K_z, pygame.K_y):
+                # Ctrl+Z undoes; Ctrl+Y and Ctrl+Shift+Z redo
+                if event.key == pygame.K_y or event.mod & KMOD_SHIFT:
+                    self._redo()
+                else:
+                    self._undo()
+            elif event.key == pygame.K_SPACE and event.mod & KMOD_SHIFT:
+                self._fill_all_candidates()
+            elif event.key == pygame.K_RETURN:
+                self._apply_singles()
+            elif event.key == pygame.K_SPACE:
+                if self.show_popup:
+                    # Close popup and fill multiple numbers
+                    self._hide_number_popup()
+                    self._handle_space_input()
+                else:
+                    self._handle_space_input()
+            elif event.unicode and event.unicode.upper() in self.VALID_NUMBERS:
+                self._handle_number_input(event.unicode.upper())
         
-        start_text = self.mini_font.render('start', True, self.DEEP_GRAY)
-        start_rect = start_text.get_rect(center=self.start_button.center)
-        self.screen.blit(start_text, start_rect)
+        elif event.type == pygame.MOUSEMOTION:
+            self._update_hover(event.pos)
         
-        # Draw reset button
-        reset_bg_color = self.LIGHT_GRAY if self.reset_button.collidepoint(mouse_pos) else self.WHITE
-        pygame.draw.rect(self.screen, reset_bg_color, self.reset_button)
-        pygame.draw.rect(self.screen, self.DEEP_GRAY, self.reset_button, 1, 3)
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            self._update_hover(event.pos)
+            mouse_pos = event.pos
+            if event.button == 1:  # Left click
+                if self.show_popup:
+                    self._handle_popup_click(mouse_pos)
+                elif self.start_button.collidepoint(mouse_pos):
+                    self._request_new_puzzle()
+                elif self.reset_button.collidepoint(mouse_pos):
+                    self._reset_user_input()
+                else:
+                    self._handle_cell_click(mouse_pos)
+            
+            elif event.button == 3:  # Right click
+                if not self.show_popup:
+                    # Check if click is on a cell
+                    i = self._cell_at(mouse_pos)
+                    if i != -1 and not self.board.is_given(i):
+                        self._show_number_popup(i)
+                        self._set_focus(i)
+            
+            elif event.button == 4:  # Mouse wheel up
+                if self.difficulty_box.collidepoint(mouse_pos):
+                    self._handle_mouse_wheel(1)
+            
+            elif event.button == 5:  # Mouse wheel down
+                if self.difficulty_box.collidepoint(mouse_pos):
+                    self._handle_mouse_wheel(-1)
+        
+        elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            self._invalidate_all()
+    
+    def _handle_cell_click(self, mouse_pos: Tuple[int, int]) -> None:
+        """Focus a cell on single click and clear it on double click."""
+        current_time = self.session_time
+        i = self._cell_at(mouse_pos)
+        if i != -1 and not self.board.is_given(i):
+            # Check for double-click
+            if (i == self.last_click_cell and 
+                current_time - self.last_click_time < self.DOUBLE_CLICK_DELAY):
+                # Double-click: clear the cell
+                self._edit_cells({i: (0, 0)})
+            self._set_focus(i)
+            
+            self.last_click_cell = i
+            self.last_click_time = current_time
+        else:
+            # Click outside any editable cell, remove focus
+            self._set_focus(-1)
+            self.last_click_cell = -1
+    
+    def _begin_frame(self, frame_time: int) -> None:
+        """Advance the session clock by ``frame_time`` ms before the frame's events are handled.
         
-        reset_text = self.mini_font.render('reset', True, self.DEEP_GRAY)
-        reset_rect = reset_text.get_rect(center=self.reset_button.center)
-        self.screen.blit(reset_text, reset_rect)
+        Input handlers such as the double-click check then see the time the
+        events arrived rather than the end of the previous (possibly idle) frame.
+        """
+        self.session_time += frame_time
+    
+    def _update(self, frame_time: int) -> None:
+        """Advance the game timer by ``frame_time`` ms and the puzzle/completion state by one frame."""
+        if self.is_generating:
+            self._poll_pending_puzzle()
+        
+        if not self.is_complete:
+            self._check_completion()
+            if self.is_complete:
+                self._invalidate_widget('timer')
+            else:
+                previous_seconds = self.time_elapsed // 1000
+                self.time_elapsed += frame_time
+                if self.time_elapsed // 1000 != previous_seconds:
+                    self._invalidate_widget('timer')
     
     def run(self) -> None:
-        """Main game loop."""
+        """Main game loop.
+        
+        Blocks on input between frames and redraws only what changed, so an
+        idle board wakes up once a second for the timer.
+        """
+        profiler = self.profiler
+        recorder = self.recorder
+        autosaver = self.autosaver
+        race = self.race
+        
+        # Show the board before the puzzle pool starts competing for the interpreter
+        self._render()
+        self.puzzle_source.start()
         while self.running:
-            mouse_pos = pygame.mouse.get_pos()
-            
             # Handle events
-            for event in pygame.event.get():
-                if event.type == QUIT:
-                    self.running = False
-                
-                elif event.type == KEYDOWN:
-                    if event.key == pygame.K_SPACE:
-                        if self.show_popup:
-                            # Close popup and fill multiple numbers
-                            self._hide_number_popup()
-                            self._handle_space_input()
-                        else:
-                            self._handle_space_input()
-                    elif event.unicode in self.VALID_NUMBERS:
-                        self._handle_number_input(event.unicode)
-                
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    if event.button == 1:  # Left click
-                        if self.show_popup:
-                            self._handle_popup_click(mouse_pos)
-                        elif self.start_button.collidepoint(mouse_pos):
-                            self._generate_new_puzzle()
-                        elif self.reset_button.collidepoint(mouse_pos):
-                            self._reset_user_input()
-                        else:
-                            # Check if click is on a cell for focusing
-                            current_time = pygame.time.get_ticks()
-                            for i, box in enumerate(self.input_boxes):
-                                if box.collidepoint(mouse_pos) and not self.box_is_initial[i]:
-                                    # Check for double-click
-                                    if (i == self.last_click_cell and 
-                                        current_time - self.last_click_time < self.DOUBLE_CLICK_DELAY):
-                                        # Double-click: clear the cell
-                                        self.box_values[i] = ''
-                                        self.box_multiple_values[i] = ''
-                                        self.box_is_uncertain[i] = False
-                                        self._validate_all_cells()
-                                        self.focused_cell_index = i
-                                    else:
-                                        # Single-click: focus the cell
-                                        self.focused_cell_index = i
-                                    
-                                    self.last_click_cell = i
-                                    self.last_click_time = current_time
-                                    break
-                            else:
-                                # Click outside any cell, remove focus
-                                self.focused_cell_index = -1
-                                self.last_click_cell = -1
-                    
-                    elif event.button == 3:  # Right click
-                        if not self.show_popup:
-                            # Check if click is on a cell
-                            for i, box in enumerate(self.input_boxes):
-                                if box.collidepoint(mouse_pos) and not self.box_is_initial[i]:
-                                    self._show_number_popup(i)
-                                    self.focused_cell_index = i
-                                    break
-                    
-                    elif event.button == 4:  # Mouse wheel up
-                        if self.difficulty_box.collidepoint(mouse_pos):
-                            self._handle_mouse_wheel(1)
-                    
-                    elif event.button == 5:  # Mouse wheel down
-                        if self.difficulty_box.collidepoint(mouse_pos):
-                            self._handle_mouse_wheel(-1)
+            events = [pygame.event.wait(self._idle_timeout())]
+            events.extend(pygame.event.get())
+            frame_time = self.clock.tick(self.FPS)
+            self._begin_frame(frame_time)
+            if profiler is not None:
+                profiler.begin_frame()
+            for event in events:
+                if recorder is not None:
+                    recorder.record_event(event)
+                self._handle_event(event)
             
             # Update game state
-            if not self.is_complete:
-                self._check_completion()
-                self.time_elapsed += self.clock.tick(self.FPS)
-            else:
-                self.clock.tick(self.FPS)
+            self._update(frame_time)
+            if recorder is not None:
+                recorder.end_frame(frame_time)
+            if autosaver is not None and self.session_time >= self.next_autosave_time:
+                self._autosave()
+            if race is not None and self.race_outbox:
+                race.send_edits(self.race_outbox)
+                self.race_outbox = {}
             
-            # Draw everything
-            self.screen.fill(self.WHITE)
-            self._draw_grid(mouse_pos)
-            self._draw_ui_elements(mouse_pos)
-            self._draw_number_popup()
-            pygame.display.flip()
+            # Draw what changed
+            self._render()
+            if profiler is not None:
+                pygame.display.update(profiler.draw_overlay(self.screen, self.profile_font,
+                                                            self.PROFILE_OVERLAY_POS,
+                                                            self.DEEP_GRAY, self.WHITE))
+                profiler.end_frame()
         
+        self.puzzle_source.stop()
+        if recorder is not None:
+            recorder.close()
+        if autosaver is not None:
+            self._autosave()
+            autosaver.close()
+        if race is not None:
+            race.close()
         pygame.quit()
 
 
 def main() -> None:
-    """Entry point for the Sudoku game."""
-    game = SudokuGame()
+    """Entry point for the Sudoku game and its headless commands."""
+    if getattr(sys, 'frozen', False):
+        # Worker processes of a packaged executable start through here
+        import multiprocessing
+        multiprocessing.freeze_support()
+    if len(sys.argv) > 1 and sys.argv[1] == 'generate':
+        from batch_generate import main as generate_main
+        sys.exit(generate_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'corpus':
+        from puzzle_corpus import main as corpus_main
+        sys.exit(corpus_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'rate':
+        from difficulty_rater import main as rate_main
+        sys.exit(rate_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'dedupe':
+        from canonical_form import main as dedupe_main
+        sys.exit(dedupe_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'replay':
+        from session_log import main as replay_main
+        sys.exit(replay_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] in ('serve', 'race'):
+        from multiplayer import main as multiplayer_main
+        sys.exit(multiplayer_main(sys.argv[1:]))
+    
+    parser = argparse.ArgumentParser(description='Play Sudoku.')
+    parser.add_argument('--corpus', help='draw puzzles from a corpus file instead of generating them')
+    parser.add_argument('--size', type=int, choices=sorted(BOX_SHAPES),
+                        help='board size, e.g. 4, 9, 16 or 25 (default: the saved game\'s, else 9)')
+    parser.add_argument('--profile', action='store_true', help='show an FPS and frame-time overlay')
+    parser.add_argument('--profile-out', metavar='PATH',
+                        help='with --profile, write a Chrome trace (.json) or CSV (.csv) at exit')
+    parser.add_argument('--record', metavar='PATH', help='append this session\'s input to a replay log')
+    parser.add_argument('--autosave', metavar='PATH', default=DEFAULT_PATH,
+                        help='where the game in progress is saved and resumed from')
+    parser.add_argument('--no-autosave', action='store_true', help='neither resume nor save the game')
+    parser.add_argument('--join', metavar='HOST:PORT', help='play in a race hosted with the serve command')
+    parser.add_argument('--name', default='', help='player name shown to the race server')
+    args = parser.parse_args()
+    # The race puzzle comes from the server, so a replay would have no board to apply edits to
+    if args.join and args.record:
+        parser.error('--record cannot be combined with --join')
+    
+    profiler = recorder = None
+    if args.profile or args.profile_out:
+        from frame_profiler import FrameProfiler
+        profiler = FrameProfiler()
+    if args.record:
+        from session_log import SessionRecorder
+        recorder = SessionRecorder(args.record)
+    race = None
+    if args.join:
+        from multiplayer import RaceLink, parse_address
+        try:
+            race = RaceLink(*parse_address(args.join), args.name)
+        except (ValueError, OSError, EOFError) as error:
+            reason = str(error) or 'no answer from the server'
+            print(f'error: cannot join {args.join}: {reason}', file=sys.stderr)
+            sys.exit(1)
+    # Races are played on the server's puzzle and not worth resuming
+    autosaver = None if args.no_autosave or race is not None else Autosaver(args.autosave)
+    # Recorded sessions must start from an empty board to replay the same way
+    snapshot = autosaver.load() if autosaver is not None and recorder is None else None
+    size = args.size
+    if race is not None:
+        size = race.puzzle.box_rows * race.puzzle.box_cols
+    elif size is None:
+        size = 9 if snapshot is None else snapshot.puzzle.box_rows * snapshot.puzzle.box_cols
+    corpus = None if race is not None else args.corpus
+    game = SudokuGame(corpus, *box_shape(size), profiler=profiler, recorder=recorder,
+                      autosaver=autosaver, snapshot=snapshot, race=race)
     game.run()
+    if profiler is not None:
+        print(profiler.summary(), file=sys.stderr)
+        if args.profile_out:
+            profiler.export(args.profile_out)
 
 
 if __name__ == "__main__":
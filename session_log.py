@@ -0,0 +1,436 @@
+"""Record play sessions as compact input logs and replay them headlessly.
+
+A log file is a sequence of sessions, each appended as it is played:
+
+* ``SESSION``: magic ``PSDR``, version, box rows, box cols
+* per frame: the input events, then every puzzle the game asked its
+  puzzle source for (hit or miss, with seed, givens and solution), then
+  ``FRAME`` with the frame time in milliseconds
+
+Replaying feeds the same events, puzzle answers and frame times back
+into the game logic without rendering or frame pacing, so the final
+board, timer and completion state match the recorded session.
+
+Usage:
+    python pyg_sudoku.py --record sessions.log
+    python pyg_sudoku.py replay sessions.log --workers 4
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Deque, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import pygame
+
+from puzzle_generator import Puzzle, format_grid
+
+MAGIC = b'PSDR'
+VERSION = 1
+SESSION = struct.Struct('<4sBBB')
+KEY = struct.Struct('<BiHB')
+BUTTON = struct.Struct('<BhhB')
+MOTION = struct.Struct('<Bhh')
+PUZZLE = struct.Struct('<BBqH')
+MISS = struct.Struct('<BB')
+FRAME = struct.Struct('<BI')
+TAG = struct.Struct('<B')
+
+# Record tags; sessions start with the magic instead
+TAG_KEY = ord('K')
+TAG_BUTTON = ord('M')
+TAG_MOTION = ord('V')
+TAG_QUIT = ord('Q')
+TAG_PUZZLE = ord('G')
+TAG_MISS = ord('N')
+TAG_FRAME = ord('F')
+
+# Which puzzle source call a puzzle record answers
+VIA_GET = 0
+VIA_POLL = 1
+
+
+class SessionLogError(ValueError):
+    """Raised for malformed session logs."""
+
+
+class RecordedFrame(NamedTuple):
+    """Everything one frame of ``run()`` consumed."""
+    events: List[Tuple]
+    puzzles: List[Tuple[int, Optional[Puzzle]]]
+    frame_time: int
+
+
+class Session(NamedTuple):
+    """A decoded session: board shape and its frames."""
+    box_rows: int
+    box_cols: int
+    frames: List[RecordedFrame]
+
+
+class SessionRecorder:
+    """Append one session's frames to a log file.
+
+    Records are buffered per frame and written with one call at the end
+    of the frame; a crash loses at most the frame in progress.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open ``path`` for appending."""
+        self._file: BinaryIO = open(path, 'ab')
+        self._frame = bytearray()
+
+    def begin_session(self, box_rows: int, box_cols: int) -> None:
+        """Start a session on a board of the given box shape."""
+        self._file.write(SESSION.pack(MAGIC, VERSION, box_rows, box_cols))
+
+    def record_event(self, event) -> None:
+        """Buffer a pygame input event; events the game ignores are skipped."""
+        if event.type == pygame.KEYDOWN:
+            text = event.unicode.encode('utf-8')
+            self._frame += KEY.pack(TAG_KEY, event.key, event.mod, len(text)) + text
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            self._frame += BUTTON.pack(TAG_BUTTON, event.pos[0], event.pos[1], event.button)
+        elif event.type == pygame.MOUSEMOTION:
+            self._frame += MOTION.pack(TAG_MOTION, event.pos[0], event.pos[1])
+        elif event.type == pygame.QUIT:
+            self._frame += TAG.pack(TAG_QUIT)
+
+    def record_puzzle(self, via: int, puzzle: Optional[Puzzle]) -> None:
+        """Buffer the answer of a puzzle source call."""
+        if puzzle is None:
+            self._frame += MISS.pack(TAG_MISS, via)
+            return
+        seed = -1 if puzzle.seed is None else puzzle.seed
+        self._frame += PUZZLE.pack(TAG_PUZZLE, via, seed, round(puzzle.difficulty * 100))
+        self._frame += bytes(puzzle.givens) + bytes(puzzle.solution)
+
+    def end_frame(self, frame_time: int) -> None:
+        """Write the buffered frame."""
+        self._frame += FRAME.pack(TAG_FRAME, frame_time)
+        self._file.write(self._frame)
+        self._frame.clear()
+
+    def close(self) -> None:
+        """Flush and close the log."""
+        self._file.close()
+
+
+class RecordingPuzzleSource:
+    """Wrap a puzzle source and log every answer it gives."""
+
+    def __init__(self, source, recorder: SessionRecorder) -> None:
+        self.source = source
+        self.recorder = recorder
+
+    @property
+    def hits(self) -> int:
+        return self.source.hits
+
+    @property
+    def misses(self) -> int:
+        return self.source.misses
+
+    def start(self) -> None:
+        self.source.start()
+
+    def stop(self) -> None:
+        self.source.stop()
+
+    def prefetch(self, difficulty: float) -> None:
+        self.source.prefetch(difficulty)
+
+    def poll(self, difficulty: float) -> Optional[Puzzle]:
+        puzzle = self.source.poll(difficulty)
+        self.recorder.record_puzzle(VIA_POLL, puzzle)
+        return puzzle
+
+    def get(self, difficulty: float) -> Optional[Puzzle]:
+        puzzle = self.source.get(difficulty)
+        self.recorder.record_puzzle(VIA_GET, puzzle)
+        return puzzle
+
+
+class ReplayPuzzleSource:
+    """Answer puzzle source calls from a recorded frame, in order."""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.answers: Deque[Tuple[int, Optional[Puzzle]]] = deque()
+
+    def start(self) -> None:
+        """Nothing to start."""
+
+    def stop(self) -> None:
+        """Nothing to stop."""
+
+    def prefetch(self, difficulty: float) -> None:
+        """Nothing to prefetch."""
+
+    def _next(self, via: int) -> Optional[Puzzle]:
+        if not self.answers or self.answers[0][0] != via:
+            raise SessionLogError('replay diverged from the recorded puzzle requests')
+        return self.answers.popleft()[1]
+
+    def poll(self, difficulty: float) -> Optional[Puzzle]:
+        return self._next(VIA_POLL)
+
+    def get(self, difficulty: float) -> Optional[Puzzle]:
+        puzzle = self._next(VIA_GET)
+        if puzzle is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return puzzle
+
+
+def split_sessions(data: bytes) -> List[bytes]:
+    """Split a log into the raw bytes of each session."""
+    if data and not data.startswith(MAGIC):
+        raise SessionLogError('not a session log')
+    # The magic can also occur inside records, so walk record boundaries
+    return list(_walk_sessions(data))
+
+
+def _walk_sessions(data: bytes) -> Iterator[bytes]:
+    """Yield each session's bytes; a truncated last record ends the walk."""
+    offset = 0
+    size = len(data)
+    start = 0
+    cell_count = 0
+    try:
+        while offset < size:
+            if data.startswith(MAGIC, offset):
+                if offset > start:
+                    yield data[start:offset]
+                start = offset
+                _, version, box_rows, box_cols = SESSION.unpack_from(data, offset)
+                if version != VERSION:
+                    raise SessionLogError(f'unsupported session log version {version}')
+                cell_count = (box_rows * box_cols) ** 2
+                offset += SESSION.size
+            else:
+                offset += _record_size(data, offset, cell_count)
+    except (IndexError, struct.error):
+        pass
+    if size > start:
+        yield data[start:]
+
+
+def _record_size(data: bytes, offset: int, cell_count: int) -> int:
+    """Size of the non-session record at ``offset``."""
+    tag = data[offset]
+    if tag == TAG_KEY:
+        return KEY.size + data[offset + KEY.size - 1]
+    if tag == TAG_BUTTON:
+        return BUTTON.size
+    if tag == TAG_MOTION:
+        return MOTION.size
+    if tag == TAG_QUIT:
+        return TAG.size
+    if tag == TAG_PUZZLE:
+        return PUZZLE.size + 2 * cell_count
+    if tag == TAG_MISS:
+        return MISS.size
+    if tag == TAG_FRAME:
+        return FRAME.size
+    raise SessionLogError(f'unknown record tag {tag:#x} at offset {offset}')
+
+
+def decode_session(data: bytes) -> Session:
+    """Decode one session's bytes; a truncated last frame is dropped."""
+    _, version, box_rows, box_cols = SESSION.unpack_from(data, 0)
+    cell_count = (box_rows * box_cols) ** 2
+    frames = []
+    events: List[Tuple] = []
+    puzzles: List[Tuple[int, Optional[Puzzle]]] = []
+    offset = SESSION.size
+    try:
+        while offset < len(data):
+            tag = data[offset]
+            if tag == TAG_KEY:
+                _, key, mod, length = KEY.unpack_from(data, offset)
+                offset += KEY.size
+                events.append((TAG_KEY, key, mod, data[offset:offset + length].decode('utf-8')))
+                offset += length
+            elif tag == TAG_BUTTON:
+                _, x, y, button = BUTTON.unpack_from(data, offset)
+                events.append((TAG_BUTTON, x, y, button))
+                offset += BUTTON.size
+            elif tag == TAG_MOTION:
+                _, x, y = MOTION.unpack_from(data, offset)
+                events.append((TAG_MOTION, x, y))
+                offset += MOTION.size
+            elif tag == TAG_QUIT:
+                events.append((TAG_QUIT,))
+                offset += TAG.size
+            elif tag == TAG_PUZZLE:
+                _, via, seed, hundredths = PUZZLE.unpack_from(data, offset)
+                offset += PUZZLE.size
+                givens = tuple(data[offset:offset + cell_count])
+                solution = tuple(data[offset + cell_count:offset + 2 * cell_count])
+                if len(solution) != cell_count:
+                    raise struct.error('truncated puzzle')
+                offset += 2 * cell_count
+                puzzles.append((via, Puzzle(givens, solution, None if seed < 0 else seed,
+                                            hundredths / 100, box_rows, box_cols)))
+            elif tag == TAG_MISS:
+                _, via = MISS.unpack_from(data, offset)
+                puzzles.append((via, None))
+                offset += MISS.size
+            elif tag == TAG_FRAME:
+                _, frame_time = FRAME.unpack_from(data, offset)
+                frames.append(RecordedFrame(events, puzzles, frame_time))
+                events, puzzles = [], []
+                offset += FRAME.size
+            else:
+                raise SessionLogError(f'unknown record tag {tag:#x} at offset {offset}')
+    except (struct.error, UnicodeDecodeError):
+        # An interrupted write leaves a partial frame behind; replay what is complete
+        pass
+    return Session(box_rows, box_cols, frames)
+
+
+class ReplayResult(NamedTuple):
+    """Final state of a replayed session."""
+    frames: int
+    events: int
+    complete: bool
+    time_elapsed: int
+    board: str
+
+
+# One headless game per worker process and board shape, reused across sessions
+_games = {}
+
+
+def _headless_game(box_rows: int, box_cols: int):
+    """Return this process's headless game for the board shape."""
+    game = _games.get((box_rows, box_cols))
+    if game is None:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        # Imported here because pyg_sudoku imports this module
+        from pyg_sudoku import SudokuGame
+
+        game = SudokuGame(None, box_rows, box_cols)
+        game.puzzle_source.stop()
+        game.puzzle_source = ReplayPuzzleSource()
+        _games[(box_rows, box_cols)] = game
+    return game
+
+
+def replay_session(session: Session) -> ReplayResult:
+    """Re-apply a session to the game logic without rendering or pacing."""
+    game = _headless_game(session.box_rows, session.box_cols)
+    game._initialize_game_state()
+    game._initialize_session_state()
+    source = game.puzzle_source
+    source.answers.clear()
+    # Nothing drains the queue headlessly, so drop completion events of earlier sessions
+    pygame.event.clear()
+
+    key, button, motion, quit_ = pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN, pygame.MOUSEMOTION, pygame.QUIT
+    make_event = pygame.event.Event
+    event_count = 0
+    for frame in session.frames:
+        source.answers.extend(frame.puzzles)
+        game._begin_frame(frame.frame_time)
+        for record in frame.events:
+            tag = record[0]
+            if tag == TAG_KEY:
+                event = make_event(key, key=record[1], mod=record[2], unicode=record[3])
+            elif tag == TAG_BUTTON:
+                event = make_event(button, pos=(record[1], record[2]), button=record[3])
+            elif tag == TAG_MOTION:
+                event = make_event(motion, pos=(record[1], record[2]), rel=(0, 0), buttons=(0, 0, 0))
+            else:
+                event = make_event(quit_)
+            game._handle_event(event)
+        event_count += len(frame.events)
+        game._update(frame.frame_time)
+    return ReplayResult(len(session.frames), event_count, game.is_complete, game.time_elapsed,
+                        format_grid(game.board.digits))
+
+
+def _replay_chunk(sessions: Sequence[bytes]) -> List[ReplayResult]:
+    """Decode and replay a chunk of sessions (runs in a worker process)."""
+    return [replay_session(decode_session(data)) for data in sessions]
+
+
+def _chunks(paths: Sequence[str], chunk_size: int) -> Iterator[Tuple[str, int, List[bytes]]]:
+    """Yield (path, first session index, session bytes) chunks of the logs."""
+    for path in paths:
+        with open(path, 'rb') as log:
+            sessions = split_sessions(log.read())
+        for first in range(0, len(sessions), chunk_size):
+            yield path, first, sessions[first:first + chunk_size]
+
+
+def replay_logs(paths: Sequence[str], workers: int = 1,
+                chunk_size: int = 64) -> Iterator[Tuple[str, int, ReplayResult]]:
+    """Yield (path, session index, result) for every session of the logs, in order.
+
+    Up to ``workers`` processes replay with at most ``2 * workers``
+    chunks in flight, each reusing one headless game per board shape.
+    """
+    if workers <= 1:
+        for path, first, sessions in _chunks(paths, chunk_size):
+            for index, result in enumerate(_replay_chunk(sessions), first):
+                yield path, index, result
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending: Deque = deque()
+        for path, first, sessions in _chunks(paths, chunk_size):
+            pending.append((path, first, executor.submit(_replay_chunk, sessions)))
+            if len(pending) >= 2 * workers:
+                path, first, future = pending.popleft()
+                for index, result in enumerate(future.result(), first):
+                    yield path, index, result
+        while pending:
+            path, first, future = pending.popleft()
+            for index, result in enumerate(future.result(), first):
+                yield path, index, result
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Entry point for the ``replay`` command."""
+    parser = argparse.ArgumentParser(prog='replay', description='Replay recorded sessions headlessly.')
+    parser.add_argument('logs', nargs='+', help='session log files')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--chunk-size', type=int, default=64, help='sessions per worker task')
+    parser.add_argument('--output', default='-',
+                        help="per-session results file, '-' for stdout, '' to skip")
+    args = parser.parse_args(argv)
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w') if args.output else None
+    start = time.perf_counter()
+    sessions = events = 0
+    try:
+        for path, index, result in replay_logs(args.logs, args.workers, args.chunk_size):
+            sessions += 1
+            events += result.events
+            if output is not None:
+                output.write(f'{path}:{index} {result.frames} {result.events} '
+                             f'{int(result.complete)} {result.time_elapsed} {result.board}\n')
+    except (SessionLogError, OSError) as error:
+        print(f'error: {error}', file=sys.stderr)
+        return 1
+    finally:
+        if output is not None and output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    rate = sessions / elapsed if elapsed else 0.0
+    print(f'replayed {sessions} sessions ({events} events) in {elapsed:.2f}s '
+          f'({rate:.1f} sessions/sec)', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
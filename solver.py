@@ -0,0 +1,224 @@
+"""Bitboard Sudoku solver with singles propagation and MRV backtracking.
+
+Boards are flat sequences of ``cell_count`` digits with 0 (or None) for
+empty cells. Internally every cell holds a bitmask of its candidates,
+where bit ``d - 1`` stands for digit ``d``.
+"""
+import random
+from math import isqrt
+from typing import Iterator, List, Optional, Sequence
+
+from board_topology import BoardTopology, get_topology
+
+
+def topology_for(board: Sequence[Optional[int]],
+                 topology: Optional[BoardTopology] = None) -> BoardTopology:
+    """Return ``topology`` or guess a square-box topology from the board length."""
+    if topology is not None:
+        return topology
+    size = isqrt(len(board))
+    box = isqrt(size)
+    if size * size != len(board) or box * box != size:
+        raise ValueError(f'Cannot infer board geometry from {len(board)} cells')
+    return get_topology(box, box)
+
+
+def _initial_candidates(board: Sequence[Optional[int]],
+                        topology: BoardTopology) -> Optional[List[int]]:
+    """Build candidate masks from the givens, or None if the givens clash."""
+    full = (1 << topology.size) - 1
+    used = [0] * len(topology.units)
+    cell_units = topology.cell_units
+
+    for cell, digit in enumerate(board):
+        if digit:
+            bit = 1 << (digit - 1)
+            for unit in cell_units[cell]:
+                if used[unit] & bit:
+                    return None
+                used[unit] |= bit
+
+    candidates = []
+    for cell, digit in enumerate(board):
+        if digit:
+            candidates.append(1 << (digit - 1))
+        else:
+            row, col, box = cell_units[cell]
+            candidates.append(full & ~(used[row] | used[col] | used[box]))
+    return candidates
+
+
+def _propagate(candidates: List[int], queue: List[int], topology: BoardTopology,
+               dirty_units: Optional[int] = None) -> bool:
+    """Apply naked and hidden singles until nothing changes.
+
+    ``queue`` holds cells that became single since the last call and
+    ``dirty_units`` is a bitset of units whose candidates changed (all
+    units when None). Returns False on a contradiction.
+    """
+    peers = topology.peers
+    units = topology.units
+    unit_masks = topology.cell_unit_masks
+    full = (1 << topology.size) - 1
+    if dirty_units is None:
+        dirty_units = (1 << len(units)) - 1
+    for cell in queue:
+        dirty_units |= unit_masks[cell]
+
+    while True:
+        # Naked singles: remove a decided digit from all of its peers
+        while queue:
+            cell = queue.pop()
+            bit = candidates[cell]
+            for peer in peers[cell]:
+                mask = candidates[peer]
+                if mask & bit:
+                    mask ^= bit
+                    if not mask:
+                        return False
+                    candidates[peer] = mask
+                    dirty_units |= unit_masks[peer]
+                    if not mask & (mask - 1):
+                        queue.append(peer)
+
+        # Hidden singles: a digit with only one place left in a unit
+        while dirty_units:
+            lowest = dirty_units & -dirty_units
+            dirty_units ^= lowest
+            unit = units[lowest.bit_length() - 1]
+            seen_once = 0
+            seen_twice = 0
+            for cell in unit:
+                mask = candidates[cell]
+                seen_twice |= seen_once & mask
+                seen_once |= mask
+            if seen_once != full:
+                return False
+            hidden = seen_once & ~seen_twice
+            while hidden:
+                bit = hidden & -hidden
+                hidden ^= bit
+                for cell in unit:
+                    mask = candidates[cell]
+                    if mask & bit:
+                        if mask != bit:
+                            candidates[cell] = bit
+                            queue.append(cell)
+                            dirty_units |= unit_masks[cell]
+                        break
+            if queue:
+                break
+        if not queue:
+            return True
+
+
+def propagate_singles(candidates: List[int], topology: BoardTopology) -> bool:
+    """Apply naked and hidden singles to a candidate board in place.
+
+    Returns False if the board turns out to be contradictory.
+    """
+    queue = [cell for cell, mask in enumerate(candidates) if mask and not mask & (mask - 1)]
+    return _propagate(candidates, queue, topology)
+
+
+def _search(candidates: List[int], topology: BoardTopology,
+            rng: Optional[random.Random] = None) -> Iterator[List[int]]:
+    """Yield every completion of a propagated candidate board."""
+    # Minimum remaining values: branch on the cell with the fewest candidates
+    best_cell = -1
+    best_count = topology.size + 1
+    for cell, mask in enumerate(candidates):
+        if mask & (mask - 1):
+            count = mask.bit_count()
+            if count < best_count:
+                best_cell = cell
+                best_count = count
+                if count == 2:
+                    break
+
+    if best_cell == -1:
+        yield candidates
+        return
+
+    mask = candidates[best_cell]
+    bits = []
+    while mask:
+        bit = mask & -mask
+        mask ^= bit
+        bits.append(bit)
+    if rng is not None:
+        rng.shuffle(bits)
+
+    for bit in bits:
+        branch = candidates.copy()
+        branch[best_cell] = bit
+        if _propagate(branch, [best_cell], topology, 0):
+            yield from _search(branch, topology, rng)
+
+
+def guess_depth(candidates: List[int], topology: BoardTopology) -> int:
+    """Return how many nested guesses MRV search needs to reach a solution.
+
+    ``candidates`` must already be propagated. Returns -1 if the board has
+    no solution.
+    """
+    best_cell = -1
+    best_count = topology.size + 1
+    for cell, mask in enumerate(candidates):
+        if mask & (mask - 1):
+            count = mask.bit_count()
+            if count < best_count:
+                best_cell = cell
+                best_count = count
+
+    if best_cell == -1:
+        return 0
+
+    mask = candidates[best_cell]
+    while mask:
+        bit = mask & -mask
+        mask ^= bit
+        branch = candidates.copy()
+        branch[best_cell] = bit
+        if _propagate(branch, [best_cell], topology, 0):
+            depth = guess_depth(branch, topology)
+            if depth >= 0:
+                return depth + 1
+    return -1
+
+
+def iter_solutions(board: Sequence[Optional[int]],
+                   topology: Optional[BoardTopology] = None,
+                   rng: Optional[random.Random] = None) -> Iterator[List[int]]:
+    """Yield the solutions of ``board`` as flat digit lists."""
+    topology = topology_for(board, topology)
+    candidates = _initial_candidates(board, topology)
+    if candidates is None:
+        return
+    queue = [cell for cell, mask in enumerate(candidates) if not mask & (mask - 1)]
+    if not _propagate(candidates, queue, topology):
+        return
+    for solution in _search(candidates, topology, rng):
+        yield [mask.bit_length() for mask in solution]
+
+
+def solve(board: Sequence[Optional[int]],
+          topology: Optional[BoardTopology] = None) -> Optional[List[int]]:
+    """Return the first solution of ``board``, or None if it has none."""
+    return next(iter_solutions(board, topology), None)
+
+
+def count_solutions(board: Sequence[Optional[int]], limit: int = 2,
+                    topology: Optional[BoardTopology] = None) -> int:
+    """Count solutions of ``board``, stopping once ``limit`` are found."""
+    count = 0
+    for _ in iter_solutions(board, topology):
+        count += 1
+        if count >= limit:
+            break
+    return count
+
+
+def random_solution(topology: BoardTopology, rng: random.Random) -> List[int]:
+    """Return a random completely filled grid."""
+    return next(iter_solutions([0] * topology.cell_count, topology, rng))